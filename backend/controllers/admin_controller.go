@@ -569,13 +569,19 @@ func GetUsers(c *fiber.Ctx) error {
 	}
 
 	var users []UserWithReferrals
-	database.DB.Table("users").
+	query := database.DB.Table("users").
 		Select("users.id, users.telegram_id, users.username, users.language, users.balance, users.is_admin, users.invited_by, users.created_at, COUNT(referrals.id) as referral_count").
 		Joins("LEFT JOIN users as referrals ON referrals.invited_by = users.telegram_id AND referrals.deleted_at IS NULL").
 		Where("users.deleted_at IS NULL").
-		Group("users.id, users.telegram_id, users.username, users.language, users.balance, users.is_admin, users.invited_by, users.created_at").
-		Order("users.created_at DESC").
-		Scan(&users)
+		Group("users.id, users.telegram_id, users.username, users.language, users.balance, users.is_admin, users.invited_by, users.created_at")
+
+	// Optional keyset paging (?limit=N&after_id=<last id>), used by the bot's broadcast worker
+	if limit := c.QueryInt("limit"); limit > 0 {
+		query = query.Where("users.id > ?", c.QueryInt("after_id")).Order("users.id ASC").Limit(limit)
+	} else {
+		query = query.Order("users.created_at DESC")
+	}
+	query.Scan(&users)
 
 	return c.JSON(users)
 }
@@ -2,6 +2,7 @@ package controllers
 
 import (
 	"encoding/json"
+	"fmt"
 	"net/http/httptest"
 	"os"
 	"strings"
@@ -29,6 +30,7 @@ func setupAdminApp() *fiber.App {
 	app := fiber.New()
 	app.Post("/admin/users/:telegram_id/message", SendMessageToUser)
 	app.Post("/admin/broadcast", BroadcastMessage)
+	app.Get("/admin/users", GetUsers)
 	return app
 }
 
@@ -152,6 +154,45 @@ func TestSendMessageToUser_ValidatesUserExists(t *testing.T) {
 	}
 }
 
+func TestGetUsers_PagesByID(t *testing.T) {
+	setupAdminTestDB(t)
+	app := setupAdminApp()
+
+	var created []models.User
+	for _, tgID := range []int64{111, 222, 333} {
+		user := models.User{TelegramID: tgID, Language: "en"}
+		database.DB.Create(&user)
+		created = append(created, user)
+	}
+
+	fetch := func(url string) []map[string]interface{} {
+		t.Helper()
+		resp, err := app.Test(httptest.NewRequest("GET", url, nil), -1)
+		if err != nil {
+			t.Fatalf("request failed: %v", err)
+		}
+		var body []map[string]interface{}
+		if err := json.NewDecoder(resp.Body).Decode(&body); err != nil {
+			t.Fatalf("failed to decode response: %v", err)
+		}
+		return body
+	}
+
+	if all := fetch("/admin/users"); len(all) != 3 {
+		t.Fatalf("expected 3 users without paging, got %d", len(all))
+	}
+
+	first := fetch("/admin/users?limit=2")
+	if len(first) != 2 || first[0]["telegram_id"] != float64(111) || first[1]["telegram_id"] != float64(222) {
+		t.Fatalf("unexpected first page: %v", first)
+	}
+
+	rest := fetch(fmt.Sprintf("/admin/users?limit=2&after_id=%d", created[1].ID))
+	if len(rest) != 1 || rest[0]["telegram_id"] != float64(333) {
+		t.Fatalf("unexpected second page: %v", rest)
+	}
+}
+
 func TestGetRequiredChannel_ReturnsEmptyWhenNotSet(t *testing.T) {
 	setupAdminTestDB(t)
 	app := setupSettingsApp()
@@ -27,7 +27,9 @@ type CreateOrderRequest struct {
 // @Accept json
 // @Produce json
 // @Param request body CreateOrderRequest true "Order Details"
+// @Param Idempotency-Key header string false "Repeats with the same key return the first order"
 // @Success 201 {object} map[string]interface{}
+// @Success 200 {object} map[string]interface{} "Existing order for this Idempotency-Key"
 // @Router /orders [post]
 func CreateOrder(c *fiber.Ctx) error {
 	var req CreateOrderRequest
@@ -41,6 +43,19 @@ func CreateOrder(c *fiber.Ctx) error {
 		return c.Status(404).JSON(fiber.Map{"error": "User not found"})
 	}
 
+	// A retried checkout gets the order (and pay link) it already created
+	idempotencyKey := c.Get("Idempotency-Key")
+	if idempotencyKey != "" {
+		var existing models.Order
+		if err := database.DB.Where("user_id = ? AND idempotency_key = ?", user.ID, idempotencyKey).First(&existing).Error; err == nil {
+			return c.Status(200).JSON(fiber.Map{
+				"ID":      existing.ID,
+				"order":   existing,
+				"payLink": existing.PayLink,
+			})
+		}
+	}
+
 	// 2. Find Plan
 	var plan models.Plan
 	if err := database.DB.First(&plan, req.PlanID).Error; err != nil {
@@ -57,8 +72,22 @@ func CreateOrder(c *fiber.Ctx) error {
 		PaymentMethod: req.PaymentMethod,
 		PaymentStatus: "pending",
 	}
+	if idempotencyKey != "" {
+		order.IdempotencyKey = &idempotencyKey
+	}
 
 	if err := database.DB.Create(&order).Error; err != nil {
+		// A concurrent create with the same key won the unique index
+		if idempotencyKey != "" {
+			var existing models.Order
+			if database.DB.Where("user_id = ? AND idempotency_key = ?", user.ID, idempotencyKey).First(&existing).Error == nil {
+				return c.Status(200).JSON(fiber.Map{
+					"ID":      existing.ID,
+					"order":   existing,
+					"payLink": existing.PayLink,
+				})
+			}
+		}
 		return c.Status(500).JSON(fiber.Map{"error": "Failed to create order"})
 	}
 
@@ -70,6 +99,7 @@ func CreateOrder(c *fiber.Ctx) error {
 			link, err := pmt.CreateInvoice(req.Amount, fmt.Sprintf("%d", order.ID), "user@example.com")
 			if err == nil {
 				payLink = link
+				database.DB.Model(&order).Update("pay_link", link)
 			}
 		}
 	}
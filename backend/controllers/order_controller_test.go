@@ -0,0 +1,105 @@
+package controllers
+
+import (
+	"encoding/json"
+	"fmt"
+	"io/ioutil"
+	"net/http/httptest"
+	"strings"
+	"testing"
+
+	"github.com/username/sell-bot-backend/database"
+	"github.com/username/sell-bot-backend/models"
+)
+
+func TestCreateOrder_ReusesOrderForSameIdempotencyKey(t *testing.T) {
+	setupTestDB()
+	app := setupFiberApp()
+	app.Post("/orders", CreateOrder)
+
+	user := models.User{TelegramID: 555000111, Language: "en"}
+	database.DB.Create(&user)
+	plan := models.Plan{ServerType: "v2ray", DurationDays: 30, DataLimitGB: 50, PriceIRR: 1000}
+	database.DB.Create(&plan)
+
+	body := fmt.Sprintf(`{"telegram_id": 555000111, "plan_id": %d, "payment_method": "card", "amount": 1000}`, plan.ID)
+	create := func(key string) (int, float64) {
+		req := httptest.NewRequest("POST", "/orders", strings.NewReader(body))
+		req.Header.Set("Content-Type", "application/json")
+		if key != "" {
+			req.Header.Set("Idempotency-Key", key)
+		}
+		resp, err := app.Test(req, -1)
+		if err != nil {
+			t.Fatalf("Failed to execute request: %v", err)
+		}
+		bodyBytes, _ := ioutil.ReadAll(resp.Body)
+		var responseBody map[string]interface{}
+		json.Unmarshal(bodyBytes, &responseBody)
+		id, _ := responseBody["ID"].(float64)
+		return resp.StatusCode, id
+	}
+
+	status, first := create("checkout-a")
+	if status != 201 {
+		t.Fatalf("Expected status code 201, got %d", status)
+	}
+	status, again := create("checkout-a")
+	if status != 200 || again != first {
+		t.Errorf("Expected the existing order %v with status 200, got %v (%d)", first, again, status)
+	}
+	if _, other := create("checkout-b"); other == first {
+		t.Errorf("Expected a new order for a different key, got %v again", other)
+	}
+	if _, unkeyed := create(""); unkeyed == first {
+		t.Errorf("Expected a new order without a key, got %v again", unkeyed)
+	}
+
+	var count int64
+	database.DB.Model(&models.Order{}).Where("user_id = ?", user.ID).Count(&count)
+	if count != 3 {
+		t.Errorf("Expected 3 orders, got %d", count)
+	}
+}
+
+func TestCreateOrder_IdempotencyKeyIsUniquePerUser(t *testing.T) {
+	setupTestDB()
+	app := setupFiberApp()
+	app.Post("/orders", CreateOrder)
+
+	user := models.User{TelegramID: 555000222, Language: "en"}
+	database.DB.Create(&user)
+	plan := models.Plan{ServerType: "v2ray", DurationDays: 30, DataLimitGB: 50, PriceIRR: 1000}
+	database.DB.Create(&plan)
+
+	// Another replica inserted the keyed order between our read and insert
+	key := "checkout-race"
+	winner := models.Order{UserID: user.ID, PlanID: plan.ID, PaymentStatus: "pending", IdempotencyKey: &key}
+	database.DB.Create(&winner)
+	duplicate := models.Order{UserID: user.ID, PlanID: plan.ID, PaymentStatus: "pending", IdempotencyKey: &key}
+	if err := database.DB.Create(&duplicate).Error; err == nil {
+		t.Fatalf("Expected the unique index to reject a second order for key %q", key)
+	}
+
+	// Unkeyed orders are stored as NULL and never conflict
+	for i := 0; i < 2; i++ {
+		if err := database.DB.Create(&models.Order{UserID: user.ID, PlanID: plan.ID, PaymentStatus: "pending"}).Error; err != nil {
+			t.Fatalf("Expected unkeyed orders to be created, got %v", err)
+		}
+	}
+
+	body := fmt.Sprintf(`{"telegram_id": 555000222, "plan_id": %d, "payment_method": "card", "amount": 1000}`, plan.ID)
+	req := httptest.NewRequest("POST", "/orders", strings.NewReader(body))
+	req.Header.Set("Content-Type", "application/json")
+	req.Header.Set("Idempotency-Key", key)
+	resp, err := app.Test(req, -1)
+	if err != nil {
+		t.Fatalf("Failed to execute request: %v", err)
+	}
+	bodyBytes, _ := ioutil.ReadAll(resp.Body)
+	var responseBody map[string]interface{}
+	json.Unmarshal(bodyBytes, &responseBody)
+	if id, _ := responseBody["ID"].(float64); resp.StatusCode != 200 || uint(id) != winner.ID {
+		t.Errorf("Expected the existing order %d with status 200, got %v (%d)", winner.ID, responseBody["ID"], resp.StatusCode)
+	}
+}
@@ -176,8 +176,34 @@ func ApproveOrder(c *fiber.Ctx) error {
 		return c.JSON(fiber.Map{"message": "Already approved"})
 	}
 
+	// Claim the order first, so a repeated or concurrent approve (e.g. a retry
+	// after the bot's request timed out) can't provision it a second time
+	previousStatus := order.PaymentStatus
+	if previousStatus == "provisioning" {
+		previousStatus = "pending"
+	}
+	claimed, err := claimOrderForProvisioning(order.ID)
+	if err != nil {
+		return c.Status(500).JSON(fiber.Map{"error": "Failed to update order"})
+	}
+	if !claimed {
+		database.DB.Where("id = ?", orderID).First(&order)
+		if order.PaymentStatus == "approved" {
+			return c.JSON(fiber.Map{"message": "Already approved"})
+		}
+		return c.Status(409).JSON(fiber.Map{
+			"error":   "provisioning_in_progress",
+			"message": "This order is already being provisioned.",
+		})
+	}
+	order.PaymentStatus = "provisioning"
+
 	// Provision VPN and notify user
 	if err := provisionVPNForOrder(&order); err != nil {
+		// Release the claim so the admin can retry
+		database.DB.Model(&models.Order{}).
+			Where("id = ? AND payment_status = ?", order.ID, "provisioning").
+			Update("payment_status", previousStatus)
 		return c.Status(400).JSON(fiber.Map{
 			"error":   "provisioning_failed",
 			"message": err.Error(),
@@ -199,6 +225,25 @@ func ApproveOrder(c *fiber.Ctx) error {
 	})
 }
 
+// provisioningClaimTTL is how long a "provisioning" claim blocks other approves.
+// The bot gives up on an approve after about a minute, so an older claim was
+// left behind by a request that died mid-way and may be taken over.
+const provisioningClaimTTL = 10 * time.Minute
+
+// claimOrderForProvisioning atomically moves an order to "provisioning".
+// It reports false if the order is already approved or another request holds a fresh claim.
+func claimOrderForProvisioning(orderID uint) (bool, error) {
+	now := time.Now()
+	res := database.DB.Model(&models.Order{}).
+		Where("id = ? AND (payment_status NOT IN ? OR (payment_status = ? AND updated_at < ?))",
+			orderID, []string{"approved", "provisioning"}, "provisioning", now.Add(-provisioningClaimTTL)).
+		Updates(map[string]interface{}{"payment_status": "provisioning", "updated_at": now})
+	if res.Error != nil {
+		return false, res.Error
+	}
+	return res.RowsAffected == 1, nil
+}
+
 // ManualProvisionRequest represents the payload for manual provisioning
 type ManualProvisionRequest struct {
 	ConfigLink string `json:"config_link"`
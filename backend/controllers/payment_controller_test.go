@@ -5,6 +5,7 @@ import (
 	"io/ioutil"
 	"net/http/httptest"
 	"os"
+	"strconv"
 	"testing"
 	"time"
 
@@ -70,3 +71,61 @@ func TestRejectOrder(t *testing.T) {
 		t.Errorf("Expected message 'Order rejected', got %v", responseBody["message"])
 	}
 }
+
+func TestApproveOrder_ClaimsOrderBeforeProvisioning(t *testing.T) {
+	setupTestDB()
+	app := fiber.New()
+	app.Post("/orders/:id/approve", ApproveOrder)
+
+	user := models.User{TelegramID: 123400555, Language: "en"}
+	database.DB.Create(&user)
+	order := models.Order{UserID: user.ID, PaymentStatus: "provisioning"}
+	database.DB.Create(&order)
+
+	approve := func() (int, map[string]interface{}) {
+		req := httptest.NewRequest("POST", "/orders/"+strconv.Itoa(int(order.ID))+"/approve", nil)
+		resp, err := app.Test(req, -1)
+		if err != nil {
+			t.Fatalf("Failed to execute request: %v", err)
+		}
+		bodyBytes, _ := ioutil.ReadAll(resp.Body)
+		var responseBody map[string]interface{}
+		json.Unmarshal(bodyBytes, &responseBody)
+		return resp.StatusCode, responseBody
+	}
+
+	// Another request is provisioning this order right now
+	if status, body := approve(); status != 409 || body["error"] != "provisioning_in_progress" {
+		t.Fatalf("Expected 409 provisioning_in_progress, got %d %v", status, body)
+	}
+
+	// A stale claim is taken over; provisioning fails here (no plan), so the claim is released again
+	database.DB.Model(&models.Order{}).Where("id = ?", order.ID).UpdateColumn("updated_at", time.Now().Add(-time.Hour))
+	if status, body := approve(); status != 400 || body["error"] != "provisioning_failed" {
+		t.Fatalf("Expected 400 provisioning_failed, got %d %v", status, body)
+	}
+	var released models.Order
+	database.DB.First(&released, order.ID)
+	if released.PaymentStatus != "pending" {
+		t.Errorf("Expected the claim to be released to 'pending', got '%s'", released.PaymentStatus)
+	}
+
+	database.DB.Model(&models.Order{}).Where("id = ?", order.ID).Update("payment_status", "approved")
+	if status, body := approve(); status != 200 || body["message"] != "Already approved" {
+		t.Errorf("Expected 200 Already approved, got %d %v", status, body)
+	}
+}
+
+func TestClaimOrderForProvisioning_OnlyOneWinner(t *testing.T) {
+	setupTestDB()
+	order := models.Order{PaymentStatus: "pending"}
+	database.DB.Create(&order)
+
+	first, err := claimOrderForProvisioning(order.ID)
+	if err != nil || !first {
+		t.Fatalf("Expected the first claim to win, got %v (%v)", first, err)
+	}
+	if second, _ := claimOrderForProvisioning(order.ID); second {
+		t.Errorf("Expected a second claim to lose while the first is fresh")
+	}
+}
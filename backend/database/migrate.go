@@ -7,6 +7,12 @@ import (
 )
 
 func Migrate() {
+	// Unkeyed orders used to store '' and would collide under the unique
+	// (user_id, idempotency_key) index; NULLs don't
+	if DB.Migrator().HasColumn(&models.Order{}, "IdempotencyKey") {
+		DB.Exec("UPDATE orders SET idempotency_key = NULL WHERE idempotency_key = ''")
+	}
+
 	err := DB.AutoMigrate(
 		&models.User{},
 		&models.Server{},
@@ -45,19 +45,21 @@ type Plan struct {
 }
 
 type Order struct {
-	ID            uint           `gorm:"primaryKey" json:"ID"`
-	UserID        uint           `json:"user_id"`
-	PlanID        uint           `json:"plan_id"`
-	EndpointID    uint           `json:"endpoint_id"` // For WireGuard endpoint selection
-	ConfigName    string         `gorm:"size:50" json:"config_name"`
-	Amount        float64        `json:"amount"`
-	PaymentMethod string         `gorm:"size:20" json:"payment_method"`
-	PaymentStatus string         `gorm:"size:20;default:'pending'" json:"payment_status"`
-	ProofImageID  string         `gorm:"size:200" json:"proof_image_id"`
-	CryptoTxID    string         `gorm:"size:200" json:"crypto_tx_id"`
-	CreatedAt     time.Time      `json:"created_at"`
-	UpdatedAt     time.Time      `json:"updated_at"`
-	DeletedAt     gorm.DeletedAt `gorm:"index" json:"deleted_at"`
+	ID             uint           `gorm:"primaryKey" json:"ID"`
+	UserID         uint           `gorm:"uniqueIndex:idx_orders_user_idempotency" json:"user_id"`
+	PlanID         uint           `json:"plan_id"`
+	EndpointID     uint           `json:"endpoint_id"` // For WireGuard endpoint selection
+	ConfigName     string         `gorm:"size:50" json:"config_name"`
+	Amount         float64        `json:"amount"`
+	PaymentMethod  string         `gorm:"size:20" json:"payment_method"`
+	PaymentStatus  string         `gorm:"size:20;default:'pending'" json:"payment_status"`
+	ProofImageID   string         `gorm:"size:200" json:"proof_image_id"`
+	CryptoTxID     string         `gorm:"size:200" json:"crypto_tx_id"`
+	PayLink        string         `gorm:"size:500" json:"pay_link"`
+	IdempotencyKey *string        `gorm:"size:64;uniqueIndex:idx_orders_user_idempotency" json:"-"` // Repeated creates with this key return this order; NULL when unkeyed
+	CreatedAt      time.Time      `json:"created_at"`
+	UpdatedAt      time.Time      `json:"updated_at"`
+	DeletedAt      gorm.DeletedAt `gorm:"index" json:"deleted_at"`
 }
 
 type Subscription struct {
@@ -1,15 +1,19 @@
+import html
 import logging
 import os
-import httpx
 from aiogram import Router, F, types
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.fsm.storage.base import StorageKey
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from api_client import get_api
+from broadcast import broadcaster
+from catalog import endpoint_catalog, plan_catalog
+from prober import prober
+from wireguard import wg_configs
 
 router = Router()
 
-API_BASE_URL = os.getenv("API_BASE_URL", "http://backend:3000/api/v1")
 ADMIN_IDS = [x.strip() for x in os.getenv("ADMIN_ID", "").split(",") if x.strip()]
 
 class AddPlanForm(StatesGroup):
@@ -25,6 +29,9 @@ class AddEndpointForm(StatesGroup):
     waiting_for_name = State()
     waiting_for_address = State()
 
+class BroadcastForm(StatesGroup):
+    waiting_for_message = State()
+
 def is_admin(telegram_id: int) -> bool:
     return str(telegram_id) in ADMIN_IDS
 
@@ -39,6 +46,7 @@ async def show_admin_panel(callback: types.CallbackQuery):
         [InlineKeyboardButton(text="➕ Add New Plan", callback_data="admin_add_plan")],
         [InlineKeyboardButton(text="✏️ Edit Existing Plan", callback_data="admin_list_plans")],
         [InlineKeyboardButton(text="🌍 Manage Endpoints (WG)", callback_data="admin_endpoints")],
+        [InlineKeyboardButton(text="📢 Broadcast", callback_data="admin_broadcast")],
         [InlineKeyboardButton(text="🔙 Back to Main Menu", callback_data="main_menu")]
     ])
     
@@ -107,13 +115,14 @@ async def add_plan_price(message: types.Message, state: FSMContext):
             "is_active": True
         }
         
-        async with httpx.AsyncClient(headers={"Authorization": f"Bot {os.getenv('BOT_TOKEN')}"}) as client:
-            resp = await client.post(f"{API_BASE_URL}/plans", json=plan_payload)
-            if resp.status_code == 201:
-                await message.answer(f"✅ Plan added successfully!\n\nType: {data['server_type']}\nDays: {data['duration_days']}\nGB: {data['data_limit_gb']}\nPrice: {price_irr} IRR")
-            else:
-                logging.error(f"Failed to add plan: {resp.text}")
-                await message.answer("❌ Failed to add plan due to server error.")
+        api = get_api()
+        resp = await api.create_plan(plan_payload)
+        if resp.status_code == 201:
+            plan_catalog.invalidate()
+            await message.answer(f"✅ Plan added successfully!\n\nType: {data['server_type']}\nDays: {data['duration_days']}\nGB: {data['data_limit_gb']}\nPrice: {price_irr} IRR")
+        else:
+            logging.error(f"Failed to add plan: {resp.text}")
+            await message.answer("❌ Failed to add plan due to server error.")
                 
         await state.clear()
         
@@ -127,29 +136,102 @@ async def edit_plan_list(callback: types.CallbackQuery):
         await callback.answer("Unauthorized", show_alert=True)
         return
         
-    async with httpx.AsyncClient(headers={"Authorization": f"Bot {os.getenv('BOT_TOKEN')}"}) as client:
-        try:
-            resp = await client.get(f"{API_BASE_URL}/plans?all=true")
-            plans = resp.json()
+    api = get_api()
+    try:
+        resp = await api.get_plans(include_inactive=True)
+        plans = resp.json()
             
-            if not plans:
-                await callback.message.edit_text("No plans found.", reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-                    [InlineKeyboardButton(text="🔙 Back", callback_data="admin_panel")]
-                ]))
-                return
+        if not plans:
+            await callback.message.edit_text("No plans found.", reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+                [InlineKeyboardButton(text="🔙 Back", callback_data="admin_panel")]
+            ]))
+            return
                 
-            buttons = []
-            for plan in plans:
-                status = "✅" if plan.get('is_active') else "❌"
-                btn_text = f"{status} {plan.get('server_type')} - {plan.get('data_limit_gb')}GB / {plan.get('duration_days')}D"
-                buttons.append([InlineKeyboardButton(text=btn_text, callback_data=f"admin_editplan_{plan.get('ID')}")])
+        buttons = []
+        for plan in plans:
+            status = "✅" if plan.get('is_active') else "❌"
+            btn_text = f"{status} {plan.get('server_type')} - {plan.get('data_limit_gb')}GB / {plan.get('duration_days')}D"
+            buttons.append([InlineKeyboardButton(text=btn_text, callback_data=f"admin_editplan_{plan.get('ID')}")])
                 
-            buttons.append([InlineKeyboardButton(text="🔙 Back", callback_data="admin_panel")])
-            makeup = InlineKeyboardMarkup(inline_keyboard=buttons)
+        buttons.append([InlineKeyboardButton(text="🔙 Back", callback_data="admin_panel")])
+        makeup = InlineKeyboardMarkup(inline_keyboard=buttons)
             
-            await callback.message.edit_text("Select a plan to edit:", reply_markup=makeup)
-        except Exception as e:
-            await callback.answer(f"❌ Error fetching users: {e}", show_alert=True)
+        await callback.message.edit_text("Select a plan to edit:", reply_markup=makeup)
+    except Exception as e:
+        await callback.answer(f"❌ Error fetching users: {e}", show_alert=True)
+
+# --- Broadcast Flow ---
+# Registered before the catch-all reply handler below so the message to
+# broadcast reaches its state handler.
+@router.callback_query(F.data == "admin_broadcast")
+async def broadcast_start(callback: types.CallbackQuery, state: FSMContext):
+    if not is_admin(callback.from_user.id):
+        await callback.answer("Unauthorized", show_alert=True)
+        return
+    if broadcaster.running:
+        await callback.answer("A broadcast is already running.", show_alert=True)
+        return
+
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="❌ Cancel", callback_data="broadcast_discard")]
+    ])
+    await callback.message.edit_text(
+        "📢 Send the message to broadcast (text, photo, video...).\nIt will be copied to every user as-is.",
+        reply_markup=keyboard,
+    )
+    await state.set_state(BroadcastForm.waiting_for_message)
+
+@router.message(BroadcastForm.waiting_for_message)
+async def broadcast_preview(message: types.Message, state: FSMContext):
+    await state.update_data(broadcast_message_id=message.message_id)
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="✅ Send to all users", callback_data="broadcast_confirm")],
+        [InlineKeyboardButton(text="❌ Cancel", callback_data="broadcast_discard")]
+    ])
+    await message.reply("Send this message to all users?", reply_markup=keyboard)
+
+@router.callback_query(F.data == "broadcast_confirm")
+async def broadcast_confirm(callback: types.CallbackQuery, state: FSMContext, bot):
+    if not is_admin(callback.from_user.id):
+        await callback.answer("Unauthorized", show_alert=True)
+        return
+    data = await state.get_data()
+    message_id = data.get("broadcast_message_id")
+    await state.clear()
+    if not message_id:
+        await callback.answer("Nothing to send.", show_alert=True)
+        return
+
+    status = await callback.message.edit_text("📢 Starting broadcast...")
+    try:
+        broadcaster.start(bot, callback.from_user.id, callback.message.chat.id, message_id, status.message_id)
+    except RuntimeError:
+        await callback.answer("A broadcast is already running.", show_alert=True)
+        return
+    await callback.answer()
+
+@router.callback_query(F.data == "broadcast_discard")
+async def broadcast_discard(callback: types.CallbackQuery, state: FSMContext):
+    await state.clear()
+    await callback.message.edit_text("Broadcast cancelled.", reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="🔙 Back", callback_data="admin_panel")]
+    ]))
+
+@router.callback_query(F.data == "broadcast_stop")
+async def broadcast_stop(callback: types.CallbackQuery):
+    if not is_admin(callback.from_user.id):
+        await callback.answer("Unauthorized", show_alert=True)
+        return
+    stopped = broadcaster.stop()
+    await callback.answer("Stopping broadcast..." if stopped else "No broadcast is running.")
+
+@router.callback_query(F.data == "broadcast_resume")
+async def broadcast_resume(callback: types.CallbackQuery, bot):
+    if not is_admin(callback.from_user.id):
+        await callback.answer("Unauthorized", show_alert=True)
+        return
+    resumed = broadcaster.resume(bot)
+    await callback.answer("Resuming broadcast..." if resumed else "Nothing to resume.")
 
 # --- Admin Support Reply Handling ---
 import re
@@ -199,41 +281,41 @@ async def process_admin_reply(message: types.Message, bot):
 async def edit_plan_menu(callback: types.CallbackQuery, state: FSMContext):
     plan_id = callback.data.split("_")[-1]
     
-    async with httpx.AsyncClient(headers={"Authorization": f"Bot {os.getenv('BOT_TOKEN')}"}) as client:
-        try:
-            resp = await client.get(f"{API_BASE_URL}/plans/{plan_id}")
-            if resp.status_code != 200:
-                await callback.answer("Plan not found.", show_alert=True)
-                return
-            plan = resp.json()
+    api = get_api()
+    try:
+        resp = await api.get_plan(plan_id)
+        if resp.status_code != 200:
+            await callback.answer("Plan not found.", show_alert=True)
+            return
+        plan = resp.json()
             
-            text = (
-                f"🛠 **Editing Plan #{plan_id}**\n\n"
-                f"**Type:** {plan.get('server_type')}\n"
-                f"**Duration:** {plan.get('duration_days')} Days\n"
-                f"**Data Limit:** {plan.get('data_limit_gb')} GB\n"
-                f"**Price:** {plan.get('price_irr')} IRR\n"
-                f"**Status:** {'Active ✅' if plan.get('is_active') else 'Inactive ❌'}\n\n"
-                f"What would you like to edit?"
-            )
+        text = (
+            f"🛠 **Editing Plan #{plan_id}**\n\n"
+            f"**Type:** {plan.get('server_type')}\n"
+            f"**Duration:** {plan.get('duration_days')} Days\n"
+            f"**Data Limit:** {plan.get('data_limit_gb')} GB\n"
+            f"**Price:** {plan.get('price_irr')} IRR\n"
+            f"**Status:** {'Active ✅' if plan.get('is_active') else 'Inactive ❌'}\n\n"
+            f"What would you like to edit?"
+        )
             
-            buttons = [
-                [
-                    InlineKeyboardButton(text="🕒 Duration", callback_data=f"admin_editfield_{plan_id}_duration_days"),
-                    InlineKeyboardButton(text="💾 Data Limit", callback_data=f"admin_editfield_{plan_id}_data_limit_gb")
-                ],
-                [
-                    InlineKeyboardButton(text="💰 Price (IRR)", callback_data=f"admin_editfield_{plan_id}_price_irr"),
-                    InlineKeyboardButton(text="🔄 Toggle Status", callback_data=f"admin_toggle_{plan_id}_{plan.get('is_active')}")
-                ],
-                [InlineKeyboardButton(text="🔙 Back to Plans", callback_data="admin_list_plans")]
-            ]
-            makeup = InlineKeyboardMarkup(inline_keyboard=buttons)
+        buttons = [
+            [
+                InlineKeyboardButton(text="🕒 Duration", callback_data=f"admin_editfield_{plan_id}_duration_days"),
+                InlineKeyboardButton(text="💾 Data Limit", callback_data=f"admin_editfield_{plan_id}_data_limit_gb")
+            ],
+            [
+                InlineKeyboardButton(text="💰 Price (IRR)", callback_data=f"admin_editfield_{plan_id}_price_irr"),
+                InlineKeyboardButton(text="🔄 Toggle Status", callback_data=f"admin_toggle_{plan_id}_{plan.get('is_active')}")
+            ],
+            [InlineKeyboardButton(text="🔙 Back to Plans", callback_data="admin_list_plans")]
+        ]
+        makeup = InlineKeyboardMarkup(inline_keyboard=buttons)
             
-            await state.clear()
-            await callback.message.edit_text(text, reply_markup=makeup, parse_mode="Markdown")
-        except Exception as e:
-            await callback.answer("Backend error.", show_alert=True)
+        await state.clear()
+        await callback.message.edit_text(text, reply_markup=makeup, parse_mode="Markdown")
+    except Exception as e:
+        await callback.answer("Backend error.", show_alert=True)
 
 @router.callback_query(F.data.startswith("admin_toggle_"))
 async def edit_plan_toggle_status(callback: types.CallbackQuery):
@@ -242,18 +324,19 @@ async def edit_plan_toggle_status(callback: types.CallbackQuery):
     current_status = parts[3].lower() == "true"
     new_status = not current_status
     
-    async with httpx.AsyncClient(headers={"Authorization": f"Bot {os.getenv('BOT_TOKEN')}"}) as client:
-        try:
-            resp = await client.patch(f"{API_BASE_URL}/plans/{plan_id}", json={"is_active": new_status})
-            if resp.status_code == 200:
-                await callback.answer("Status updated!")
-                # Refresh the menu
-                await edit_plan_menu(callback, None) # Pass None or fake state if necessary, wait, edit_plan_menu expects FSMContext.
-                # Better to just redirect callback data
-            else:
-                await callback.answer("Failed to update status", show_alert=True)
-        except Exception:
-            await callback.answer("Backend error.", show_alert=True)
+    api = get_api()
+    try:
+        resp = await api.update_plan(plan_id, {"is_active": new_status})
+        if resp.status_code == 200:
+            plan_catalog.invalidate()
+            await callback.answer("Status updated!")
+            # Refresh the menu
+            await edit_plan_menu(callback, None) # Pass None or fake state if necessary, wait, edit_plan_menu expects FSMContext.
+            # Better to just redirect callback data
+        else:
+            await callback.answer("Failed to update status", show_alert=True)
+    except Exception:
+        await callback.answer("Backend error.", show_alert=True)
             
     # Quick refresh by editing the message to fetch plan again:
     from aiogram.fsm.context import FSMContext
@@ -301,18 +384,19 @@ async def process_edit_plan_value(message: types.Message, state: FSMContext):
         await message.answer("❌ Invalid number format. Please try again.")
         return
         
-    async with httpx.AsyncClient(headers={"Authorization": f"Bot {os.getenv('BOT_TOKEN')}"}) as client:
-        try:
-            resp = await client.patch(f"{API_BASE_URL}/plans/{plan_id}", json=payload)
-            if resp.status_code == 200:
-                markup = InlineKeyboardMarkup(inline_keyboard=[
-                    [InlineKeyboardButton("🔙 Return to Plan Menu", callback_data=f"admin_editplan_{plan_id}")]
-                ])
-                await message.answer("✅ Plan updated successfully!", reply_markup=markup)
-            else:
-                await message.answer("❌ Failed to update plan.")
-        except Exception:
-            await message.answer("❌ Backend error.")
+    api = get_api()
+    try:
+        resp = await api.update_plan(plan_id, payload)
+        if resp.status_code == 200:
+            plan_catalog.invalidate()
+            markup = InlineKeyboardMarkup(inline_keyboard=[
+                [InlineKeyboardButton("🔙 Return to Plan Menu", callback_data=f"admin_editplan_{plan_id}")]
+            ])
+            await message.answer("✅ Plan updated successfully!", reply_markup=markup)
+        else:
+            await message.answer("❌ Failed to update plan.")
+    except Exception:
+        await message.answer("❌ Backend error.")
             
     await state.clear()
 
@@ -323,24 +407,30 @@ async def admin_endpoints_list(callback: types.CallbackQuery):
         await callback.answer("Unauthorized", show_alert=True)
         return
     
-    async with httpx.AsyncClient(headers={"Authorization": f"Bot {os.getenv('BOT_TOKEN')}"}) as client:
-        try:
-            resp = await client.get(f"{API_BASE_URL}/endpoints?all=true")
-            endpoints = resp.json()
+    api = get_api()
+    try:
+        resp = await api.get_endpoints(include_inactive=True)
+        endpoints = resp.json()
             
-            buttons = []
-            for ep in endpoints:
-                status = "✅" if ep.get('is_active') else "❌"
-                btn_text = f"{status} {ep.get('name')} — {ep.get('address')}"
-                buttons.append([InlineKeyboardButton(text=btn_text, callback_data=f"admin_ep_toggle_{ep.get('ID')}_{ep.get('is_active')}")])
+        buttons = []
+        health = []
+        for ep in endpoints:
+            status = "✅" if ep.get('is_active') else "❌"
+            btn_text = f"{status} {ep.get('name')} — {ep.get('address')}"
+            buttons.append([InlineKeyboardButton(text=btn_text, callback_data=f"admin_ep_toggle_{ep.get('ID')}_{ep.get('is_active')}")])
+            if ep.get('is_active'):
+                # Names are admin-typed ("de_1"), so escape them for the HTML below
+                health.append(f"• {html.escape(str(ep.get('name')))}: {html.escape(prober.describe(ep.get('ID')))}")
             
-            buttons.append([InlineKeyboardButton(text="➕ Add Endpoint", callback_data="admin_add_ep")])
-            buttons.append([InlineKeyboardButton(text="🔙 Back", callback_data="admin_panel")])
+        buttons.append([InlineKeyboardButton(text="➕ Add Endpoint", callback_data="admin_add_ep")])
+        buttons.append([InlineKeyboardButton(text="🔙 Back", callback_data="admin_panel")])
             
-            text = "🌍 **WireGuard Endpoints**\n\nTap an endpoint to toggle its status:\n" if endpoints else "No endpoints yet. Add one!"
-            await callback.message.edit_text(text, reply_markup=InlineKeyboardMarkup(inline_keyboard=buttons), parse_mode="Markdown")
-        except Exception:
-            await callback.answer("Backend error.", show_alert=True)
+        text = "🌍 <b>WireGuard Endpoints</b>\n\nTap an endpoint to toggle its status:\n" if endpoints else "No endpoints yet. Add one!"
+        if health:
+            text += "\n📶 Probe results (smoothed):\n" + "\n".join(health)
+        await callback.message.edit_text(text, reply_markup=InlineKeyboardMarkup(inline_keyboard=buttons), parse_mode="HTML")
+    except Exception:
+        await callback.answer("Backend error.", show_alert=True)
 
 @router.callback_query(F.data.startswith("admin_ep_toggle_"))
 async def admin_ep_toggle(callback: types.CallbackQuery):
@@ -348,15 +438,17 @@ async def admin_ep_toggle(callback: types.CallbackQuery):
     ep_id = parts[3]
     current = parts[4].lower() == "true"
     
-    async with httpx.AsyncClient(headers={"Authorization": f"Bot {os.getenv('BOT_TOKEN')}"}) as client:
-        try:
-            resp = await client.patch(f"{API_BASE_URL}/endpoints/{ep_id}", json={"is_active": not current})
-            if resp.status_code == 200:
-                await callback.answer("Toggled!")
-            else:
-                await callback.answer("Failed.", show_alert=True)
-        except Exception:
-            await callback.answer("Backend error.", show_alert=True)
+    api = get_api()
+    try:
+        resp = await api.update_endpoint(ep_id, {"is_active": not current})
+        if resp.status_code == 200:
+            endpoint_catalog.invalidate()
+            wg_configs.clear()
+            await callback.answer("Toggled!")
+        else:
+            await callback.answer("Failed.", show_alert=True)
+    except Exception:
+        await callback.answer("Backend error.", show_alert=True)
     
     # Refresh list
     await callback.message.edit_reply_markup(reply_markup=InlineKeyboardMarkup(inline_keyboard=[
@@ -382,22 +474,23 @@ async def admin_add_ep_name(message: types.Message, state: FSMContext):
 async def admin_add_ep_address(message: types.Message, state: FSMContext):
     data = await state.get_data()
     
-    async with httpx.AsyncClient(headers={"Authorization": f"Bot {os.getenv('BOT_TOKEN')}"}) as client:
-        try:
-            resp = await client.post(f"{API_BASE_URL}/endpoints", json={
-                "name": data.get("ep_name"),
-                "address": message.text.strip(),
-                "is_active": True
-            })
-            if resp.status_code == 201:
-                markup = InlineKeyboardMarkup(inline_keyboard=[
-                    [InlineKeyboardButton(text="🔙 Back to Endpoints", callback_data="admin_endpoints")]
-                ])
-                await message.answer(f"✅ Endpoint added: **{data.get('ep_name')}** — `{message.text.strip()}`", parse_mode="Markdown", reply_markup=markup)
-            else:
-                await message.answer("❌ Failed to add endpoint.")
-        except Exception:
-            await message.answer("❌ Backend error.")
+    api = get_api()
+    try:
+        resp = await api.create_endpoint({
+            "name": data.get("ep_name"),
+            "address": message.text.strip(),
+            "is_active": True
+        })
+        if resp.status_code == 201:
+            endpoint_catalog.invalidate()
+            markup = InlineKeyboardMarkup(inline_keyboard=[
+                [InlineKeyboardButton(text="🔙 Back to Endpoints", callback_data="admin_endpoints")]
+            ])
+            await message.answer(f"✅ Endpoint added: **{data.get('ep_name')}** — `{message.text.strip()}`", parse_mode="Markdown", reply_markup=markup)
+        else:
+            await message.answer("❌ Failed to add endpoint.")
+    except Exception:
+        await message.answer("❌ Backend error.")
     
     await state.clear()
 
@@ -0,0 +1,257 @@
+import importlib.util
+import logging
+import os
+import re
+import time
+
+import httpx
+
+from metrics import BACKEND_SECONDS
+from throttling import Gate, GateTimeout
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        logging.warning(f"Invalid value for {name}, using default {default}")
+        return default
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        logging.warning(f"Invalid value for {name}, using default {default}")
+        return default
+
+
+def _parse_route_limits(raw: str) -> dict:
+    """Parse API_ROUTE_LIMITS, e.g. "POST /orders/{id}/approve=4,GET /plans=50"."""
+    limits = {}
+    for item in filter(None, (part.strip() for part in raw.split(","))):
+        route, _, value = item.rpartition("=")
+        try:
+            limits[route.strip()] = int(value)
+        except ValueError:
+            logging.warning(f"Invalid API_ROUTE_LIMITS entry: {item}")
+    return limits
+
+
+_ID_SEGMENT = re.compile(r"/\d+(?=/|$)")
+
+
+def route_key(method: str, path: str) -> str:
+    """Group requests by endpoint: `GET /users/42/subscriptions` -> `GET /users/{id}/subscriptions`."""
+    return f"{method.upper()} {_ID_SEGMENT.sub('/{id}', path.rstrip('/') or '/')}"
+
+
+class BackendBusy(httpx.PoolTimeout, GateTimeout):
+    """Too many requests already in flight to this backend endpoint."""
+
+
+def _http2_available() -> bool:
+    """HTTP/2 needs the optional `h2` package (pip install httpx[http2])."""
+    if os.getenv("API_HTTP2", "auto").lower() in ("0", "false", "no"):
+        return False
+    return importlib.util.find_spec("h2") is not None
+
+
+class BackendClient:
+    """Long-lived, pooled client for the Go backend API.
+
+    One instance is shared by every handler so requests reuse keep-alive
+    connections instead of paying a TCP/TLS handshake per update.
+    Methods return the raw `httpx.Response`; callers keep their own
+    status-code handling.
+
+    Each endpoint (method + path with ids collapsed) has its own concurrency
+    cap so one hot route can't take every connection. Requests over the cap
+    wait up to API_QUEUE_DEADLINE seconds, then fail with `BackendBusy`.
+    """
+
+    def __init__(self, base_url: str = None, token: str = None, transport: httpx.AsyncBaseTransport = None):
+        self.base_url = (base_url or os.getenv("API_BASE_URL", "http://backend:3000/api/v1")).rstrip("/")
+        token = token if token is not None else os.getenv("BOT_TOKEN", "")
+
+        limits = httpx.Limits(
+            max_connections=_env_int("API_MAX_CONNECTIONS", 100),
+            max_keepalive_connections=_env_int("API_MAX_KEEPALIVE", 20),
+            keepalive_expiry=_env_float("API_KEEPALIVE_EXPIRY", 30.0),
+        )
+        timeout = httpx.Timeout(
+            _env_float("API_TIMEOUT", 10.0),
+            connect=_env_float("API_CONNECT_TIMEOUT", 5.0),
+        )
+        http2 = transport is None and _http2_available()
+
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            headers={"Authorization": f"Bot {token}"},
+            limits=limits,
+            timeout=timeout,
+            http2=http2,
+            transport=transport,
+        )
+        # Subscription links point at third-party panels (Marzban); they get
+        # their own pool and never see the bot token.
+        self._external = httpx.AsyncClient(
+            limits=limits,
+            timeout=timeout,
+            http2=http2,
+            follow_redirects=True,
+            transport=transport,
+        )
+
+        self.route_limit = _env_int("API_ROUTE_CONCURRENCY", 16)
+        self.route_limits = _parse_route_limits(os.getenv("API_ROUTE_LIMITS", ""))
+        self.queue_deadline = _env_float("API_QUEUE_DEADLINE", 5.0)
+        self.gates = {}
+
+    def _gate(self, route: str) -> Gate:
+        gate = self.gates.get(route)
+        if gate is None:
+            gate = self.gates[route] = Gate(route, self.route_limits.get(route, self.route_limit))
+        return gate
+
+    async def request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        gate = self._gate(route_key(method, path))
+        status = "error"
+        start = time.perf_counter()
+        try:
+            async with gate.slot(self.queue_deadline):
+                resp = await self._client.request(method, path, **kwargs)
+                status = str(resp.status_code)
+                return resp
+        except GateTimeout:
+            status = "busy"
+            raise BackendBusy(f"Backend route {gate.name} saturated ({gate.waiting} waiting)") from None
+        finally:
+            # Includes time queued at the route gate, as the caller experiences it
+            BACKEND_SECONDS.observe(time.perf_counter() - start, route=gate.name, status=status)
+
+    def stats(self) -> dict:
+        return {route: gate.stats() for route, gate in self.gates.items()}
+
+    async def aclose(self):
+        await self._client.aclose()
+        await self._external.aclose()
+
+    # --- Users ---
+    async def get_or_create_user(self, telegram_id: int, language: str, invite_code: str = None, username: str = None) -> httpx.Response:
+        payload = {"telegram_id": telegram_id, "language": language}
+        if username is not None:
+            payload["username"] = username
+        if invite_code is not None:
+            payload["invite_code"] = invite_code
+        return await self.request("POST", "/users/", json=payload)
+
+    async def update_user_language(self, telegram_id: int, language: str) -> httpx.Response:
+        return await self.request("PATCH", f"/users/{telegram_id}/language", json={"language": language})
+
+    async def get_user_orders(self, telegram_id: int) -> httpx.Response:
+        return await self.request("GET", f"/users/{telegram_id}/orders")
+
+    async def get_subscriptions(self, telegram_id: int) -> httpx.Response:
+        return await self.request("GET", f"/users/{telegram_id}/subscriptions")
+
+    async def get_wg_config(self, telegram_id: int, sub_id, endpoint_id) -> httpx.Response:
+        return await self.request(
+            "GET",
+            f"/users/{telegram_id}/subscriptions/{sub_id}/wg_config",
+            params={"endpoint_id": endpoint_id},
+        )
+
+    # --- Plans ---
+    async def get_plans(self, server_type: str = None, include_inactive: bool = False) -> httpx.Response:
+        params = {}
+        if server_type:
+            params["type"] = server_type
+        if include_inactive:
+            params["all"] = "true"
+        return await self.request("GET", "/plans", params=params)
+
+    async def get_plan(self, plan_id) -> httpx.Response:
+        return await self.request("GET", f"/plans/{plan_id}")
+
+    async def create_plan(self, payload: dict) -> httpx.Response:
+        return await self.request("POST", "/plans", json=payload)
+
+    async def update_plan(self, plan_id, payload: dict) -> httpx.Response:
+        return await self.request("PATCH", f"/plans/{plan_id}", json=payload)
+
+    # --- WireGuard endpoints ---
+    async def get_endpoints(self, include_inactive: bool = False) -> httpx.Response:
+        params = {"all": "true"} if include_inactive else {}
+        return await self.request("GET", "/endpoints", params=params)
+
+    async def create_endpoint(self, payload: dict) -> httpx.Response:
+        return await self.request("POST", "/endpoints", json=payload)
+
+    async def update_endpoint(self, endpoint_id, payload: dict) -> httpx.Response:
+        return await self.request("PATCH", f"/endpoints/{endpoint_id}", json=payload)
+
+    # --- Settings ---
+    async def get_required_channel_settings(self) -> httpx.Response:
+        return await self.request("GET", "/settings/required_channel")
+
+    async def get_admin_settings(self) -> httpx.Response:
+        return await self.request("GET", "/admin/settings", timeout=5)
+
+    async def get_users_page(self, after_id: int = 0, limit: int = 500) -> httpx.Response:
+        """One page of users ordered by their backend ID, starting after `after_id`."""
+        return await self.request("GET", "/admin/users", params={"after_id": after_id, "limit": limit}, timeout=30.0)
+
+    # --- Orders ---
+    async def create_order(self, telegram_id: int, plan_id: int, endpoint_id: int, config_name: str, payment_method: str,
+                           amount: float, idempotency_key: str = None) -> httpx.Response:
+        headers = {"Idempotency-Key": idempotency_key} if idempotency_key else None
+        return await self.request("POST", "/orders/", headers=headers, json={
+            "telegram_id": telegram_id,
+            "plan_id": int(plan_id),
+            "endpoint_id": int(endpoint_id),
+            "config_name": config_name,
+            "payment_method": payment_method,
+            "amount": float(amount),
+        })
+
+    async def approve_order(self, order_id) -> httpx.Response:
+        # Provisioning through Marzban/WGPortal can take up to a minute
+        return await self.request("POST", f"/orders/{order_id}/approve", timeout=65.0)
+
+    async def reject_order(self, order_id) -> httpx.Response:
+        return await self.request("POST", f"/orders/{order_id}/reject")
+
+    async def manual_provision(self, order_id, config_link: str) -> httpx.Response:
+        return await self.request(
+            "POST",
+            f"/orders/{order_id}/manual_provision",
+            json={"config_link": config_link},
+            timeout=60.0,
+        )
+
+    # --- External ---
+    def stream_subscription(self, url: str):
+        """Stream a subscription body from the VPN panel (not the backend).
+
+        Use as `async with api.stream_subscription(url) as resp:`.
+        """
+        return self._external.stream("GET", url)
+
+
+_api: BackendClient = None
+
+
+def get_api() -> BackendClient:
+    """Return the shared backend client, creating it on first use."""
+    global _api
+    if _api is None:
+        _api = BackendClient()
+    return _api
+
+
+async def close_api():
+    global _api
+    if _api is not None:
+        await _api.aclose()
+        _api = None
@@ -1,7 +1,8 @@
+import abc
 import asyncio
 import logging
+import math
 import os
-import httpx
 from aiogram import Bot, Dispatcher, types, Router, F, BaseMiddleware
 from aiogram.filters import CommandStart, CommandObject
 from aiogram.enums import ParseMode
@@ -10,38 +11,69 @@ from aiogram.fsm.state import State, StatesGroup
 from aiogram.client.default import DefaultBotProperties
 from dotenv import load_dotenv
 from urllib.parse import urlparse
+from api_client import get_api, close_api
+from broadcast import broadcaster
+from catalog import endpoint_catalog, plan_catalog
+from cache import CachedValue, SharedCache, prefetch, close_cache_backend
+from utils import USER_LANG_CACHE, begin_update, end_update, set_user_cached_lang
+from fsm_storage import build_fsm_storage
+from keyboards import warm_keyboards
+from notifications import notifier
+from payment_watcher import payment_watcher
+from prober import prober
+from i18n import resolve_lang, t
+from jobs import jobs
+from metrics import HandlerTimingMiddleware, TelegramTimingMiddleware, TimedMiddleware, registry, start_metrics_server
+from throttling import Backoff, CallbackCoalesceMiddleware, ConcurrencyLimitMiddleware, RateLimitMiddleware
 
 load_dotenv("../.env")
 logging.basicConfig(level=logging.INFO)
 
-API_BASE_URL = os.getenv("API_BASE_URL", "http://localhost:3000/api/v1")
 bot_token = os.getenv("BOT_TOKEN")
 
-dp = Dispatcher()
+dp = Dispatcher(storage=build_fsm_storage())
 
 class RegistrationState(StatesGroup):
     waiting_for_invite_code = State()
 
 async def get_or_create_user(telegram_id: int, language: str, invite_code: str = "", username: str = ""):
-    async with httpx.AsyncClient(headers={"Authorization": f"Bot {os.getenv('BOT_TOKEN')}"}) as client:
-        try:
-            payload = {
-                "telegram_id": telegram_id,
-                "username": username,
-                "language": language,
-                "invite_code": invite_code
-            }
-            resp = await client.post(f"{API_BASE_URL}/users/", json=payload)
-            if resp.status_code == 200:
-                return resp.json(), None
-            else:
-                return None, resp.json()
-        except Exception as e:
-            logging.error(f"Failed to connect to backend: {e}")
-            return None, {"error": "connection_failed"}
-
-auth_cache = set()
-channel_verified_cache = set()
+    try:
+        resp = await get_api().get_or_create_user(telegram_id, language, invite_code, username)
+        if resp.status_code == 200:
+            return resp.json(), None
+        else:
+            return None, resp.json()
+    except Exception as e:
+        logging.error(f"Failed to connect to backend: {e}")
+        return None, {"error": "connection_failed"}
+
+# Registered users and users who passed the channel gate. Entries expire so a
+# user who leaves the channel is re-checked instead of staying verified forever.
+auth_cache = SharedCache("auth", "AUTH_CACHE_TTL", 3600)
+channel_verified_cache = SharedCache("channel", "CHANNEL_CACHE_TTL", 900)
+# Users the backend said need an invite code. Kept briefly so an unregistered
+# user's clicks and messages are turned away without a POST /users/ each.
+invite_required_cache = SharedCache("invite_required", "INVITE_REQUIRED_TTL", 60)
+# Wrong invite codes back off exponentially per user
+invite_attempts = Backoff()
+
+async def invite_code_throttled(message: types.Message, lang: str) -> bool:
+    """Tell the user to wait if they are still backing off from a wrong code."""
+    wait = invite_attempts.retry_after(message.from_user.id)
+    if not wait:
+        return False
+    await message.answer(t("invite_code_wait", lang, seconds=math.ceil(wait)))
+    return True
+
+async def ask_for_invite_code(event, state: FSMContext, lang: str):
+    if state:
+        await state.set_state(RegistrationState.waiting_for_invite_code)
+    msg_text = t("invite_only", lang)
+    if isinstance(event, types.Message):
+        await event.answer(msg_text, parse_mode=ParseMode.HTML)
+    elif isinstance(event, types.CallbackQuery):
+        await event.message.answer(msg_text, parse_mode=ParseMode.HTML)
+        await event.answer()
 
 def parse_required_channel(required_channel: str):
     """
@@ -110,29 +142,36 @@ def parse_required_channel(required_channel: str):
         join_url = f"https://t.me/{raw}"
         return username, display, join_url
 
+async def _fetch_channel_settings() -> dict:
+    resp = await get_api().get_required_channel_settings()
+    resp.raise_for_status()
+    return resp.json()
+
+# Both the channel and its link come from one settings document; fetch it once
+# and serve both fields from memory until the TTL runs out.
+channel_settings = CachedValue(_fetch_channel_settings, ttl=float(os.getenv("SETTINGS_CACHE_TTL", "60")))
+
+def invalidate_channel_settings():
+    """Force the next lookup to re-fetch the required channel settings."""
+    channel_settings.invalidate()
+
 async def get_required_channel():
     """Fetch the required channel from backend"""
-    async with httpx.AsyncClient(headers={"Authorization": f"Bot {os.getenv('BOT_TOKEN')}"}) as client:
-        try:
-            resp = await client.get(f"{API_BASE_URL}/settings/required_channel")
-            if resp.status_code == 200:
-                data = resp.json()
-                return data.get("required_channel", "").strip()
-        except Exception as e:
-            logging.error(f"Failed to fetch required channel: {e}")
-        return ""
+    try:
+        data = await channel_settings.get()
+        return (data.get("required_channel") or "").strip()
+    except Exception as e:
+        logging.error(f"Failed to fetch required channel: {e}")
+    return ""
 
 async def get_required_channel_link():
     """Fetch the optional required channel invite/link from backend"""
-    async with httpx.AsyncClient(headers={"Authorization": f"Bot {os.getenv('BOT_TOKEN')}"}) as client:
-        try:
-            resp = await client.get(f"{API_BASE_URL}/settings/required_channel")
-            if resp.status_code == 200:
-                data = resp.json()
-                return (data.get("required_channel_link") or "").strip()
-        except Exception as e:
-            logging.error(f"Failed to fetch required channel link: {e}")
-        return ""
+    try:
+        data = await channel_settings.get()
+        return (data.get("required_channel_link") or "").strip()
+    except Exception as e:
+        logging.error(f"Failed to fetch required channel link: {e}")
+    return ""
 
 async def check_channel_membership(bot: Bot, user_id: int, channel: str) -> bool:
     """Check if user is a member of the channel using Telegram API"""
@@ -161,33 +200,75 @@ async def check_channel_membership(bot: Bot, user_id: int, channel: str) -> bool
         # treat the user as NOT a member so the gate is effectively enforced.
         return False
 
-class ChannelVerificationMiddleware(BaseMiddleware):
+class UpdateContextMiddleware(BaseMiddleware):
+    """Outer update middleware: gives every update a fresh `UpdateContext`.
+
+    It is available to middlewares as `data["update_context"]` and to
+    helpers such as `get_user_lang` for the rest of the update.
+    """
+
     async def __call__(self, handler, event, data: dict):
-        if not isinstance(event, (types.Message, types.CallbackQuery)):
+        user = data.get("event_from_user")
+        ctx, token = begin_update(user.id if user else None)
+        data["update_context"] = ctx
+        try:
             return await handler(event, data)
+        finally:
+            end_update(token)
+
+class UserCheckMiddleware(BaseMiddleware, abc.ABC):
+    """A gate that runs at most once per update.
+
+    Once `allows()` let an update through, the decision is kept in its
+    `UpdateContext`, so the same check registered at another level (or
+    reached again) is a set lookup instead of more cache/backend calls.
+    """
+
+    name = ""
+
+    @abc.abstractmethod
+    async def allows(self, event, data: dict) -> bool:
+        """Whether the update may go on to the handler; answer the user before returning False."""
+
+    async def __call__(self, handler, event, data: dict):
+        ctx = data.get("update_context")
+        if ctx is not None and self.name in ctx.checked:
+            return await handler(event, data)
+        if not await self.allows(event, data):
+            return
+        if ctx is not None:
+            ctx.checked.add(self.name)
+        return await handler(event, data)
+
+class ChannelVerificationMiddleware(UserCheckMiddleware):
+    name = "channel"
+
+    async def allows(self, event, data: dict) -> bool:
+        if not isinstance(event, (types.Message, types.CallbackQuery)):
+            return True
         
         user = event.from_user
         if not user:
-            return await handler(event, data)
+            return True
         
         # Skip for admins
         admin_ids = [x.strip() for x in os.getenv("ADMIN_ID", "").split(",") if x.strip()]
         if str(user.id) in admin_ids:
-            return await handler(event, data)
+            return True
 
         # Only enforce channel gate after user has passed invite/registration.
         # This ensures the invite-only check always happens first.
         if user.id not in auth_cache:
-            return await handler(event, data)
+            return True
         
         # Skip if already verified
         if user.id in channel_verified_cache:
-            return await handler(event, data)
+            return True
         
         # Get bot instance from data
         bot: Bot = data.get("bot")
         if not bot:
-            return await handler(event, data)
+            return True
         
         # Get required channel configuration
         required_channel = await get_required_channel()            # ID or @username for strict checks
@@ -195,7 +276,7 @@ class ChannelVerificationMiddleware(BaseMiddleware):
 
         if not required_channel and not required_channel_link:
             # No channel requirement configured, allow access
-            return await handler(event, data)
+            return True
 
         # Determine whether we can perform a strict membership check
         is_member = False
@@ -204,8 +285,7 @@ class ChannelVerificationMiddleware(BaseMiddleware):
         
         if not is_member:
             # User is not a member (or we cannot verify), show join message
-            lang = user.language_code or "en"
-            initial_lang = "fa" if "fa" in lang else "en"
+            initial_lang = resolve_lang(user.language_code)
 
             # Decide what to show as the channel label
             display_source = required_channel or required_channel_link
@@ -215,29 +295,18 @@ class ChannelVerificationMiddleware(BaseMiddleware):
             # Decide which URL the Join button should open
             join_url = required_channel_link or fallback_join_url
 
-            msg_text = (
-                f"🔒 <b>Channel Membership Required</b>\n\n"
-                f"🇺🇸 Please join our channel to continue using this bot:\n"
-                f"📢 {channel_display}\n\n"
-                f"After joining, press the button below to verify."
-            ) if initial_lang == "en" else (
-                f"🔒 <b>عضویت در کانال الزامی است</b>\n\n"
-                f"🇮🇷 برای استفاده از ربات باید ابتدا در کانال ما عضو شوید.\n"
-                f"📢 {channel_display}\n\n"
-                f"۱️⃣ روی دکمه «عضویت در کانال» بزنید و وارد کانال شوید.\n"
-                f"۲️⃣ پس از عضویت، به ربات برگردید و روی دکمه «تأیید» بزنید."
-            )
+            msg_text = t("channel_required", initial_lang, channel=channel_display)
             
             from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
             verify_button = InlineKeyboardButton(
-                text="✅ Verify / تأیید" if initial_lang == "en" else "✅ تأیید",
+                text=t("btn_verify", initial_lang),
                 callback_data="verify_channel"
             )
             buttons = []
             # Create join button when we have a usable URL (public or invite link)
             if join_url:
                 join_button = InlineKeyboardButton(
-                    text=f"📢 Join Channel / عضویت در کانال" if initial_lang == "en" else f"📢 عضویت در کانال",
+                    text=t("btn_join_channel", initial_lang),
                     url=join_url
                 )
                 buttons.append([join_button])
@@ -249,104 +318,106 @@ class ChannelVerificationMiddleware(BaseMiddleware):
             elif isinstance(event, types.CallbackQuery):
                 await event.message.answer(msg_text, parse_mode=ParseMode.HTML, reply_markup=markup)
                 await event.answer()
-            return
+            return False
         
         # User is a member, add to cache
-        channel_verified_cache.add(user.id)
-        return await handler(event, data)
+        await channel_verified_cache.store(user.id)
+        return True
 
-class InviteMiddleware(BaseMiddleware):
-    async def __call__(self, handler, event, data: dict):
+class InviteMiddleware(UserCheckMiddleware):
+    name = "invite"
+
+    async def allows(self, event, data: dict) -> bool:
         if not isinstance(event, (types.Message, types.CallbackQuery)):
-            return await handler(event, data)
+            return True
             
         user = event.from_user
         if not user:
-            return await handler(event, data)
+            return True
+
+        # One batched lookup warms auth, channel and language state for this user
+        await prefetch(user.id, auth_cache, channel_verified_cache, USER_LANG_CACHE, invite_required_cache)
             
         if user.id in auth_cache:
-            return await handler(event, data)
+            return True
             
         state: FSMContext = data.get("state")
         current_state = await state.get_state() if state else None
+        initial_lang = resolve_lang(user.language_code)
         
         if current_state == RegistrationState.waiting_for_invite_code.state:
-            return await handler(event, data)
+            # Typed invite codes go on to process_invite_code; button presses
+            # from a user known to be unregistered are turned away from memory
+            if isinstance(event, types.Message) or user.id not in invite_required_cache:
+                return True
             
         if isinstance(event, types.Message) and event.text and event.text.startswith("/start"):
-            return await handler(event, data)
-            
-        user_lang = user.language_code or "en"
-        initial_lang = "fa" if "fa" in user_lang else "en"
+            return True
+
+        if user.id in invite_required_cache:
+            await ask_for_invite_code(event, state, initial_lang)
+            return False
         
         username = user.username or ""
         user_data, error_data = await get_or_create_user(user.id, initial_lang, "", username)
         
         if error_data and error_data.get("error") in ["invite_code_required", "invalid_invite_code"]:
-            if state:
-                await state.set_state(RegistrationState.waiting_for_invite_code)
-                
-            msg_text = (
-                "🔒 <b>Welcome! This bot is invite-only. / خوش آمدید! این ربات فقط با دعوتنامه کار می‌کند.</b>\n\n"
-                "🇺🇸 Please enter your invite code to continue. If you were invited by a friend, ask them for their invite code.\n\n"
-                "🇮🇷 لطفاً کد دعوت خود را وارد کنید. اگر توسط دوستتان دعوت شده‌اید، کد دعوت او را وارد کنید."
-            )
-            
-            if isinstance(event, types.Message):
-                await event.answer(msg_text, parse_mode=ParseMode.HTML)
-            elif isinstance(event, types.CallbackQuery):
-                await event.message.answer(msg_text, parse_mode=ParseMode.HTML)
-                await event.answer()
-            return
+            await invite_required_cache.store(user.id)
+            await ask_for_invite_code(event, state, initial_lang)
+            return False
             
         if user_data:
-            auth_cache.add(user.id)
+            await auth_cache.store(user.id)
+            # The same response carries the saved language; the handler needn't ask again
+            if user_data.get("language"):
+                await set_user_cached_lang(user.id, resolve_lang(user_data["language"]))
             
-        return await handler(event, data)
+        return True
+
+async def registered(telegram_id: int):
+    await auth_cache.store(telegram_id)
+    await invite_required_cache.forget(telegram_id)
+    invite_attempts.success(telegram_id)
 
 @dp.message(CommandStart())
 async def cmd_start(message: types.Message, command: CommandObject, state: FSMContext):
     await state.clear()
     
-    user_lang = message.from_user.language_code or "en"
     # Use Telegram locale only as initial default for new users
-    initial_lang = "fa" if "fa" in user_lang else "en"
+    initial_lang = resolve_lang(message.from_user.language_code)
     
     # Extract invite code if provided via deep link (e.g., /start 123456)
     invite_code = command.args.strip() if command.args else ""
 
+    user_id = message.from_user.id
+    if not invite_code and user_id in invite_required_cache:
+        await ask_for_invite_code(message, state, initial_lang)
+        return
+    # A code in the deep link is an invite-code attempt like any other
+    if invite_code and await invite_code_throttled(message, initial_lang):
+        return
+
     # Sync with backend - returns saved language for existing users
     username = message.from_user.username or ""
-    user_data, error_data = await get_or_create_user(message.from_user.id, initial_lang, invite_code, username)
+    user_data, error_data = await get_or_create_user(user_id, initial_lang, invite_code, username)
     
     if error_data and error_data.get("error") in ["invite_code_required", "invalid_invite_code"]:
-        await state.set_state(RegistrationState.waiting_for_invite_code)
-        msg_text = (
-            "🔒 <b>Welcome! This bot is invite-only. / خوش آمدید! این ربات فقط با دعوتنامه کار می‌کند.</b>\n\n"
-            "🇺🇸 Please enter your invite code to continue. If you were invited by a friend, ask them for their invite code.\n\n"
-            "🇮🇷 لطفاً کد دعوت خود را وارد کنید. اگر توسط دوستتان دعوت شده‌اید، کد دعوت او را وارد کنید."
-        )
-        await message.answer(msg_text, parse_mode=ParseMode.HTML)
+        if error_data.get("error") == "invalid_invite_code" and invite_code:
+            invite_attempts.failure(user_id)
+        await invite_required_cache.store(user_id)
+        await ask_for_invite_code(message, state, initial_lang)
         return
 
     if not user_data:
         await message.answer("⚠️ Failed to connect to our servers right now. Please try again later.")
         return
 
-    auth_cache.add(message.from_user.id)
+    await registered(user_id)
 
     # Use the language from DB (respects user's choice)
-    lang = user_data.get("language", initial_lang)
-
-    welcome_text = (
-        "👋 Welcome to our VPN Store!\n\n"
-        "Here you can buy high-speed V2Ray and WireGuard configs.\n"
-        "Please select an option below:"
-    ) if lang == "en" else (
-        "👋 به فروشگاه VPN ما خوش آمدید!\n\n"
-        "در اینجا می‌توانید کانفیگ‌های پرسرعت V2Ray و WireGuard را خریداری کنید.\n"
-        "لطفا یک گزینه را انتخاب کنید:"
-    )
+    lang = resolve_lang(user_data.get("language", initial_lang))
+
+    welcome_text = t("store_welcome", lang)
 
     from keyboards import get_main_menu
     admin_ids = [x.strip() for x in os.getenv("ADMIN_ID", "").split(",") if x.strip()]
@@ -357,14 +428,16 @@ async def cmd_start(message: types.Message, command: CommandObject, state: FSMCo
 @dp.message(RegistrationState.waiting_for_invite_code, F.text)
 async def process_invite_code(message: types.Message, state: FSMContext):
     invite_code = message.text.strip()
-    user_lang = message.from_user.language_code or "en"
-    initial_lang = "fa" if "fa" in user_lang else "en"
+    initial_lang = resolve_lang(message.from_user.language_code)
+    if await invite_code_throttled(message, initial_lang):
+        return
     
     username = message.from_user.username or ""
     user_data, error_data = await get_or_create_user(message.from_user.id, initial_lang, invite_code, username)
     
     if error_data and error_data.get("error") == "invalid_invite_code":
-        err_msg = "❌ Invalid invite code. Please try again." if initial_lang == "en" else "❌ کد دعوت نامعتبر است. لطفاً دوباره تلاش کنید."
+        invite_attempts.failure(message.from_user.id)
+        err_msg = t("invalid_invite_code", initial_lang)
         await message.answer(err_msg)
         return
 
@@ -372,23 +445,90 @@ async def process_invite_code(message: types.Message, state: FSMContext):
         await message.answer("⚠️ Failed to connect to our servers right now. Please try again later.")
         return
 
-    auth_cache.add(message.from_user.id)
+    await registered(message.from_user.id)
     await state.clear()
     
     from keyboards import get_main_menu
-    lang = user_data.get("language", initial_lang)
+    lang = resolve_lang(user_data.get("language", initial_lang))
     admin_ids = [x.strip() for x in os.getenv("ADMIN_ID", "").split(",") if x.strip()]
     is_admin = str(message.from_user.id) in admin_ids
     
-    success_text = "✅ <b>Registration Successful!</b>\n\nWelcome to our VPN Store. Please select an option below:" if lang == "en" else "✅ <b>ثبت‌نام با موفقیت انجام شد!</b>\n\nبه فروشگاه VPN ما خوش آمدید. لطفا یک گزینه را انتخاب کنید:"
+    success_text = t("registration_success", lang)
     await message.answer(success_text, reply_markup=get_main_menu(lang, is_admin=is_admin), parse_mode=ParseMode.HTML)
 
+def setup_middlewares(dp: Dispatcher) -> tuple:
+    """Register the update pipeline once, on the Dispatcher.
+
+    Inner middlewares of the Dispatcher already wrap the handlers of every
+    included router, so nothing is registered per router.
+    Returns the load-control middlewares (for their stats).
+    """
+    dp.update.outer_middleware(UpdateContextMiddleware())
+
+    # Load control goes first, so it also bounds the checks below:
+    # drop floods, fold repeated taps into one, then cap concurrency
+    rate_limit = RateLimitMiddleware()
+    coalesce_callbacks = CallbackCoalesceMiddleware()
+    concurrency_limit = ConcurrencyLimitMiddleware()
+    # Invite check first, then channel verification; last, time just the handler
+    invite_middleware = TimedMiddleware("invite", InviteMiddleware())
+    channel_middleware = TimedMiddleware("channel", ChannelVerificationMiddleware())
+    handler_timing = HandlerTimingMiddleware()
+
+    for observer in (dp.message, dp.callback_query):
+        observer.middleware(rate_limit)
+        if observer is dp.callback_query:
+            observer.middleware(coalesce_callbacks)
+        observer.middleware(concurrency_limit)
+        observer.middleware(invite_middleware)
+        observer.middleware(channel_middleware)
+        observer.middleware(handler_timing)
+    return rate_limit, coalesce_callbacks, concurrency_limit
+
+def register_metrics(rate_limit, coalesce_callbacks, concurrency_limit):
+    """Expose the stats() of caches, gates and background workers on /metrics."""
+    from media import qr_codes
+    from orders import order_index
+    from subscription_parser import parsed_subscriptions
+    from subscriptions import subscriptions
+    from wireguard import wg_configs
+
+    for name, cache in (
+        ("auth", auth_cache),
+        ("channel_verified", channel_verified_cache),
+        ("invite_required", invite_required_cache),
+        ("user_lang", USER_LANG_CACHE),
+        ("subscriptions", subscriptions),
+        ("parsed_subscriptions", parsed_subscriptions),
+        ("qr", qr_codes),
+        ("plan_catalog", plan_catalog),
+        ("endpoint_catalog", endpoint_catalog),
+        ("wg_configs", wg_configs),
+        ("channel_settings", channel_settings),
+    ):
+        registry.collect(f"cache_{name}", cache.stats)
+    registry.collect("backend_route", get_api().stats, label="route")
+    registry.collect("rate_limit", rate_limit.stats)
+    registry.collect("coalesce", coalesce_callbacks.stats)
+    registry.collect("invite_attempts", invite_attempts.stats)
+    registry.collect("concurrency", concurrency_limit.stats)
+    registry.collect("notify", notifier.stats)
+    registry.collect("broadcast", broadcaster.stats)
+    registry.collect("jobs", jobs.stats)
+    registry.collect("payment_watch", payment_watcher.stats)
+    registry.collect("orders", order_index.stats)
+    registry.collect("endpoint_probe", prober.stats, label="endpoint")
+
 async def main():
     if not bot_token:
         logging.error("BOT_TOKEN is missing in the environment variables.")
         return
 
     bot = Bot(token=bot_token, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+    # Shared, pooled backend client used by every handler
+    get_api()
+    await plan_catalog.preload()
+    warm_keyboards()
     
     from handlers import router as main_router
     from payment_handlers import router as payment_router
@@ -398,32 +538,35 @@ async def main():
     dp.include_router(payment_router)
     dp.include_router(admin_router)
     
-    # Apply middleware explicitly to Dispatcher and all Routers to ensure full coverage
-    invite_middleware = InviteMiddleware()
-    channel_middleware = ChannelVerificationMiddleware()
+    rate_limit, coalesce_callbacks, concurrency_limit = setup_middlewares(dp)
+    bot.session.middleware(TelegramTimingMiddleware())
+    register_metrics(rate_limit, coalesce_callbacks, concurrency_limit)
+    metrics_runner = await start_metrics_server()
     
-    # Apply invite middleware first, then channel verification
-    dp.message.middleware(invite_middleware)
-    dp.callback_query.middleware(invite_middleware)
-    main_router.message.middleware(invite_middleware)
-    main_router.callback_query.middleware(invite_middleware)
-    payment_router.message.middleware(invite_middleware)
-    payment_router.callback_query.middleware(invite_middleware)
-    admin_router.message.middleware(invite_middleware)
-    admin_router.callback_query.middleware(invite_middleware)
-    
-    # Apply channel verification middleware after invite check
-    dp.message.middleware(channel_middleware)
-    dp.callback_query.middleware(channel_middleware)
-    main_router.message.middleware(channel_middleware)
-    main_router.callback_query.middleware(channel_middleware)
-    payment_router.message.middleware(channel_middleware)
-    payment_router.callback_query.middleware(channel_middleware)
-    admin_router.message.middleware(channel_middleware)
-    admin_router.callback_query.middleware(channel_middleware)
-    
-    logging.info("Starting Telegram bot polling...")
-    await dp.start_polling(bot)
+    # Pick up a broadcast that was interrupted by the last shutdown
+    broadcaster.resume(bot)
+    payment_watcher.start(bot)
+    prober.start(endpoint_catalog)
+
+    try:
+        if os.getenv("BOT_MODE", "polling").lower() == "webhook":
+            from webhook import run_webhook
+            await run_webhook(dp, bot)
+        else:
+            logging.info("Starting Telegram bot polling...")
+            # A webhook left over from webhook mode would block getUpdates
+            await bot.delete_webhook()
+            await dp.start_polling(bot)
+    finally:
+        await broadcaster.shutdown()
+        await payment_watcher.shutdown()
+        await prober.shutdown()
+        await jobs.drain()
+        await notifier.drain()
+        await close_api()
+        await close_cache_backend()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
 
 if __name__ == "__main__":
     asyncio.run(main())
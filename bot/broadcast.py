@@ -0,0 +1,274 @@
+"""Admin broadcasts sent from the bot process, paced for Telegram's limits.
+
+An admin's message is copied to every user. Recipients are paged from
+`GET /admin/users` by backend ID, sends share one token bucket (Telegram
+allows roughly 30 messages a second per bot), and the last finished ID is
+checkpointed to disk after every batch, so a restarted bot picks the
+broadcast up where it stopped instead of starting over. If the recipient
+list can't be fetched even after retries, the checkpoint is kept and the
+admin gets a Resume button.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+from api_client import get_api
+
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "25"))
+BROADCAST_PAGE_SIZE = int(os.getenv("BROADCAST_PAGE_SIZE", "500"))
+BROADCAST_BATCH = int(os.getenv("BROADCAST_BATCH", "25"))
+BROADCAST_STATE_PATH = os.getenv("BROADCAST_STATE_PATH", "broadcast_state.json")
+BROADCAST_PROGRESS_INTERVAL = float(os.getenv("BROADCAST_PROGRESS_INTERVAL", "5"))
+SEND_ATTEMPTS = 3
+PAGE_ATTEMPTS = 5
+
+CANCEL_MARKUP = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="⛔️ Stop Broadcast", callback_data="broadcast_stop")]
+])
+RESUME_MARKUP = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(text="▶️ Resume Broadcast", callback_data="broadcast_resume")]
+])
+
+
+class SendBudget:
+    """Token bucket shared by every send; a RetryAfter pauses all of them."""
+
+    def __init__(self, rate: float, burst: float = None):
+        self.rate = rate
+        self.burst = burst or rate
+        self.tokens = self.burst
+        self.updated_at = time.monotonic()
+        self.resume_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float):
+        self.resume_at = max(self.resume_at, time.monotonic() + seconds)
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.resume_at:
+                    await asyncio.sleep(self.resume_at - now)
+                    continue
+                self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def _read_state(path: str):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logging.warning(f"[Broadcast] Ignoring unreadable checkpoint {path}: {e}")
+        return None
+
+
+def _write_state(path: str, state: dict):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, path)
+
+
+def format_progress(job: dict, done: bool = False) -> str:
+    elapsed = max(time.time() - job["started_at"], 1e-6)
+    delivered = job["sent"] + job["blocked"] + job["failed"]
+    title = "✅ **Broadcast finished**" if done else "📢 **Broadcast in progress...**"
+    if job.get("stopped"):
+        title = "⛔️ **Broadcast stopped**"
+    elif job.get("aborted"):
+        title = "⚠️ **Broadcast interrupted** (could not load recipients; progress is saved)"
+    return (
+        f"{title}\n\n"
+        f"Sent: {job['sent']}\n"
+        f"Blocked the bot: {job['blocked']}\n"
+        f"Failed: {job['failed']}\n"
+        f"Rate: {delivered / elapsed:.1f} msg/s"
+    )
+
+
+class Broadcaster:
+    def __init__(self, path: str = BROADCAST_STATE_PATH, rate: float = BROADCAST_RATE,
+                 page_size: int = BROADCAST_PAGE_SIZE, batch: int = BROADCAST_BATCH,
+                 progress_interval: float = BROADCAST_PROGRESS_INTERVAL):
+        self.path = path
+        self.budget = SendBudget(rate)
+        self.page_size = page_size
+        self.batch = batch
+        self.progress_interval = progress_interval
+        self.job = None
+        self.task = None
+        self._reported_at = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    def start(self, bot, admin_chat_id: int, from_chat_id: int, message_id: int, status_message_id: int):
+        """Copy `message_id` from `from_chat_id` to every user, reporting into the admin's status message."""
+        if self.running:
+            raise RuntimeError("a broadcast is already running")
+        self.job = {
+            "from_chat_id": from_chat_id,
+            "message_id": message_id,
+            "admin_chat_id": admin_chat_id,
+            "status_message_id": status_message_id,
+            "after_id": 0,
+            "sent": 0,
+            "blocked": 0,
+            "failed": 0,
+            "started_at": time.time(),
+        }
+        _write_state(self.path, self.job)
+        self._spawn(bot)
+
+    def resume(self, bot) -> bool:
+        """Continue an interrupted broadcast (restart or aborted run), if a checkpoint exists."""
+        job = _read_state(self.path)
+        if not job or self.running:
+            return False
+        logging.info(f"[Broadcast] Resuming after user {job['after_id']} ({job['sent']} sent so far)")
+        job.pop("aborted", None)
+        self.job = job
+        self._spawn(bot)
+        return True
+
+    def stop(self) -> bool:
+        """Stop the running broadcast for good (an admin pressed Stop)."""
+        if not self.running:
+            return False
+        self.job["stopped"] = True
+        self.task.cancel()
+        return True
+
+    async def shutdown(self):
+        """Interrupt the worker but keep the checkpoint, so the next start resumes it."""
+        if self.running:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+
+    def _spawn(self, bot):
+        self.task = asyncio.create_task(self._run(bot))
+
+    async def _page(self, after_id: int) -> list:
+        resp = await get_api().get_users_page(after_id, self.page_size)
+        resp.raise_for_status()
+        # Backends without paging return everyone; the ID filter keeps that correct
+        users = [u for u in resp.json() if u.get("id", 0) > after_id and u.get("telegram_id")]
+        return sorted(users, key=lambda u: u["id"])
+
+    async def _next_page(self, after_id: int) -> list:
+        for attempt in range(1, PAGE_ATTEMPTS + 1):
+            try:
+                return await self._page(after_id)
+            except Exception as e:
+                if attempt == PAGE_ATTEMPTS:
+                    raise
+                logging.warning(f"[Broadcast] Fetching users after {after_id} failed (attempt {attempt}): {e}")
+                await asyncio.sleep(min(2 ** attempt, 60))
+
+    async def _send(self, bot, chat_id: int):
+        job = self.job
+        attempt = 0
+        while True:
+            await self.budget.acquire()
+            try:
+                await bot.copy_message(chat_id=chat_id, from_chat_id=job["from_chat_id"], message_id=job["message_id"])
+                job["sent"] += 1
+                return
+            except TelegramRetryAfter as e:
+                # A flood wait says nothing about this recipient: wait it out
+                # (acquire() sleeps until then) without using up an attempt
+                self.budget.pause(e.retry_after)
+            except TelegramForbiddenError:
+                job["blocked"] += 1
+                return
+            except TelegramBadRequest as e:
+                logging.info(f"[Broadcast] Skipping {chat_id}: {e}")
+                break
+            except Exception as e:
+                attempt += 1
+                logging.warning(f"[Broadcast] Send to {chat_id} failed (attempt {attempt}): {e}")
+                if attempt >= SEND_ATTEMPTS:
+                    break
+                await asyncio.sleep(attempt)
+        job["failed"] += 1
+
+    async def _report(self, bot, done: bool = False):
+        now = time.monotonic()
+        if not done and now - self._reported_at < self.progress_interval:
+            return
+        self._reported_at = now
+        try:
+            await bot.edit_message_text(
+                format_progress(self.job, done),
+                chat_id=self.job["admin_chat_id"],
+                message_id=self.job["status_message_id"],
+                reply_markup=CANCEL_MARKUP if not done else RESUME_MARKUP if self.job.get("aborted") else None,
+                parse_mode="Markdown",
+            )
+        except TelegramBadRequest:
+            # "message is not modified" or the status message is gone
+            pass
+        except Exception as e:
+            logging.warning(f"[Broadcast] Could not update progress: {e}")
+
+    async def _run(self, bot):
+        job = self.job
+        try:
+            while True:
+                users = await self._next_page(job["after_id"])
+                if not users:
+                    break
+                for i in range(0, len(users), self.batch):
+                    chunk = users[i:i + self.batch]
+                    await asyncio.gather(*(self._send(bot, u["telegram_id"]) for u in chunk))
+                    job["after_id"] = chunk[-1]["id"]
+                    _write_state(self.path, job)
+                    await self._report(bot)
+        except asyncio.CancelledError:
+            if not job.get("stopped"):
+                # Shutdown: leave the checkpoint for the next start
+                raise
+        except Exception as e:
+            # Keep the checkpoint so resume() continues after the last finished user
+            logging.error(f"[Broadcast] Aborted after user {job['after_id']}, checkpoint kept: {e}")
+            job["aborted"] = True
+            try:
+                _write_state(self.path, job)
+            except OSError as write_error:
+                logging.warning(f"[Broadcast] Could not mark checkpoint as aborted: {write_error}")
+            await self._report(bot, done=True)
+            return
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        logging.info(f"[Broadcast] Done: {job['sent']} sent, {job['blocked']} blocked, {job['failed']} failed")
+        await self._report(bot, done=True)
+
+    def stats(self) -> dict:
+        job = self.job or {}
+        return {
+            "running": self.running,
+            "sent": job.get("sent", 0),
+            "blocked": job.get("blocked", 0),
+            "failed": job.get("failed", 0),
+            "after_id": job.get("after_id", 0),
+        }
+
+
+broadcaster = Broadcaster()
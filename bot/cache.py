@@ -0,0 +1,311 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class CachedValue:
+    """A single async-loaded value kept in memory for `ttl` seconds.
+
+    Concurrent misses share one in-flight load (single-flight), so a burst of
+    updates causes at most one backend request. Failed loads are not cached.
+    """
+
+    def __init__(self, loader, ttl: float):
+        self._loader = loader
+        self.ttl = ttl
+        self._value = _MISSING
+        self._expires_at = 0.0
+        self._inflight = None
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self):
+        if self._value is not _MISSING and time.monotonic() < self._expires_at:
+            self.hits += 1
+            return self._value
+
+        self.misses += 1
+        if self._inflight is None:
+            self._inflight = asyncio.ensure_future(self._load(self._generation))
+        # Shield so one cancelled waiter doesn't cancel the load for everyone else
+        return await asyncio.shield(self._inflight)
+
+    async def _load(self, generation: int):
+        task = asyncio.current_task()
+        try:
+            value = await self._loader()
+            # Don't store a result that was invalidated while it was loading
+            if generation == self._generation:
+                self._value = value
+                self._expires_at = time.monotonic() + self.ttl
+            return value
+        finally:
+            # invalidate() may have detached this load and another may be running
+            if self._inflight is task:
+                self._inflight = None
+
+    def invalidate(self):
+        """Drop the cached value so the next get() reloads it.
+
+        A load already in flight is detached: its waiters still get its
+        result, but later callers start a fresh load instead of joining it.
+        """
+        self._value = _MISSING
+        self._expires_at = 0.0
+        self._generation += 1
+        self._inflight = None
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses}
+
+
+class _Entry:
+    __slots__ = ("value", "expires_at")
+
+    def __init__(self, value, expires_at: float):
+        self.value = value
+        self.expires_at = expires_at
+
+
+class TTLCache:
+    """Bounded LRU cache with a per-entry TTL.
+
+    Holds at most `maxsize` entries; the least recently used one is evicted
+    when full and expired entries are dropped when they are next touched.
+    Supports both the set-style (`add`, `in`, `discard`) and dict-style
+    (`get`, `set`) usage of the plain containers it replaces.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _lookup(self, key, record: bool = True):
+        entry = self._data.get(key)
+        if entry is None or entry.expires_at <= time.monotonic():
+            if entry is not None:
+                del self._data[key]
+                self.expirations += 1
+            if record:
+                self.misses += 1
+            return None
+        if record:
+            self._data.move_to_end(key)
+            self.hits += 1
+        return entry
+
+    def get(self, key, default=None):
+        entry = self._lookup(key)
+        return default if entry is None else entry.value
+
+    def peek(self, key, default=None):
+        """Like `get`, but not counted in the stats and not refreshing LRU order."""
+        entry = self._lookup(key, record=False)
+        return default if entry is None else entry.value
+
+    def set(self, key, value=True, ttl: float = None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        entry = self._data.get(key)
+        if entry is not None:
+            entry.value = value
+            entry.expires_at = expires_at
+            self._data.move_to_end(key)
+            return
+        self._data[key] = _Entry(value, expires_at)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def add(self, key):
+        self.set(key, True)
+
+    def pop(self, key, default=None):
+        entry = self._data.pop(key, None)
+        return default if entry is None else entry.value
+
+    def discard(self, key):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __contains__(self, key) -> bool:
+        return self._lookup(key) is not None
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class RedisCacheBackend:
+    """Shared cache backend on any Redis-compatible server, so several bot
+    replicas see the same auth/channel/language state."""
+
+    def __init__(self, url: str, prefix: str = "sellbot:"):
+        import redis.asyncio as redis
+
+        self._redis = redis.Redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+
+    async def get_many(self, keys: list) -> list:
+        if not keys:
+            return []
+        # MGET answers every key in a single round trip
+        return await self._redis.mget([self.prefix + key for key in keys])
+
+    async def set(self, key: str, value: str, ttl: float):
+        await self._redis.set(self.prefix + key, value, ex=max(1, int(ttl)))
+
+    async def delete(self, key: str):
+        await self._redis.delete(self.prefix + key)
+
+    async def close(self):
+        await self._redis.aclose()
+
+
+_backend = None
+
+
+def get_cache_backend():
+    """Return the shared cache backend, or None for CACHE_BACKEND=memory.
+
+    With no shared backend, each SharedCache's local layer is the only copy.
+    """
+    global _backend
+    if _backend is None and os.getenv("CACHE_BACKEND", "memory").lower() == "redis":
+        _backend = RedisCacheBackend(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+    return _backend
+
+
+def set_cache_backend(backend):
+    global _backend
+    _backend = backend
+
+
+async def close_cache_backend():
+    global _backend
+    if _backend is not None:
+        await _backend.close()
+        _backend = None
+
+
+class SharedCache:
+    """Per-user state kept in a local TTLCache in front of the shared backend.
+
+    `in`, `get`, `add` and `discard` only touch the local copy. `fetch`,
+    `store` and `forget` also go to the backend, so other replicas see the
+    change. The local copy uses a shorter TTL (CACHE_LOCAL_TTL) so updates
+    made elsewhere are picked up reasonably quickly. Without a shared
+    backend the local copy is all there is and keeps the full TTL.
+    """
+
+    def __init__(self, namespace: str, ttl_env: str, default_ttl: float):
+        self.namespace = namespace
+        self.ttl = float(os.getenv(ttl_env, default_ttl))
+        self.local = TTLCache(
+            maxsize=int(os.getenv("USER_CACHE_SIZE", "100000")),
+            ttl=min(self.ttl, float(os.getenv("CACHE_LOCAL_TTL", "60"))),
+        )
+
+    def key(self, key) -> str:
+        return f"{self.namespace}:{key}"
+
+    def __contains__(self, key) -> bool:
+        return key in self.local
+
+    def __len__(self) -> int:
+        return len(self.local)
+
+    def get(self, key, default=None):
+        return self.local.get(key, default)
+
+    def add(self, key, value: str = "1"):
+        self.local.set(key, value)
+
+    def discard(self, key):
+        self.local.discard(key)
+
+    def clear(self):
+        self.local.clear()
+
+    def stats(self) -> dict:
+        return self.local.stats()
+
+    async def fetch(self, key, default=None):
+        value = self.local.get(key)
+        if value is not None:
+            return value
+        backend = get_cache_backend()
+        if backend is None:
+            return default
+        try:
+            (value,) = await backend.get_many([self.key(key)])
+        except Exception as e:
+            logging.warning(f"Cache backend read failed for {self.namespace}: {e}")
+            return default
+        if value is None:
+            return default
+        self.local.set(key, value)
+        return value
+
+    async def store(self, key, value: str = "1"):
+        backend = get_cache_backend()
+        if backend is None:
+            self.local.set(key, value, ttl=self.ttl)
+            return
+        self.local.set(key, value)
+        try:
+            await backend.set(self.key(key), value, self.ttl)
+        except Exception as e:
+            logging.warning(f"Cache backend write failed for {self.namespace}: {e}")
+
+    async def forget(self, key):
+        self.local.discard(key)
+        backend = get_cache_backend()
+        if backend is None:
+            return
+        try:
+            await backend.delete(self.key(key))
+        except Exception as e:
+            logging.warning(f"Cache backend delete failed for {self.namespace}: {e}")
+
+
+async def prefetch(key, *caches: SharedCache):
+    """Load `key` for every cache that misses locally with one batched backend read.
+
+    Only peeks at the local copies, so the caller's own lookup is the one
+    counted in the hit/miss stats.
+    """
+    backend = get_cache_backend()
+    if backend is None:
+        return
+    missing = [c for c in caches if c.local.peek(key) is None]
+    if not missing:
+        return
+    try:
+        values = await backend.get_many([c.key(key) for c in missing])
+    except Exception as e:
+        logging.warning(f"Cache backend prefetch failed: {e}")
+        return
+    for cache, value in zip(missing, values):
+        if value is not None:
+            cache.local.set(key, value)
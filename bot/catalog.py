@@ -0,0 +1,127 @@
+import logging
+import os
+
+from api_client import get_api
+from cache import CachedValue
+
+
+class PlanIndex:
+    """Immutable snapshot of the plan list, indexed by ID and server type."""
+
+    __slots__ = ("plans", "by_id", "by_type")
+
+    def __init__(self, plans: list):
+        self.plans = plans
+        self.by_id = {str(plan.get("ID")): plan for plan in plans}
+        self.by_type = {}
+        for plan in plans:
+            if plan.get("is_active"):
+                self.by_type.setdefault(plan.get("server_type"), []).append(plan)
+
+
+class PlanCatalog:
+    """In-memory copy of every plan, refreshed every PLAN_CATALOG_TTL seconds.
+
+    The purchase funnel reads plans from here instead of calling
+    `GET /plans` at each step. The admin handlers invalidate it after adding
+    or editing a plan. `version` increases whenever the plan list actually
+    changes, so derived data (e.g. keyboards) knows when to rebuild.
+    """
+
+    def __init__(self, ttl: float = None):
+        self.ttl = ttl if ttl is not None else float(os.getenv("PLAN_CATALOG_TTL", "300"))
+        self.version = 0
+        self._current = None
+        self._index = CachedValue(self._load, ttl=self.ttl)
+
+    async def _load(self) -> PlanIndex:
+        # ?all=true so plans that were just deactivated can still be looked up by ID, like GET /plans/{id}
+        resp = await get_api().get_plans(include_inactive=True)
+        resp.raise_for_status()
+        plans = resp.json()
+        index = PlanIndex(plans if isinstance(plans, list) else [])
+        if self._current is None or index.plans != self._current.plans:
+            self.version += 1
+        self._current = index
+        return index
+
+    async def index(self) -> PlanIndex:
+        try:
+            return await self._index.get()
+        except Exception as e:
+            if self._current is None:
+                raise
+            # Backend hiccup: keep selling from the last known plans
+            logging.warning(f"Plan catalog refresh failed, serving cached plans: {e}")
+            return self._current
+
+    def stats(self) -> dict:
+        return {"version": self.version, **self._index.stats()}
+
+    async def get(self, plan_id) -> dict | None:
+        return (await self.index()).by_id.get(str(plan_id))
+
+    async def active_by_type(self, server_type: str) -> list:
+        return (await self.index()).by_type.get(server_type, [])
+
+    async def preload(self):
+        try:
+            index = await self.index()
+            logging.info(f"Plan catalog loaded: {len(index.plans)} plans")
+        except Exception as e:
+            logging.warning(f"Could not preload plan catalog: {e}")
+
+    def invalidate(self):
+        self._index.invalidate()
+
+
+plan_catalog = PlanCatalog()
+
+
+class EndpointCatalog:
+    """In-memory copy of the active WireGuard endpoints (`GET /endpoints`).
+
+    The location picker reads from here instead of calling the backend on
+    every tap. Refreshed every ENDPOINT_CATALOG_TTL seconds; the admin
+    handlers invalidate it after toggling or adding an endpoint.
+    """
+
+    def __init__(self, ttl: float = None):
+        self.ttl = ttl if ttl is not None else float(os.getenv("ENDPOINT_CATALOG_TTL", "300"))
+        self.version = 0
+        self._current = None
+        self._endpoints = CachedValue(self._load, ttl=self.ttl)
+
+    async def _load(self) -> tuple:
+        resp = await get_api().get_endpoints()
+        resp.raise_for_status()
+        endpoints = resp.json()
+        endpoints = tuple(endpoints if isinstance(endpoints, list) else [])
+        if endpoints != self._current:
+            self.version += 1
+        self._current = endpoints
+        return endpoints
+
+    async def active(self) -> tuple:
+        try:
+            return await self._endpoints.get()
+        except Exception as e:
+            if self._current is None:
+                raise
+            logging.warning(f"Endpoint catalog refresh failed, serving cached endpoints: {e}")
+            return self._current
+
+    async def get(self, endpoint_id) -> dict | None:
+        for endpoint in await self.active():
+            if str(endpoint.get("ID")) == str(endpoint_id):
+                return endpoint
+        return None
+
+    def invalidate(self):
+        self._endpoints.invalidate()
+
+    def stats(self) -> dict:
+        return {"version": self.version, **self._endpoints.stats()}
+
+
+endpoint_catalog = EndpointCatalog()
@@ -0,0 +1,172 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections.abc import Mapping
+from typing import Any
+
+import aiosqlite
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS fsm (
+    key TEXT PRIMARY KEY,
+    state TEXT,
+    data TEXT NOT NULL DEFAULT '{}',
+    expires_at REAL NOT NULL
+)
+"""
+
+_UPSERT_STATE = (
+    "INSERT INTO fsm (key, state, expires_at) VALUES (?, ?, ?) "
+    "ON CONFLICT(key) DO UPDATE SET state = excluded.state, expires_at = excluded.expires_at"
+)
+_UPSERT_DATA = (
+    "INSERT INTO fsm (key, data, expires_at) VALUES (?, ?, ?) "
+    "ON CONFLICT(key) DO UPDATE SET data = excluded.data, expires_at = excluded.expires_at"
+)
+
+
+def _dumps(data: Mapping[str, Any]) -> str:
+    # Compact form: no whitespace, non-ASCII (Persian config names) kept as-is
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+
+class SQLiteStorage(BaseStorage):
+    """FSM storage in a SQLite file so checkout/admin flows survive restarts.
+
+    Writes are buffered and flushed in one transaction every `flush_interval`
+    seconds (or once `batch_size` keys are pending). Sessions untouched for
+    `ttl` seconds expire and are purged on the next flush.
+    """
+
+    def __init__(self, path: str, ttl: float = 86400, flush_interval: float = 0.2, batch_size: int = 100):
+        self.path = path
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.key_builder = DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+
+        self._db = None
+        self._connect_lock = asyncio.Lock()
+        self._flush_lock = asyncio.Lock()
+        self._flush_task = None
+        # Writes not yet handed to SQLite, and writes currently being committed
+        self._pending_state = {}
+        self._pending_data = {}
+        self._flushing_state = {}
+        self._flushing_data = {}
+
+    async def _connection(self) -> aiosqlite.Connection:
+        if self._db is None:
+            async with self._connect_lock:
+                if self._db is None:
+                    db = await aiosqlite.connect(self.path)
+                    await db.execute("PRAGMA journal_mode=WAL")
+                    await db.execute("PRAGMA synchronous=NORMAL")
+                    await db.execute(_SCHEMA)
+                    await db.commit()
+                    self._db = db
+        return self._db
+
+    async def _read(self, key: str, column: str):
+        db = await self._connection()
+        async with db.execute(f"SELECT {column} FROM fsm WHERE key = ? AND expires_at > ?", (key, time.time())) as cursor:
+            row = await cursor.fetchone()
+        return row[0] if row else None
+
+    async def _schedule_flush(self):
+        if len(self._pending_state) + len(self._pending_data) >= self.batch_size:
+            await self.flush()
+        elif self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_interval)
+        try:
+            await self.flush()
+        except Exception as e:
+            logging.error(f"FSM storage flush failed: {e}")
+
+    async def flush(self):
+        """Write every buffered change to SQLite in a single transaction."""
+        async with self._flush_lock:
+            if not self._pending_state and not self._pending_data:
+                return
+            self._flushing_state, self._pending_state = self._pending_state, {}
+            self._flushing_data, self._pending_data = self._pending_data, {}
+            now = time.time()
+            expires_at = now + self.ttl
+            db = await self._connection()
+            try:
+                # Purge expired sessions first so a new write can't revive old data
+                await db.execute("DELETE FROM fsm WHERE expires_at <= ?", (now,))
+                await db.executemany(_UPSERT_STATE, [(k, v, expires_at) for k, v in self._flushing_state.items()])
+                await db.executemany(_UPSERT_DATA, [(k, v, expires_at) for k, v in self._flushing_data.items()])
+                await db.execute("DELETE FROM fsm WHERE state IS NULL AND data = '{}'")
+                await db.commit()
+            except BaseException:
+                # Put the batch back (without clobbering newer writes) and let the caller see the error
+                self._pending_state = {**self._flushing_state, **self._pending_state}
+                self._pending_data = {**self._flushing_data, **self._pending_data}
+                raise
+            finally:
+                self._flushing_state = {}
+                self._flushing_data = {}
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        self._pending_state[self.key_builder.build(key)] = state.state if isinstance(state, State) else state
+        await self._schedule_flush()
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        k = self.key_builder.build(key)
+        for buffer in (self._pending_state, self._flushing_state):
+            if k in buffer:
+                return buffer[k]
+        return await self._read(k, "state")
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            msg = f"Data must be a dict or dict-like object, got {type(data).__name__}"
+            raise DataNotDictLikeError(msg)
+        self._pending_data[self.key_builder.build(key)] = _dumps(data)
+        await self._schedule_flush()
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        k = self.key_builder.build(key)
+        for buffer in (self._pending_data, self._flushing_data):
+            if k in buffer:
+                return json.loads(buffer[k])
+        raw = await self._read(k, "data")
+        return json.loads(raw) if raw else {}
+
+    async def close(self) -> None:
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+        await self.flush()
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+
+
+def build_fsm_storage() -> BaseStorage:
+    """Pick the FSM storage from FSM_STORAGE (memory, sqlite or redis)."""
+    kind = os.getenv("FSM_STORAGE", "memory").lower()
+    ttl = int(os.getenv("FSM_TTL", "86400"))
+
+    if kind == "sqlite":
+        return SQLiteStorage(os.getenv("FSM_DB_PATH", "fsm.sqlite3"), ttl=ttl)
+    if kind == "redis":
+        from aiogram.fsm.storage.redis import RedisStorage
+
+        return RedisStorage.from_url(
+            os.getenv("REDIS_URL", "redis://localhost:6379/0"),
+            key_builder=DefaultKeyBuilder(with_bot_id=True, with_destiny=True),
+            state_ttl=ttl,
+            data_ttl=ttl,
+        )
+    return MemoryStorage()
@@ -0,0 +1,65 @@
+"""User-facing texts, loaded from `locales/<lang>.json` once at startup.
+
+Every key gets a fixed slot number and each language is compiled into a flat
+list of strings, so `t()` is one dict read plus a list index. Keys missing
+from a locale fall back to the English text. Adding a language means
+dropping another JSON file into the locales directory; handlers only ever
+call `t(key, lang, **values)` with a language from `resolve_lang()`.
+"""
+
+import json
+import logging
+import os
+from functools import lru_cache
+
+DEFAULT_LANG = "en"
+LOCALES_DIR = os.getenv("LOCALES_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "locales"))
+
+
+def load_catalogs(path: str = LOCALES_DIR) -> dict:
+    """Read every `<lang>.json` in `path` into {lang: {key: text}}."""
+    catalogs = {}
+    for name in sorted(os.listdir(path)):
+        lang, ext = os.path.splitext(name)
+        if ext != ".json":
+            continue
+        with open(os.path.join(path, name), encoding="utf-8") as f:
+            catalogs[lang] = json.load(f)
+    if DEFAULT_LANG not in catalogs:
+        raise RuntimeError(f"locale '{DEFAULT_LANG}' is missing from {path}")
+    return catalogs
+
+
+def compile_catalogs(catalogs: dict) -> tuple:
+    """Turn {lang: {key: text}} into ({key: slot}, {lang: [text, ...]})."""
+    default = catalogs[DEFAULT_LANG]
+    keys = {key: slot for slot, key in enumerate(default)}
+    tables = {}
+    for lang, texts in catalogs.items():
+        unknown = set(texts) - set(keys)
+        if unknown:
+            logging.warning(f"[i18n] {lang}: ignoring keys not in {DEFAULT_LANG}: {sorted(unknown)}")
+        tables[lang] = [texts.get(key, default[key]) for key in keys]
+    return keys, tables
+
+
+_KEYS, _TABLES = compile_catalogs(load_catalogs())
+
+
+def t(key: str, lang: str, **values) -> str:
+    """The `key` text in `lang`, with `{placeholders}` filled from `values`."""
+    text = _TABLES.get(lang, _TABLES[DEFAULT_LANG])[_KEYS[key]]
+    return text.format_map(values) if values else text
+
+
+@lru_cache(maxsize=256)
+def resolve_lang(code: str) -> str:
+    """Map a stored or Telegram language code ("fa", "fa-IR", "EN") to a loaded locale."""
+    if not code:
+        return DEFAULT_LANG
+    base = code.strip().lower().replace("_", "-").split("-", 1)[0]
+    return base if base in _TABLES else DEFAULT_LANG
+
+
+def languages() -> list:
+    return sorted(_TABLES)
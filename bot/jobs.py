@@ -0,0 +1,155 @@
+"""Background jobs for slow backend calls (order approval/provisioning).
+
+A handler submits a job and answers Telegram straight away; the job runs
+as its own task, retries `RetryableJobError`s with exponential backoff and
+reports every state change to an `on_progress` callback (used to keep the
+admin's caption up to date). One job per key runs at a time, so repeated
+taps on the same button join the running job instead of starting another.
+"""
+
+import asyncio
+import logging
+import os
+import time
+
+from cache import TTLCache
+
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "4"))
+JOB_RETRY_DELAY = float(os.getenv("JOB_RETRY_DELAY", "5"))
+JOB_MAX_RETRY_DELAY = float(os.getenv("JOB_MAX_RETRY_DELAY", "60"))
+
+QUEUED = "queued"
+RUNNING = "running"
+RETRYING = "retrying"
+DONE = "done"
+FAILED = "failed"
+
+
+class JobError(Exception):
+    """The job failed in a way retrying won't fix."""
+
+
+class RetryableJobError(JobError):
+    """The job failed but may succeed if tried again later."""
+
+
+class Job:
+    def __init__(self, key: str, max_attempts: int):
+        self.key = key
+        self.status = QUEUED
+        self.attempt = 0
+        self.max_attempts = max_attempts
+        self.retry_in = 0.0
+        self.error = None
+        self.result = None
+        self.started_at = time.monotonic()
+        self.finished_at = None
+        self.task = None
+
+    @property
+    def active(self) -> bool:
+        return self.status not in (DONE, FAILED)
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+
+class JobRegistry:
+    def __init__(self, max_attempts: int = JOB_MAX_ATTEMPTS, retry_delay: float = JOB_RETRY_DELAY,
+                 max_retry_delay: float = JOB_MAX_RETRY_DELAY, keep: float = 3600):
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self._active = {}
+        # Finished jobs stay visible for a while for status lookups
+        self._finished = TTLCache(maxsize=10_000, ttl=keep)
+        self.submitted = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.retries = 0
+
+    def get(self, key: str):
+        return self._active.get(key) or self._finished.get(key)
+
+    def submit(self, key: str, run, on_progress=None) -> tuple:
+        """Start `await run(job)` in the background unless a job for `key` is already active.
+
+        Returns (job, created).
+        """
+        job = self._active.get(key)
+        if job is not None:
+            return job, False
+        job = Job(key, self.max_attempts)
+        self._active[key] = job
+        self._finished.discard(key)
+        self.submitted += 1
+        job.task = asyncio.create_task(self._run(job, run, on_progress))
+        return job, True
+
+    async def _notify(self, job: Job, on_progress):
+        if on_progress is None:
+            return
+        try:
+            await on_progress(job)
+        except Exception as e:
+            logging.warning(f"[Jobs] {job.key}: progress update failed: {e}")
+
+    async def _run(self, job: Job, run, on_progress):
+        while True:
+            job.attempt += 1
+            job.status = RUNNING
+            await self._notify(job, on_progress)
+            try:
+                job.result = await run(job)
+            except RetryableJobError as e:
+                job.error = str(e)
+                if job.attempt < job.max_attempts:
+                    job.status = RETRYING
+                    job.retry_in = min(self.retry_delay * 2 ** (job.attempt - 1), self.max_retry_delay)
+                    self.retries += 1
+                    logging.warning(f"[Jobs] {job.key}: attempt {job.attempt} failed ({e}), retrying in {job.retry_in:.0f}s")
+                    await self._notify(job, on_progress)
+                    await asyncio.sleep(job.retry_in)
+                    continue
+                job.status = FAILED
+            except Exception as e:
+                job.error = str(e)
+                job.status = FAILED
+            else:
+                job.status = DONE
+                job.error = None
+            break
+
+        job.finished_at = time.monotonic()
+        self._active.pop(job.key, None)
+        self._finished.set(job.key, job)
+        if job.status == DONE:
+            self.succeeded += 1
+        else:
+            self.failed += 1
+            logging.error(f"[Jobs] {job.key}: failed after {job.attempt} attempt(s): {job.error}")
+        await self._notify(job, on_progress)
+
+    async def drain(self, timeout: float = 30):
+        """Let running jobs finish (or give up) before shutdown."""
+        tasks = [job.task for job in self._active.values()]
+        if not tasks:
+            return
+        try:
+            async with asyncio.timeout(timeout):
+                await asyncio.gather(*tasks, return_exceptions=True)
+        except TimeoutError:
+            logging.warning(f"[Jobs] {len(self._active)} job(s) still running at shutdown")
+
+    def stats(self) -> dict:
+        return {
+            "active": len(self._active),
+            "submitted": self.submitted,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "retries": self.retries,
+        }
+
+
+jobs = JobRegistry()
@@ -1,41 +1,72 @@
+from functools import lru_cache
+
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from pydantic import ConfigDict
+
+from i18n import languages, t
+
+
+class FrozenKeyboard(InlineKeyboardMarkup):
+    """Markup that is built once and shared between updates; don't modify it."""
+
+    model_config = ConfigDict(frozen=True)
+
+
+def _button(key: str, lang: str, **kwargs) -> InlineKeyboardButton:
+    return InlineKeyboardButton(text=t(key, lang), **kwargs)
 
+
+@lru_cache(maxsize=None)
 def get_main_menu(lang: str, is_admin: bool = False) -> InlineKeyboardMarkup:
-    buttons = []
-    if lang == "en":
-        buttons = [
-            [InlineKeyboardButton(text="💎 Buy Config", callback_data="buy_menu")],
-            [InlineKeyboardButton(text="📦 My Subscriptions", callback_data="my_configs")],
-            [InlineKeyboardButton(text="👤 Profile", callback_data="profile"), 
-             InlineKeyboardButton(text="🌍 Language", callback_data="change_lang")],
-            [InlineKeyboardButton(text="🎁 Invite", callback_data="invite_friend"),
-             InlineKeyboardButton(text="🎧 Support", callback_data="support_menu")]
-        ]
-    else:
-        buttons = [
-            [InlineKeyboardButton(text="💎 خرید کانفیگ", callback_data="buy_menu")],
-            [InlineKeyboardButton(text="📦 سرویس‌های من", callback_data="my_configs")],
-            [InlineKeyboardButton(text="👤 پروفایل", callback_data="profile"), 
-             InlineKeyboardButton(text="🌍 تغییر زبان", callback_data="change_lang")],
-            [InlineKeyboardButton(text="🎁 دعوت از دوستان", callback_data="invite_friend"),
-             InlineKeyboardButton(text="🎧 پشتیبانی", callback_data="support_menu")]
-        ]
-        
+    buttons = [
+        [_button("btn_buy", lang, callback_data="buy_menu")],
+        [_button("btn_my_subs", lang, callback_data="my_configs")],
+        [_button("btn_profile", lang, callback_data="profile"),
+         _button("btn_language", lang, callback_data="change_lang")],
+        [_button("btn_invite", lang, callback_data="invite_friend"),
+         _button("btn_support", lang, callback_data="support_menu")]
+    ]
+
     if is_admin:
-        buttons.append([InlineKeyboardButton(text="⚙️ Admin Panel", callback_data="admin_panel")])
-        
-    return InlineKeyboardMarkup(inline_keyboard=buttons)
+        buttons.append([_button("btn_admin_panel", lang, callback_data="admin_panel")])
+
+    return FrozenKeyboard(inline_keyboard=buttons)
 
+@lru_cache(maxsize=None)
 def get_protocol_menu(lang: str) -> InlineKeyboardMarkup:
     # Users first select V2Ray or WireGuard
-    text_v2ray = "🌐 V2Ray"
-    text_wg = "⚡️ Anti-Sanction" if lang == "en" else "⚡️ ضد تحریم"
-    text_back = "🔙 Back" if lang == "en" else "🔙 بازگشت"
-
-    return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text=text_v2ray, callback_data="select_proto_v2ray")],
-        [InlineKeyboardButton(text=text_wg, callback_data="select_proto_wireguard")],
-        [InlineKeyboardButton(text=text_back, callback_data="main_menu")]
+    return FrozenKeyboard(inline_keyboard=[
+        [_button("btn_v2ray", lang, callback_data="select_proto_v2ray")],
+        [_button("btn_wireguard", lang, callback_data="select_proto_wireguard")],
+        [_button("btn_back", lang, callback_data="main_menu")]
+    ])
+
+@lru_cache(maxsize=None)
+def get_back_menu(lang: str, callback_data: str = "main_menu", label: str = "btn_back") -> InlineKeyboardMarkup:
+    """A single back/cancel button, e.g. `get_back_menu(lang, "my_configs", "btn_back_to_configs")`."""
+    return FrozenKeyboard(inline_keyboard=[[_button(label, lang, callback_data=callback_data)]])
+
+@lru_cache(maxsize=1)
+def get_language_menu() -> InlineKeyboardMarkup:
+    # One button per locale file, each labelled in its own language
+    buttons = [[_button("language_name", lang, callback_data=f"set_lang_{lang}")] for lang in languages()]
+    buttons.append([_button("btn_back", "en", callback_data="main_menu")])
+    return FrozenKeyboard(inline_keyboard=buttons)
+
+@lru_cache(maxsize=1024)
+def get_payment_methods_menu(plan_id: str, lang: str) -> InlineKeyboardMarkup:
+    return FrozenKeyboard(inline_keyboard=[
+        [_button("btn_pay_card", lang, callback_data=f"pay_card_{plan_id}")],
+        [_button("btn_pay_crypto", lang, callback_data=f"pay_crypto_{plan_id}")],
+        [_button("btn_back", lang, callback_data="buy_menu")]
+    ])
+
+@lru_cache(maxsize=1024)
+def get_config_name_menu(plan_id: str, lang: str) -> InlineKeyboardMarkup:
+    return FrozenKeyboard(inline_keyboard=[
+        [_button("btn_custom_name", lang, callback_data=f"custom_name_{plan_id}")],
+        [_button("btn_default_name", lang, callback_data=f"skip_cname_{plan_id}")],
+        [_button("btn_back", lang, callback_data="buy_menu")]
     ])
 
 def get_plans_menu(plans: list, lang: str) -> InlineKeyboardMarkup:
@@ -45,15 +76,48 @@ def get_plans_menu(plans: list, lang: str) -> InlineKeyboardMarkup:
         data_gb = plan.get('data_limit_gb', plan.get('DataLimitGB', '?'))
         plan_id = plan.get('ID', plan.get('id', 0))
         price_irr = plan.get('price_irr', plan.get('PriceIRR', 0))
-        
+
         price_toman = int(price_irr / 10) if isinstance(price_irr, (int, float)) else price_irr
         price_formatted_irr = f"{price_irr:,.0f}" if isinstance(price_irr, (int, float)) else price_irr
         price_formatted_toman = f"{price_toman:,.0f}" if isinstance(price_toman, int) else price_toman
-        
-        title = f"{duration} Days - {data_gb}GB - {price_formatted_irr} IRR" if lang == "en" else f"{duration} روز - {data_gb} گیگ - {price_formatted_toman} تومان"
+
+        title = t("plan_button", lang, duration=duration, data_gb=data_gb,
+                  price_irr=price_formatted_irr, price_toman=price_formatted_toman)
         buttons.append([InlineKeyboardButton(text=title, callback_data=f"select_plan_{plan_id}")])
-    
-    text_back = "🔙 Back" if lang == "en" else "🔙 بازگشت"
-    buttons.append([InlineKeyboardButton(text=text_back, callback_data="buy_menu")])
-    
+
+    buttons.append([_button("btn_back", lang, callback_data="buy_menu")])
+
+    return FrozenKeyboard(inline_keyboard=buttons)
+
+# (server_type, lang) -> (catalog version, markup)
+_plans_menus = {}
+
+def get_catalog_plans_menu(plans: list, lang: str, server_type: str, version: int) -> InlineKeyboardMarkup:
+    """Plans keyboard for one protocol, rebuilt only when the plan catalog version changes."""
+    cached = _plans_menus.get((server_type, lang))
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    markup = get_plans_menu(plans, lang)
+    _plans_menus[(server_type, lang)] = (version, markup)
+    return markup
+
+def get_wg_locations_menu(sub_id, endpoints, lang: str, label=None) -> InlineKeyboardMarkup:
+    """One button per WireGuard endpoint (in the given order), plus a zip of every location."""
+    label = label or (lambda ep: ep.get("name") or ep.get("address"))
+    buttons = [
+        [InlineKeyboardButton(text=label(ep), callback_data=f"dl_wg_{sub_id}_{ep.get('ID')}")]
+        for ep in endpoints
+    ]
+    if len(endpoints) > 1:
+        buttons.append([_button("btn_download_all_locations", lang, callback_data=f"dl_wgzip_{sub_id}")])
+    buttons.append([_button("btn_back", lang, callback_data="my_configs")])
     return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+def warm_keyboards():
+    """Build the static keyboards for every language up front."""
+    for lang in languages():
+        get_main_menu(lang, is_admin=False)
+        get_main_menu(lang, is_admin=True)
+        get_protocol_menu(lang)
+        get_back_menu(lang)
+    get_language_menu()
@@ -0,0 +1,155 @@
+import asyncio
+import hashlib
+import io
+import json
+import logging
+import os
+
+import segno
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import BufferedInputFile, FSInputFile, Message
+
+from cache import TTLCache
+
+
+async def answer_cached_photo(message: Message, file_id: str | None, upload, **kwargs) -> Message:
+    """Answer with a photo by `file_id`, uploading `await upload()` instead if
+    there is none or Telegram no longer accepts it."""
+    if file_id is not None:
+        try:
+            return await message.answer_photo(photo=file_id, **kwargs)
+        except TelegramBadRequest as e:
+            logging.warning(f"Cached file_id rejected, uploading again: {e}")
+    return await message.answer_photo(photo=await upload(), **kwargs)
+
+
+def _sent_file_id(sent: Message) -> str | None:
+    return sent.photo[-1].file_id if sent.photo else None
+
+
+def render_qr_png(data: str, scale: int = 10, border: int = 4) -> bytes:
+    """Render `data` as a QR code PNG (CPU-bound; call it off the event loop)."""
+    buffer = io.BytesIO()
+    segno.make(data, error="m").save(buffer, kind="png", scale=scale, border=border)
+    return buffer.getvalue()
+
+
+class QRCodes:
+    """QR images for subscription links, rendered locally.
+
+    PNGs are rendered in a worker thread and kept in an LRU cache. Once a
+    code has been sent, Telegram's `file_id` for it is reused so viewing the
+    same link again doesn't upload anything.
+    """
+
+    def __init__(self, maxsize: int = None):
+        maxsize = maxsize or int(os.getenv("QR_CACHE_SIZE", "1024"))
+        # TTLs are only a backstop here; entries are bounded by LRU eviction
+        self._png = TTLCache(maxsize=maxsize, ttl=86400)
+        self._file_ids = TTLCache(maxsize=maxsize * 10, ttl=30 * 86400)
+
+    async def png(self, link: str) -> bytes:
+        data = self._png.get(link)
+        if data is None:
+            data = await asyncio.to_thread(render_qr_png, link)
+            self._png.set(link, data)
+        return data
+
+    async def send(self, message: Message, link: str, **kwargs) -> Message:
+        """Answer `message` with the QR code for `link` as a photo."""
+
+        async def upload():
+            return BufferedInputFile(await self.png(link), filename="qr.png")
+
+        sent = await answer_cached_photo(message, self._file_ids.get(link), upload, **kwargs)
+        file_id = _sent_file_id(sent)
+        if file_id:
+            self._file_ids.set(link, file_id)
+        return sent
+
+    def stats(self) -> dict:
+        return {"png": self._png.stats(), "file_ids": self._file_ids.stats()}
+
+
+qr_codes = QRCodes()
+
+
+def _sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class MediaRegistry:
+    """Uploads each static asset once and reuses Telegram's `file_id`.
+
+    The file_ids are stored in a JSON file keyed by the asset's sha256, so
+    they survive restarts and a changed image is uploaded again
+    automatically.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or os.getenv("MEDIA_REGISTRY_PATH", "media_ids.json")
+        self._file_ids = None
+        self._hashes = {}
+        self._lock = asyncio.Lock()
+
+    def _read(self) -> dict:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable media registry {self.path}: {e}")
+            return {}
+
+    def _write(self, data: dict):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp, self.path)
+
+    async def _digest(self, asset: str) -> str:
+        mtime = os.stat(asset).st_mtime_ns
+        cached = self._hashes.get(asset)
+        if cached is None or cached[0] != mtime:
+            cached = (mtime, await asyncio.to_thread(_sha256_file, asset))
+            self._hashes[asset] = cached
+        return cached[1]
+
+    async def _registry(self) -> dict:
+        if self._file_ids is None:
+            self._file_ids = await asyncio.to_thread(self._read)
+        return self._file_ids
+
+    async def _remember(self, digest: str, file_id: str):
+        async with self._lock:
+            file_ids = await self._registry()
+            if file_ids.get(digest) == file_id:
+                return
+            file_ids[digest] = file_id
+            try:
+                await asyncio.to_thread(self._write, dict(file_ids))
+            except OSError as e:
+                logging.warning(f"Could not save media registry {self.path}: {e}")
+
+    async def send_photo(self, message: Message, asset: str, **kwargs) -> Message:
+        """Answer `message` with the image at `asset` as a photo."""
+        digest = await self._digest(asset)
+        file_ids = await self._registry()
+
+        async def upload():
+            return FSInputFile(asset)
+
+        sent = await answer_cached_photo(message, file_ids.get(digest), upload, **kwargs)
+        file_id = _sent_file_id(sent)
+        if file_id:
+            await self._remember(digest, file_id)
+        return sent
+
+
+media = MediaRegistry()
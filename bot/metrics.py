@@ -0,0 +1,232 @@
+"""Latency histograms and component stats in the Prometheus text format.
+
+Handlers, backend calls, Telegram API calls and the invite/channel
+middlewares record into histograms here; the `stats()` of caches, gates and
+background workers are read when the endpoint is scraped. Everything is
+served on METRICS_HOST:METRICS_PORT (`/metrics`); METRICS_PORT=0 turns the
+endpoint off while recording stays on.
+"""
+
+import logging
+import math
+import os
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from aiohttp import web
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))
+
+# Seconds; from a cache hit up to a slow provisioning call
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(int(value))
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self._series = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        series = self._series.get(key)
+        return sum(series[:-1]) if series else 0
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), series[:-1]):
+                cumulative += count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {series[-1]!r}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.histograms = []
+        # (prefix, label, stats function)
+        self.collectors = []
+
+    def histogram(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        histogram = Histogram(name, help, labelnames, buckets)
+        self.histograms.append(histogram)
+        return histogram
+
+    def collect(self, prefix: str, stats, label: str = None):
+        """Expose `stats()` as gauges named `bot_<prefix>_<key>`.
+
+        With `label`, stats() returns {label value: {key: number}} (e.g. one
+        entry per backend route). Nested dicts are flattened with `_`,
+        non-numeric values are skipped, and any dict with `hits` and
+        `misses` also gets a `hit_ratio`.
+        """
+        self.collectors.append((prefix, label, stats))
+
+    def _samples(self) -> dict:
+        samples = {}
+        for prefix, label, stats in self.collectors:
+            try:
+                data = stats()
+            except Exception as e:
+                logging.warning(f"[Metrics] {prefix} stats failed: {e}")
+                continue
+            groups = data.items() if label else [(None, data)]
+            for label_value, values in groups:
+                labels = _labels((label,), (label_value,)) if label else ""
+                for key, value in _flatten(values):
+                    samples.setdefault(f"bot_{prefix}_{key}", []).append((labels, value))
+        return samples
+
+    def render(self) -> str:
+        lines = []
+        for histogram in self.histograms:
+            lines.extend(histogram.render())
+        for name, values in sorted(self._samples().items()):
+            lines.append(f"# TYPE {name} gauge")
+            lines.extend(f"{name}{labels} {_number(value)}" for labels, value in values)
+        return "\n".join(lines) + "\n"
+
+
+def _flatten(values: dict, prefix: str = ""):
+    if "hits" in values and "misses" in values:
+        lookups = values["hits"] + values["misses"]
+        yield f"{prefix}hit_ratio", values["hits"] / lookups if lookups else 0.0
+    for key, value in values.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            yield from _flatten(value, f"{name}_")
+        elif isinstance(value, (bool, int, float)):
+            yield name, value
+
+
+registry = Registry()
+
+HANDLER_SECONDS = registry.histogram(
+    "bot_handler_seconds", "Time spent in each update handler.", ("handler", "outcome"))
+BACKEND_SECONDS = registry.histogram(
+    "bot_backend_request_seconds", "Backend API latency per route and status.", ("route", "status"))
+TELEGRAM_SECONDS = registry.histogram(
+    "bot_telegram_request_seconds", "Telegram Bot API latency per method.", ("method", "outcome"))
+MIDDLEWARE_SECONDS = registry.histogram(
+    "bot_middleware_seconds", "Time spent in a middleware itself, excluding the handlers it wraps.", ("middleware",))
+
+
+class HandlerTimingMiddleware(BaseMiddleware):
+    """Inner middleware: times the handler that matched the update."""
+
+    async def __call__(self, handler, event, data: dict):
+        handler_object = data.get("handler")
+        name = getattr(getattr(handler_object, "callback", None), "__name__", "unknown")
+        outcome = "ok"
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            outcome = "error"
+            raise
+        finally:
+            HANDLER_SECONDS.observe(time.perf_counter() - start, handler=name, outcome=outcome)
+
+
+class TimedMiddleware(BaseMiddleware):
+    """Wraps a middleware and records only its own share of the time."""
+
+    def __init__(self, name: str, middleware):
+        self.name = name
+        self.middleware = middleware
+
+    async def __call__(self, handler, event, data: dict):
+        downstream = 0.0
+
+        async def timed_handler(event, data):
+            nonlocal downstream
+            start = time.perf_counter()
+            try:
+                return await handler(event, data)
+            finally:
+                downstream += time.perf_counter() - start
+
+        start = time.perf_counter()
+        try:
+            return await self.middleware(timed_handler, event, data)
+        finally:
+            MIDDLEWARE_SECONDS.observe(time.perf_counter() - start - downstream, middleware=self.name)
+
+
+class TelegramTimingMiddleware(BaseRequestMiddleware):
+    """Bot session middleware: times every Bot API call."""
+
+    async def __call__(self, make_request, bot, method):
+        outcome = "ok"
+        start = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            outcome = type(e).__name__
+            raise
+        finally:
+            TELEGRAM_SECONDS.observe(time.perf_counter() - start, method=type(method).__name__, outcome=outcome)
+
+
+def build_metrics_app() -> web.Application:
+    async def handle_metrics(request: web.Request) -> web.Response:
+        return web.Response(text=registry.render(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    return app
+
+
+async def start_metrics_server(host: str = METRICS_HOST, port: int = METRICS_PORT):
+    """Serve /metrics in the background; returns the runner to clean up, or None if disabled."""
+    if not port:
+        return None
+    runner = web.AppRunner(build_metrics_app())
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logging.info(f"Metrics on http://{host}:{port}/metrics")
+    return runner
@@ -0,0 +1,143 @@
+"""Background fan-out of one message to many chats (admins, mostly).
+
+Handlers hand `notifier.dispatch()` the recipients and a `send(chat_id)`
+coroutine factory and carry on answering the user. Deliveries run
+concurrently behind a `Gate`, pause everyone on Telegram's RetryAfter, and
+retry transient failures with backoff. Per-chat outcomes are kept on the
+returned `Delivery` for logs and stats.
+"""
+
+import asyncio
+import logging
+import os
+import time
+
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+
+from throttling import Gate
+
+NOTIFY_CONCURRENCY = int(os.getenv("NOTIFY_CONCURRENCY", "8"))
+NOTIFY_MAX_ATTEMPTS = int(os.getenv("NOTIFY_MAX_ATTEMPTS", "5"))
+NOTIFY_RETRY_DELAY = float(os.getenv("NOTIFY_RETRY_DELAY", "2"))
+
+PENDING = "pending"
+SENT = "sent"
+FAILED = "failed"
+
+
+class Delivery:
+    """Outcome of one fan-out: chat_id -> PENDING/SENT/FAILED, plus attempts."""
+
+    def __init__(self, name: str, chat_ids):
+        self.name = name
+        self.results = {chat_id: PENDING for chat_id in chat_ids}
+        self.attempts = {chat_id: 0 for chat_id in chat_ids}
+        self.errors = {}
+        self.task = None
+
+    @property
+    def sent(self) -> list:
+        return [chat_id for chat_id, status in self.results.items() if status == SENT]
+
+    @property
+    def failed(self) -> list:
+        return [chat_id for chat_id, status in self.results.items() if status == FAILED]
+
+    @property
+    def done(self) -> bool:
+        return PENDING not in self.results.values()
+
+    async def wait(self):
+        if self.task is not None:
+            await asyncio.shield(self.task)
+        return self
+
+
+class Notifier:
+    def __init__(self, concurrency: int = NOTIFY_CONCURRENCY, max_attempts: int = NOTIFY_MAX_ATTEMPTS,
+                 retry_delay: float = NOTIFY_RETRY_DELAY):
+        self.gate = Gate("notify", concurrency)
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        # Set by a RetryAfter so every pending send waits out the flood limit
+        self._resume_at = 0.0
+        self._tasks = set()
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.flood_waits = 0
+
+    async def _wait_flood(self):
+        delay = self._resume_at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def _deliver(self, delivery: Delivery, chat_id, send):
+        while True:
+            delivery.attempts[chat_id] += 1
+            try:
+                await self._wait_flood()
+                async with self.gate.slot(None):
+                    await send(chat_id)
+            except TelegramRetryAfter as e:
+                # Flood control doesn't count as a failed attempt
+                delivery.attempts[chat_id] -= 1
+                self.flood_waits += 1
+                self._resume_at = max(self._resume_at, time.monotonic() + e.retry_after)
+                logging.warning(f"[Notify] {delivery.name}: flood limit, pausing {e.retry_after}s")
+                continue
+            except (TelegramForbiddenError, TelegramBadRequest) as e:
+                # Blocked bot, unknown chat, bad markup: retrying won't help
+                delivery.errors[chat_id] = str(e)
+            except Exception as e:
+                delivery.errors[chat_id] = str(e)
+                if delivery.attempts[chat_id] < self.max_attempts:
+                    self.retried += 1
+                    await asyncio.sleep(self.retry_delay * 2 ** (delivery.attempts[chat_id] - 1))
+                    continue
+            else:
+                delivery.results[chat_id] = SENT
+                delivery.errors.pop(chat_id, None)
+                self.sent += 1
+                return
+            delivery.results[chat_id] = FAILED
+            self.failed += 1
+            logging.error(f"[Notify] {delivery.name}: giving up on {chat_id} after "
+                          f"{delivery.attempts[chat_id]} attempt(s): {delivery.errors[chat_id]}")
+            return
+
+    async def _run(self, delivery: Delivery, send):
+        await asyncio.gather(*(self._deliver(delivery, chat_id, send) for chat_id in delivery.results))
+        if delivery.failed:
+            logging.warning(f"[Notify] {delivery.name}: delivered to {len(delivery.sent)}/{len(delivery.results)}")
+
+    def dispatch(self, name: str, chat_ids, send) -> Delivery:
+        """Start delivering `send(chat_id)` to every chat in the background."""
+        delivery = Delivery(name, dict.fromkeys(chat_ids))
+        delivery.task = asyncio.create_task(self._run(delivery, send))
+        self._tasks.add(delivery.task)
+        delivery.task.add_done_callback(self._tasks.discard)
+        return delivery
+
+    async def drain(self, timeout: float = 10):
+        """Give in-flight deliveries a chance to finish before shutdown."""
+        if not self._tasks:
+            return
+        try:
+            async with asyncio.timeout(timeout):
+                await asyncio.gather(*self._tasks, return_exceptions=True)
+        except TimeoutError:
+            logging.warning(f"[Notify] {len(self._tasks)} deliveries still pending at shutdown")
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._tasks),
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "flood_waits": self.flood_waits,
+            "gate": self.gate.stats(),
+        }
+
+
+notifier = Notifier()
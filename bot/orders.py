@@ -0,0 +1,94 @@
+"""Idempotent order creation for the checkout flows.
+
+Every checkout (one pass through the buy menu) gets a random `checkout_id`
+in the user's FSM data. The idempotency key is derived from the user, that
+checkout, the plan, the endpoint and the payment method, and is sent as the
+`Idempotency-Key` header of `POST /orders/`, so the backend returns the
+existing order for a repeat. The bot also remembers created orders locally
+(and in the FSM data) and joins concurrent duplicates, so a re-uploaded
+receipt or a second tap on "Crypto" doesn't reach the backend at all.
+"""
+
+import asyncio
+import hashlib
+import os
+import secrets
+
+from cache import TTLCache
+
+# How long a created order is remembered for repeats of the same checkout
+ORDER_INDEX_TTL = float(os.getenv("ORDER_INDEX_TTL", "3600"))
+
+
+def idempotency_key(telegram_id: int, checkout_id: str, plan_id, endpoint_id, payment_method: str) -> str:
+    raw = f"{telegram_id}:{checkout_id}:{plan_id}:{int(endpoint_id or 0)}:{payment_method}"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+# Per-user locks so two concurrent first taps agree on one checkout_id
+_checkout_locks = TTLCache(maxsize=50_000, ttl=60)
+
+
+async def ensure_checkout(state, telegram_id: int) -> str:
+    """The user's current checkout_id, starting a checkout if there is none."""
+    lock = _checkout_locks.get(telegram_id)
+    if lock is None:
+        lock = asyncio.Lock()
+        _checkout_locks.set(telegram_id, lock)
+    async with lock:
+        checkout_id = (await state.get_data()).get("checkout_id")
+        if not checkout_id:
+            checkout_id = secrets.token_hex(8)
+            await state.update_data(checkout_id=checkout_id)
+        return checkout_id
+
+
+async def checkout_key(state, telegram_id: int, plan_id, endpoint_id, payment_method: str) -> str:
+    """Idempotency key of this order in the user's current checkout."""
+    checkout_id = await ensure_checkout(state, telegram_id)
+    return idempotency_key(telegram_id, checkout_id, plan_id, endpoint_id, payment_method)
+
+
+class OrderIndex:
+    def __init__(self, ttl: float = ORDER_INDEX_TTL, maxsize: int = 50_000):
+        self._orders = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._inflight = {}
+        self.created = 0
+        self.reused = 0
+
+    async def create(self, key: str, state, create) -> tuple:
+        """Return (order, created); `await create()` must return the backend's order JSON.
+
+        Known orders come from this index or the FSM data; a create that is
+        already running for the same key is awaited instead of repeated.
+        """
+        order = self._orders.get(key)
+        if order is None:
+            order = (await state.get_data()).get("orders", {}).get(key)
+        if order is not None:
+            self.reused += 1
+            return order, False
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.reused += 1
+            return await asyncio.shield(task), False
+
+        task = asyncio.ensure_future(create())
+        self._inflight[key] = task
+        try:
+            order = await asyncio.shield(task)
+        finally:
+            self._inflight.pop(key, None)
+        if order.get("ID"):
+            self.created += 1
+            self._orders.set(key, order)
+            orders = (await state.get_data()).get("orders", {})
+            await state.update_data(orders={**orders, key: order})
+        return order, True
+
+    def stats(self) -> dict:
+        return {"pending": len(self._inflight), "known": len(self._orders), "created": self.created, "reused": self.reused}
+
+
+order_index = OrderIndex()
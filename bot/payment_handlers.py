@@ -2,24 +2,31 @@ from aiogram import Router, F
 from aiogram.types import CallbackQuery, Message
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-import httpx
 import os
 import logging
+import httpx
+from api_client import get_api
+from catalog import plan_catalog
+from i18n import t
+from jobs import RUNNING, RETRYING, DONE, JobError, RetryableJobError, jobs
+from keyboards import get_back_menu
+from notifications import notifier
+from orders import checkout_key, ensure_checkout, order_index
+from payment_watcher import payment_watcher
+from subscriptions import subscriptions
 from utils import get_user_lang
 
 router = Router()
-API_BASE_URL = os.getenv("API_BASE_URL", "http://backend:3000/api/v1")
 
 async def get_card_number():
     """Fetch card number from backend (dashboard-editable), fallback to env var."""
     try:
-        async with httpx.AsyncClient(headers={"Authorization": f"Bot {os.getenv('BOT_TOKEN')}"}) as client:
-            resp = await client.get(f"{API_BASE_URL}/admin/settings", timeout=5)
-            if resp.status_code == 200:
-                data = resp.json()
-                card = data.get("admin_card_number", "")
-                if card:
-                    return card
+        resp = await get_api().get_admin_settings()
+        if resp.status_code == 200:
+            data = resp.json()
+            card = data.get("admin_card_number", "")
+            if card:
+                return card
     except Exception:
         pass
     return os.getenv("ADMIN_CARD_NUMBER", "1234-5678-9012-3456")
@@ -38,24 +45,16 @@ async def process_card_payment(callback: CallbackQuery, state: FSMContext):
 
     # Save plan ID and endpoint ID in context
     await state.update_data(plan_id=plan_id, endpoint_id=endpoint_id)
+    # Start the checkout before any receipt arrives, so every receipt maps to one order
+    await ensure_checkout(state, callback.from_user.id)
 
     card_number = await get_card_number()
 
-    text = (
-        f"💳 <b>Manual Card Transfer</b>\n\n"
-        f"Please transfer the total amount to the following card number:\n\n"
-        f"💳 <code>{card_number}</code>\n\n"
-        f"📸 <i>After transferring, please upload a clear screenshot of your payment receipt here.</i>"
-    ) if lang == "en" else (
-        f"💳 <b>انتقال کارت به کارت</b>\n\n"
-        f"لطفاً مبلغ خرید را به شماره کارت زیر واریز نمایید:\n\n"
-        f"💳 <code>{card_number}</code>\n\n"
-        f"📸 <i>سپس اسکرین‌شات واضح از رسید پرداخت خود را همینجا ارسال کنید.</i>"
-    )
+    text = t("card_transfer", lang, card_number=card_number)
     
     from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
     markup = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="🔙 Back" if lang == "en" else "🔙 بازگشت", callback_data=f"select_plan_{plan_id}")]
+        [InlineKeyboardButton(text=t("btn_back", lang), callback_data=f"select_plan_{plan_id}")]
     ])
     
     await callback.message.edit_text(text, parse_mode="HTML", reply_markup=markup)
@@ -72,142 +71,164 @@ async def process_screenshot(message: Message, state: FSMContext, bot):
 
     file_id = message.photo[-1].file_id
 
-    async with httpx.AsyncClient(headers={"Authorization": f"Bot {os.getenv('BOT_TOKEN')}"}) as client:
-        try:
-            # Fetch the actual plan to get the real price
-            plan_resp = await client.get(f"{API_BASE_URL}/plans/{plan_id}")
-            if plan_resp.status_code != 200:
-                raise Exception("Plan not found")
-            plan_data = plan_resp.json()
-            real_price_irr = plan_data.get("price_irr", 0.0)
-
-            data = await state.get_data()
-            plan_id = data.get("plan_id")
-            endpoint_id = data.get("endpoint_id", 0)
-            config_name = data.get("config_name", "")
-
-            # Submit order to backend
-            async with httpx.AsyncClient(headers={"Authorization": f"Bot {os.getenv('BOT_TOKEN')}"}) as client:
-                order_resp = await client.post(f"{API_BASE_URL}/orders/", json={
-                    "telegram_id": message.from_user.id,
-                    "plan_id": int(plan_id),
-                    "endpoint_id": int(endpoint_id),
-                    "config_name": config_name,
-                    "payment_method": "card",
-                    "amount": float(real_price_irr)
-                })
-            order_data = order_resp.json()
-            order_id = order_data.get("ID")
+    api = get_api()
+    try:
+        # Look up the actual plan to get the real price
+        plan_data = await plan_catalog.get(plan_id)
+        if not plan_data:
+            raise Exception("Plan not found")
+        real_price_irr = plan_data.get("price_irr", 0.0)
+
+        data = await state.get_data()
+        plan_id = data.get("plan_id")
+        endpoint_id = data.get("endpoint_id", 0)
+        config_name = data.get("config_name", "")
+
+        # Submit order to backend; a second receipt in the same checkout reuses it
+        key = await checkout_key(state, message.from_user.id, plan_id, endpoint_id, "card")
+
+        async def create():
+            order_resp = await api.create_order(
+                message.from_user.id, plan_id, endpoint_id, config_name, "card", real_price_irr, idempotency_key=key
+            )
+            return order_resp.json()
+
+        order_data, created = await order_index.create(key, state, create)
+        order_id = order_data.get("ID")
+        if not order_id:
+            raise Exception(order_data.get("error") or "Order not created")
             
-            # Send screenshot to Admin group for approval using order_id and file_id
-            from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+        # Send screenshot to Admin group for approval using order_id and file_id
+        from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
             
-            # Fetch plan details to show admins what the user is buying
-            plan_name = f"Plan ID {plan_id}"
-            try:
-                resp = await client.get(f"{API_BASE_URL}/plans/{plan_id}")
-                if resp.status_code == 200:
-                    plan_data = resp.json()
-                    proto = str(plan_data.get("server_type", "")).upper()
-                    dur = plan_data.get("duration_days", 0)
-                    limit = plan_data.get("data_limit_gb", 0)
-                    plan_name = f"{proto} Plan - {dur} Days, {limit}GB"
-            except Exception as e:
-                logging.error(f"Failed to fetch plan details for order {order_id}: {e}")
-
-            admin_markup = InlineKeyboardMarkup(inline_keyboard=[
-                [
-                    InlineKeyboardButton(text="✅ Approve", callback_data=f"approve_order_{order_id}"),
-                    InlineKeyboardButton(text="❌ Reject", callback_data=f"reject_order_{order_id}")
-                ]
-            ])
-            admin_text = f"💳 **New Card Payment**\n\n**Order ID:** {order_id}\n**User ID:** {message.from_user.id}\n**Plan:** {plan_name}"
+        # Show admins what the user is buying
+        proto = str(plan_data.get("server_type", "")).upper()
+        dur = plan_data.get("duration_days", 0)
+        limit = plan_data.get("data_limit_gb", 0)
+        plan_name = f"{proto} Plan - {dur} Days, {limit}GB"
+
+        admin_markup = InlineKeyboardMarkup(inline_keyboard=[
+            [
+                InlineKeyboardButton(text="✅ Approve", callback_data=f"approve_order_{order_id}"),
+                InlineKeyboardButton(text="❌ Reject", callback_data=f"reject_order_{order_id}")
+            ]
+        ])
+        admin_text = f"💳 **New Card Payment**\n\n**Order ID:** {order_id}\n**User ID:** {message.from_user.id}\n**Plan:** {plan_name}"
             
-            for admin_id in ADMIN_IDS:
-                try:
-                    await bot.send_photo(chat_id=admin_id, photo=file_id, caption=admin_text, reply_markup=admin_markup, parse_mode="Markdown")
-                except Exception as e:
-                    logging.error(f"Could not submit to admin {admin_id}: {e}")
-
-            user_text = (
-                "🧾 <b>Receipt Received & Pending Verification!</b>\n\n"
-                "Thank you for your payment. Our team will verify it shortly and your config will be automatically sent here."
-            ) if lang == "en" else (
-                "🧾 <b>رسید دریافت شد و در حال بررسی است!</b>\n\n"
-                "از پرداخت شما سپاسگزاریم. تیم ما به زودی آن را تایید کرده و سرویس شما در همینجا ارسال خواهد شد."
+        # Admins are notified in the background; the user is answered right away
+        if created:
+            notifier.dispatch(
+                f"order {order_id}",
+                ADMIN_IDS,
+                lambda admin_id: bot.send_photo(chat_id=admin_id, photo=file_id, caption=admin_text, reply_markup=admin_markup, parse_mode="Markdown"),
             )
+
+        user_text = t("receipt_received", lang)
             
-            markup = InlineKeyboardMarkup(inline_keyboard=[
-                [InlineKeyboardButton(text="🔙 Main Menu" if lang == "en" else "🔙 منوی اصلی", callback_data="main_menu")]
-            ])
-            await message.answer(user_text, reply_markup=markup, parse_mode="HTML")
-            await state.clear()
-        except Exception as e:
-            text = "❌ Error processing your request." if lang == "en" else "❌ خطا در پردازش درخواست شما."
-            from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-            markup = InlineKeyboardMarkup(inline_keyboard=[
-                [InlineKeyboardButton(text="🔙 Main Menu" if lang == "en" else "🔙 منوی اصلی", callback_data="main_menu")]
-            ])
-            await message.answer(text, reply_markup=markup)
-            await state.clear()
+        markup = get_back_menu(lang, "main_menu", "btn_main_menu")
+        await message.answer(user_text, reply_markup=markup, parse_mode="HTML")
+        await state.clear()
+    except Exception as e:
+        text = t("request_failed", lang)
+        markup = get_back_menu(lang, "main_menu", "btn_main_menu")
+        await message.answer(text, reply_markup=markup)
+        await state.clear()
+
+def _provisioning_failed_markup(order_id):
+    from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="🔁 Retry Provisioning", callback_data=f"retry_provision_{order_id}")],
+        [InlineKeyboardButton(text="⚙️ Set Manual Config", callback_data=f"manual_config_{order_id}")],
+        [InlineKeyboardButton(text="❌ Reject Order instead", callback_data=f"reject_order_{order_id}")]
+    ])
+
+async def _approve(order_id) -> dict:
+    """One approve attempt; provisioning and connection failures are worth retrying.
+
+    Repeating an approve is safe: the backend claims the order before
+    provisioning, so while an earlier attempt is still running (e.g. ours
+    timed out waiting for it) it answers 409 instead of provisioning again,
+    and "Already approved" once that attempt has succeeded.
+    """
+    try:
+        resp = await get_api().approve_order(order_id)
+    except (httpx.ConnectError, httpx.PoolTimeout) as e:
+        # Never reached the backend (PoolTimeout covers BackendBusy)
+        raise RetryableJobError(f"backend unreachable ({type(e).__name__})")
+    except httpx.HTTPError as e:
+        # Sent, but the answer was lost; the next attempt finds out how it went
+        raise RetryableJobError(f"no answer from backend ({type(e).__name__}), checking again")
+    subscriptions.invalidate_from_response(resp)
+    try:
+        data = resp.json()
+    except ValueError:
+        # e.g. an HTML error page from a proxy in front of the backend
+        data = {}
+    if resp.status_code == 200:
+        return data
+    if data.get("error") == "provisioning_in_progress":
+        raise RetryableJobError("still provisioning on the backend")
+    if data.get("error") == "provisioning_failed" or resp.status_code >= 500:
+        raise RetryableJobError(data.get("message") or data.get("error") or f"HTTP {resp.status_code}")
+    raise JobError(data.get("message") or data.get("error") or f"HTTP {resp.status_code}")
+
+def approval_progress(bot, chat_id: int, message_id: int, base_caption: str, order_id, done_label: str):
+    """Keeps the admin's receipt caption in step with the approval job."""
+    async def on_progress(job):
+        markup = None
+        if job.status == RUNNING:
+            note = f"⏳ **Provisioning...** (attempt {job.attempt}/{job.max_attempts})"
+        elif job.status == RETRYING:
+            note = f"🔁 Attempt {job.attempt} failed: {job.error}\nRetrying in {job.retry_in:.0f}s..."
+        elif job.status == DONE:
+            note = f"{done_label} — VPN config provisioned and sent to user."
+        else:
+            note = f"⚠️ **Approve failed after {job.attempt} attempt(s):** {job.error}"
+            markup = _provisioning_failed_markup(order_id)
+        await bot.edit_message_caption(
+            chat_id=chat_id, message_id=message_id, caption=f"{base_caption}\n\n{note}",
+            reply_markup=markup, parse_mode=None,
+        )
+    return on_progress
+
+async def _start_approval(callback: CallbackQuery, bot, done_label: str):
+    order_id = callback.data.split("_")[-1]
+    job, created = jobs.submit(
+        f"approve:{order_id}",
+        lambda job: _approve(order_id),
+        approval_progress(
+            bot, callback.message.chat.id, callback.message.message_id,
+            callback.message.caption or "", order_id, done_label,
+        ),
+    )
+    # Answered right away; the caption shows the outcome when the job ends
+    if created:
+        await callback.answer("⏳ Approval started, progress is shown on the receipt.")
+    else:
+        await callback.answer(f"⏳ Already in progress (attempt {job.attempt}/{job.max_attempts}).")
 
 @router.callback_query(F.data.startswith("approve_order_"))
 async def process_approve_order(callback: CallbackQuery, bot):
-    order_id = callback.data.split("_")[-1]
-    
-    async with httpx.AsyncClient(headers={"Authorization": f"Bot {os.getenv('BOT_TOKEN')}"}) as client:
-        try:
-            resp = await client.post(f"{API_BASE_URL}/orders/{order_id}/approve", timeout=65.0)
-            data = resp.json()
-            
-            if resp.status_code == 200:
-                await callback.message.edit_caption(
-                    caption=callback.message.caption + "\n\n✅ **APPROVED** — VPN config provisioned and sent to user."
-                )
-                await callback.answer("✅ Order approved! Config sent to user.", show_alert=True)
-            else:
-                error_type = data.get("error", "")
-                error_msg = data.get("message", "Unknown error")
-                
-                if error_type == "provisioning_failed":
-                    from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-                    markup = InlineKeyboardMarkup(inline_keyboard=[
-                        [InlineKeyboardButton(text="🔁 Retry Provisioning", callback_data=f"retry_provision_{order_id}")],
-                        [InlineKeyboardButton(text="⚙️ Set Manual Config", callback_data=f"manual_config_{order_id}")],
-                        [InlineKeyboardButton(text="❌ Reject Order instead", callback_data=f"reject_order_{order_id}")]
-                    ])
-                    # Update caption to show it failed to provision
-                    await callback.message.edit_caption(
-                        caption=callback.message.caption + "\n\n⚠️ **Provisioning Failed!** Server or API is down.",
-                        reply_markup=markup
-                    )
-                    await callback.answer(f"⚠️ Failed to provision config.", show_alert=True)
-                else:
-                    await callback.message.edit_caption(
-                        caption=callback.message.caption + f"\n\n⚠️ Approve issue: {error_msg}"
-                    )
-                    await callback.answer(f"Issue: {error_msg}", show_alert=True)
-        except Exception as e:
-            logging.error(f"Approve order error: {e}")
-            await callback.answer("❌ Backend connection timeout/error", show_alert=True)
+    await _start_approval(callback, bot, "✅ **APPROVED**")
     
 @router.callback_query(F.data.startswith("reject_order_"))
 async def process_reject_order(callback: CallbackQuery, bot):
     order_id = callback.data.split("_")[-1]
     
-    async with httpx.AsyncClient(headers={"Authorization": f"Bot {os.getenv('BOT_TOKEN')}"}) as client:
-        try:
-            resp = await client.post(f"{API_BASE_URL}/orders/{order_id}/reject")
-            if resp.status_code == 200:
-                await callback.message.edit_caption(
-                    caption=callback.message.caption + "\n\n❌ **REJECTED** — User has been notified."
-                )
-                await callback.answer("Order rejected.", show_alert=True)
-            else:
-                await callback.answer("Error rejecting order", show_alert=True)
-        except Exception as e:
-            logging.error(f"Reject order error: {e}")
-            await callback.answer("❌ Backend connection error", show_alert=True)
+    api = get_api()
+    try:
+        resp = await api.reject_order(order_id)
+        subscriptions.invalidate_from_response(resp)
+        if resp.status_code == 200:
+            await callback.message.edit_caption(
+                caption=callback.message.caption + "\n\n❌ **REJECTED** — User has been notified."
+            )
+            await callback.answer("Order rejected.", show_alert=True)
+        else:
+            await callback.answer("Error rejecting order", show_alert=True)
+    except Exception as e:
+        logging.error(f"Reject order error: {e}")
+        await callback.answer("❌ Backend connection error", show_alert=True)
 
 @router.callback_query(F.data.startswith("pay_crypto_"))
 async def process_crypto_payment(callback: CallbackQuery, state: FSMContext):
@@ -216,11 +237,7 @@ async def process_crypto_payment(callback: CallbackQuery, state: FSMContext):
     endpoint_id = int(parts[3]) if len(parts) > 3 else 0
     lang = await get_user_lang(callback.from_user.id)
 
-    text = (
-        "🔗 <i>Generating your secure Crypto payment link...</i>"
-    ) if lang == "en" else (
-        "🔗 <i>در حال ایجاد لینک امن پرداخت کریپتو...</i>"
-    )
+    text = t("crypto_generating", lang)
     
     if getattr(callback.message, "photo", None):
         try:
@@ -231,100 +248,63 @@ async def process_crypto_payment(callback: CallbackQuery, state: FSMContext):
     else:
         msg = await callback.message.edit_text(text)
     
-    async with httpx.AsyncClient(headers={"Authorization": f"Bot {os.getenv('BOT_TOKEN')}"}) as client:
-        try:
-            # Fetch the actual plan to get the real crypto price
-            plan_resp = await client.get(f"{API_BASE_URL}/plans/{plan_id}")
-            if plan_resp.status_code != 200:
-                raise Exception("Plan not found")
-            plan_data = plan_resp.json()
-            real_price_usdt = plan_data.get("price_usdt", 0.0)
-
-            # We create an order first
-            data = await state.get_data()
-            config_name = data.get("config_name", "")
-
-            order_resp = await client.post(f"{API_BASE_URL}/orders/", json={
-                "telegram_id": callback.from_user.id,
-                "plan_id": int(plan_id),
-                "endpoint_id": int(endpoint_id),
-                "config_name": config_name,
-                "payment_method": "crypto",
-                "amount": float(real_price_usdt)
-            })
-            order_data = order_resp.json()
-            order_id = order_data.get("ID")
+    api = get_api()
+    try:
+        # Look up the actual plan to get the real crypto price
+        plan_data = await plan_catalog.get(plan_id)
+        if not plan_data:
+            raise Exception("Plan not found")
+        real_price_usdt = plan_data.get("price_usdt", 0.0)
+
+        # We create an order first
+        data = await state.get_data()
+        config_name = data.get("config_name", "")
+
+        # Tapping "Crypto" again in the same checkout shows the same order and pay link
+        key = await checkout_key(state, callback.from_user.id, plan_id, endpoint_id, "crypto")
+
+        async def create():
+            order_resp = await api.create_order(
+                callback.from_user.id, plan_id, endpoint_id, config_name, "crypto", real_price_usdt, idempotency_key=key
+            )
+            return order_resp.json()
+
+        order_data, created = await order_index.create(key, state, create)
+        order_id = order_data.get("ID")
+        if not order_id:
+            raise Exception(order_data.get("error") or "Order not created")
             
-            # Now we use the actual payLink from the backend
-            payment_url = order_data.get("payLink")
-            if not payment_url:
-                payment_url = f"https://oxapay.com/pay/{order_id}test" # Fallback test link
+        # Now we use the actual payLink from the backend
+        payment_url = order_data.get("payLink")
+        if not payment_url:
+            payment_url = f"https://oxapay.com/pay/{order_id}test" # Fallback test link
             
-            success_text = (
-                f"🛡 <b>Order #{order_id} Created!</b>\n\n"
-                f"💰 <b>Amount:</b> {real_price_usdt} USDT (TRC20/BEP20)\n\n"
-                f"⚡️ <i>Click the button below to complete your payment. Your config will be generated automatically upon blockchain confirmation!</i>"
-            ) if lang == "en" else (
-                f"🛡 <b>سفارش #{order_id} ایجاد شد!</b>\n\n"
-                f"💰 <b>مبلغ:</b> {real_price_usdt} تتر (USDT / TRC20 یا BEP20)\n\n"
-                f"⚡️ <i>برای پرداخت روی دکمه زیر کلیک کنید. کانفیگ شما بلافاصله پس از تایید شبکه کریپتو به‌صورت خودکار صادر خواهد شد!</i>"
-            )
+        success_text = t("crypto_order_created", lang, order_id=order_id, amount=real_price_usdt)
             
-            from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-            markup = InlineKeyboardMarkup(inline_keyboard=[
-                [InlineKeyboardButton(text="💳 Pay Now (Oxapay)" if lang == "en" else "💳 پرداخت اکنون (Oxapay)", url=payment_url)],
-                [InlineKeyboardButton(text="🔙 Back" if lang == "en" else "🔙 بازگشت", callback_data="buy_menu")]
-            ])
+        from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+        markup = InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text=t("btn_pay_now", lang), url=payment_url)],
+            [InlineKeyboardButton(text=t("btn_back", lang), callback_data="buy_menu")]
+        ])
             
-            await msg.edit_text(success_text, parse_mode="HTML", reply_markup=markup)
+        await msg.edit_text(success_text, parse_mode="HTML", reply_markup=markup)
+        # Edit this message again once the payment settles or the invoice expires
+        # (a repeat moves the watch to the newest pay-link message)
+        payment_watcher.watch(order_id, callback.from_user.id, msg.chat.id, msg.message_id, lang)
             
-        except Exception as e:
-            error_text = "❌ Error connecting to payment gateway." if lang == "en" else "❌ خطا در ارتباط با درگاه پرداخت."
-            await msg.edit_text(error_text)
+    except Exception as e:
+        error_text = t("payment_gateway_error", lang)
+        await msg.edit_text(error_text)
 
 
 @router.callback_query(F.data.startswith("retry_provision_"))
 async def process_retry_provision(callback: CallbackQuery, bot):
     """
     Admin retry button when automatic provisioning failed after approving a receipt.
-    Triggers the same /orders/{id}/approve endpoint again.
+    Submits the same /orders/{id}/approve job again.
     """
-    order_id = callback.data.split("_")[-1]
-
-    async with httpx.AsyncClient(headers={"Authorization": f"Bot {os.getenv('BOT_TOKEN')}"}) as client:
-        try:
-            resp = await client.post(f"{API_BASE_URL}/orders/{order_id}/approve", timeout=65.0)
-            data = resp.json()
+    await _start_approval(callback, bot, "✅ **RETRIED**")
 
-            if resp.status_code == 200:
-                # Success on retry – append note and remove extra buttons
-                new_caption = (callback.message.caption or "") + "\n\n✅ **RETRIED** — VPN config provisioned and sent to user."
-                await callback.message.edit_caption(caption=new_caption)
-                await callback.answer("✅ Retry succeeded! Config sent to user.", show_alert=True)
-                return
-
-            error_type = data.get("error", "")
-            error_msg = data.get("message", "Unknown error")
-
-            if error_type == "provisioning_failed":
-                # Still failing – keep retry / manual / reject options
-                from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-                markup = InlineKeyboardMarkup(inline_keyboard=[
-                    [InlineKeyboardButton(text="🔁 Retry Provisioning", callback_data=f"retry_provision_{order_id}")],
-                    [InlineKeyboardButton(text="⚙️ Set Manual Config", callback_data=f"manual_config_{order_id}")],
-                    [InlineKeyboardButton(text="❌ Reject Order", callback_data=f"reject_order_{order_id}")]
-                ])
-                new_caption = (callback.message.caption or "") + "\n\n⚠️ **Retry Failed!** Server or API is still failing."
-                await callback.message.edit_caption(caption=new_caption, reply_markup=markup)
-                await callback.answer("⚠️ Retry failed: provisioning still failing.", show_alert=True)
-            else:
-                # Some other backend error
-                new_caption = (callback.message.caption or "") + f"\n\n⚠️ Retry issue: {error_msg}"
-                await callback.message.edit_caption(caption=new_caption)
-                await callback.answer(f"Issue: {error_msg}", show_alert=True)
-        except Exception as e:
-            logging.error(f"Retry provision error: {e}")
-            await callback.answer("❌ Backend connection timeout/error", show_alert=True)
 @router.callback_query(F.data.startswith("manual_config_"))
 async def process_manual_config_btn(callback: CallbackQuery, state: FSMContext):
     order_id = callback.data.split("_")[-1]
@@ -363,22 +343,19 @@ async def process_manual_config_input(message: Message, state: FSMContext):
 
     wait_msg = await message.answer("🔄 Sending manual config to backend...")
 
-    async with httpx.AsyncClient(headers={"Authorization": f"Bot {os.getenv('BOT_TOKEN')}"}) as client:
-        try:
-            resp = await client.post(
-                f"{API_BASE_URL}/orders/{order_id}/manual_provision",
-                json={"config_link": config_link},
-                timeout=60.0
-            )
-            resp_data = resp.json()
-
-            if resp.status_code == 200:
-                await wait_msg.edit_text("✅ Config manually saved! The user has been notified.")
-            else:
-                error_msg = resp_data.get("error", "Unknown error")
-                await wait_msg.edit_text(f"❌ Failed to save config: {error_msg}")
-        except Exception as e:
-            logging.error(f"Manual provision error: {e}")
-            await wait_msg.edit_text("❌ Backend connection timeout/error.")
+    api = get_api()
+    try:
+        resp = await api.manual_provision(order_id, config_link)
+        resp_data = resp.json()
+        subscriptions.invalidate_from_response(resp)
+
+        if resp.status_code == 200:
+            await wait_msg.edit_text("✅ Config manually saved! The user has been notified.")
+        else:
+            error_msg = resp_data.get("error", "Unknown error")
+            await wait_msg.edit_text(f"❌ Failed to save config: {error_msg}")
+    except Exception as e:
+        logging.error(f"Manual provision error: {e}")
+        await wait_msg.edit_text("❌ Backend connection timeout/error.")
 
     await state.clear()
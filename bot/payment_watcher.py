@@ -0,0 +1,208 @@
+"""Watches pending crypto orders and tells the user when they settle.
+
+Oxapay confirms payments to the backend, not to the bot, so after showing
+the pay link the bot keeps the order here: a heap keyed by invoice expiry
+plus a per-order next-poll time. Polls back off (PAYMENT_POLL_MIN ->
+PAYMENT_POLL_MAX) the longer an order stays unpaid, and all due orders of
+one user are answered by a single `GET /users/{id}/orders`. When an order
+is paid, rejected (or reaches any other final status) or its invoice
+expires, the user's pay-link message is edited.
+Pending orders are saved to PAYMENT_WATCH_PATH so a restart keeps watching.
+"""
+
+import asyncio
+import heapq
+import json
+import logging
+import os
+import time
+
+from api_client import get_api
+from i18n import t
+from keyboards import get_back_menu
+from subscriptions import subscriptions
+
+PAYMENT_WATCH_PATH = os.getenv("PAYMENT_WATCH_PATH", "pending_payments.json")
+# Oxapay invoices expire after 60 minutes unless configured otherwise
+PAYMENT_INVOICE_TTL = float(os.getenv("PAYMENT_INVOICE_TTL", "3600"))
+PAYMENT_POLL_MIN = float(os.getenv("PAYMENT_POLL_MIN", "10"))
+PAYMENT_POLL_MAX = float(os.getenv("PAYMENT_POLL_MAX", "120"))
+PAYMENT_POLL_CONCURRENCY = int(os.getenv("PAYMENT_POLL_CONCURRENCY", "8"))
+
+PAID_STATUSES = ("paid", "approved")
+# Still awaiting payment; any other status (e.g. "rejected") is final
+OPEN_STATUSES = ("pending", "provisioning", "")
+
+
+class PaymentWatcher:
+    def __init__(self, path: str = PAYMENT_WATCH_PATH, invoice_ttl: float = PAYMENT_INVOICE_TTL,
+                 poll_min: float = PAYMENT_POLL_MIN, poll_max: float = PAYMENT_POLL_MAX,
+                 concurrency: int = PAYMENT_POLL_CONCURRENCY):
+        self.path = path
+        self.invoice_ttl = invoice_ttl
+        self.poll_min = poll_min
+        self.poll_max = poll_max
+        self._sem = asyncio.Semaphore(concurrency)
+        # order_id -> {telegram_id, chat_id, message_id, lang, expires_at, next_poll, polls}
+        self.pending = {}
+        self._expiries = []  # heap of (expires_at, order_id)
+        self._wakeup = asyncio.Event()
+        self.task = None
+        self.bot = None
+        self.polls = 0
+        self.confirmed = 0
+        self.expired = 0
+        self.rejected = 0
+
+    def _save(self):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.pending, f, indent=2)
+        os.replace(tmp, self.path)
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                saved = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logging.warning(f"[Payments] Ignoring unreadable watch list {self.path}: {e}")
+            return
+        for order_id, entry in saved.items():
+            self._track(str(order_id), entry)
+
+    def _track(self, order_id: str, entry: dict):
+        self.pending[order_id] = entry
+        heapq.heappush(self._expiries, (entry["expires_at"], order_id))
+
+    def watch(self, order_id, telegram_id: int, chat_id: int, message_id: int, lang: str):
+        """Start watching an order whose pay link was just shown in `message_id`."""
+        now = time.time()
+        # A repeated checkout shows the same invoice again; its expiry doesn't move
+        known = self.pending.get(str(order_id))
+        self._track(str(order_id), {
+            "telegram_id": telegram_id,
+            "chat_id": chat_id,
+            "message_id": message_id,
+            "lang": lang,
+            "expires_at": known["expires_at"] if known else now + self.invoice_ttl,
+            "next_poll": now + self.poll_min,
+            "polls": 0,
+        })
+        self._save()
+        self._wakeup.set()
+
+    def start(self, bot):
+        self.bot = bot
+        self._load()
+        if self.pending:
+            logging.info(f"[Payments] Resuming watch of {len(self.pending)} pending crypto order(s)")
+        self.task = asyncio.create_task(self._run())
+
+    async def shutdown(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+
+    def _next_wakeup(self, now: float) -> float:
+        due = [entry["next_poll"] for entry in self.pending.values()]
+        if self._expiries:
+            due.append(self._expiries[0][0])
+        return max(min(due) - now, 0) if due else None
+
+    async def _run(self):
+        while True:
+            now = time.time()
+            delay = self._next_wakeup(now)
+            if delay is None or delay > 0:
+                self._wakeup.clear()
+                try:
+                    async with asyncio.timeout(delay):
+                        await self._wakeup.wait()
+                except TimeoutError:
+                    pass
+                continue
+            try:
+                await self._tick(now)
+            except Exception as e:
+                logging.error(f"[Payments] Watch cycle failed: {e}")
+                await asyncio.sleep(self.poll_min)
+
+    async def _tick(self, now: float):
+        expiring = set()
+        while self._expiries and self._expiries[0][0] <= now:
+            _, order_id = heapq.heappop(self._expiries)
+            if order_id in self.pending:
+                expiring.add(order_id)
+
+        # One request per user covers all of their due orders
+        due_users = {}
+        for order_id, entry in self.pending.items():
+            if order_id in expiring or entry["next_poll"] <= now:
+                due_users.setdefault(entry["telegram_id"], []).append(order_id)
+        results = await asyncio.gather(*(self._statuses(tg_id) for tg_id in due_users))
+
+        for (telegram_id, order_ids), statuses in zip(due_users.items(), results):
+            for order_id in order_ids:
+                entry = self.pending[order_id]
+                status = statuses.get(order_id) if statuses is not None else None
+                if status in PAID_STATUSES:
+                    await self._finish(order_id, "crypto_confirmed")
+                elif status is not None and status not in OPEN_STATUSES:
+                    await self._finish(order_id, "crypto_rejected")
+                elif order_id in expiring:
+                    await self._finish(order_id, "crypto_expired")
+                else:
+                    entry["polls"] += 1
+                    interval = min(self.poll_min * 1.5 ** entry["polls"], self.poll_max)
+                    entry["next_poll"] = min(now + interval, entry["expires_at"])
+        self._save()
+
+    async def _statuses(self, telegram_id: int):
+        """{order_id: payment_status} for one user, or None if the backend didn't answer."""
+        async with self._sem:
+            self.polls += 1
+            try:
+                resp = await get_api().get_user_orders(telegram_id)
+                resp.raise_for_status()
+                return {str(order.get("ID")): order.get("payment_status") for order in resp.json()}
+            except Exception as e:
+                logging.warning(f"[Payments] Could not poll orders of {telegram_id}: {e}")
+                return None
+
+    async def _finish(self, order_id: str, key: str):
+        entry = self.pending.pop(order_id)
+        lang = entry["lang"]
+        if key == "crypto_confirmed":
+            self.confirmed += 1
+            subscriptions.invalidate(entry["telegram_id"])
+            markup = get_back_menu(lang, "my_configs", "btn_my_subs")
+        else:
+            if key == "crypto_rejected":
+                self.rejected += 1
+            else:
+                self.expired += 1
+            markup = get_back_menu(lang, "buy_menu", "btn_buy")
+        try:
+            await self.bot.edit_message_text(
+                t(key, lang, order_id=order_id),
+                chat_id=entry["chat_id"],
+                message_id=entry["message_id"],
+                parse_mode="HTML",
+                reply_markup=markup,
+            )
+        except Exception as e:
+            logging.warning(f"[Payments] Could not update order {order_id} message: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self.pending),
+            "polls": self.polls,
+            "confirmed": self.confirmed,
+            "expired": self.expired,
+            "rejected": self.rejected,
+        }
+
+
+payment_watcher = PaymentWatcher()
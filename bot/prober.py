@@ -0,0 +1,251 @@
+"""Background reachability and latency checks for the WireGuard endpoints.
+
+Every PROBE_INTERVAL seconds each active endpoint's `address` (host:port)
+is probed, at most PROBE_CONCURRENCY at a time:
+
+- `tcp` (default): time a TCP connect to the host. A refused connection
+  still proves the host answered, so it counts as up with that round trip;
+  PROBE_TCP_PORT probes another port than the endpoint's own. Without it
+  the WireGuard (UDP) port is tried over TCP, where a firewall that drops
+  packets looks just like a dead host, so a timeout there is only recorded
+  as inconclusive and never marks the endpoint dead.
+- `udp`: send a datagram and wait for any reply, for hosts that run an echo
+  responder next to WireGuard (which itself never answers strangers).
+
+Latency and availability are smoothed with an EWMA. An endpoint is dead
+after PROBE_DEAD_AFTER failures in a row. The location picker lists the
+fastest endpoints first and flags (or, with PROBE_HIDE_DEAD, hides) dead ones.
+"""
+
+import asyncio
+import logging
+import os
+import time
+
+PROBE_INTERVAL = float(os.getenv("PROBE_INTERVAL", "60"))
+PROBE_TIMEOUT = float(os.getenv("PROBE_TIMEOUT", "3"))
+PROBE_CONCURRENCY = int(os.getenv("PROBE_CONCURRENCY", "10"))
+PROBE_MODE = os.getenv("PROBE_MODE", "tcp").lower()
+PROBE_TCP_PORT = int(os.getenv("PROBE_TCP_PORT", "0"))
+PROBE_DEAD_AFTER = int(os.getenv("PROBE_DEAD_AFTER", "3"))
+PROBE_HIDE_DEAD = os.getenv("PROBE_HIDE_DEAD", "false").lower() == "true"
+# Weight of the newest sample in the smoothed values
+PROBE_ALPHA = 0.3
+
+DEFAULT_WG_PORT = 51820
+
+
+def parse_address(address: str) -> tuple:
+    """`host:port`, `[v6]:port` or a bare host -> (host, port)."""
+    address = (address or "").strip()
+    if address.startswith("["):
+        host, _, rest = address[1:].partition("]")
+        port = rest.lstrip(":")
+    elif address.count(":") == 1:
+        host, port = address.split(":")
+    else:
+        host, port = address, ""
+    return host, int(port) if port.isdigit() else DEFAULT_WG_PORT
+
+
+class ProbeStats:
+    __slots__ = ("latency", "availability", "failures", "probes", "inconclusive", "last_error", "checked_at")
+
+    def __init__(self):
+        self.latency = None  # seconds, EWMA over successful probes
+        self.availability = None  # 0..1, EWMA over all probes
+        self.failures = 0  # in a row
+        self.probes = 0
+        self.inconclusive = 0  # probes that could not tell up from filtered
+        self.last_error = None
+        self.checked_at = None
+
+    def record(self, latency, error: str = None, alpha: float = PROBE_ALPHA):
+        self.probes += 1
+        self.checked_at = time.time()
+        up = latency is not None
+        sample = 1.0 if up else 0.0
+        self.availability = sample if self.availability is None else alpha * sample + (1 - alpha) * self.availability
+        if up:
+            self.failures = 0
+            self.last_error = None
+            self.latency = latency if self.latency is None else alpha * latency + (1 - alpha) * self.latency
+        else:
+            self.failures += 1
+            self.last_error = error
+
+    def record_inconclusive(self):
+        self.inconclusive += 1
+        self.checked_at = time.time()
+
+
+class _EchoProtocol(asyncio.DatagramProtocol):
+    def __init__(self):
+        self.answer = asyncio.get_running_loop().create_future()
+
+    def datagram_received(self, data, addr):
+        if not self.answer.done():
+            self.answer.set_result(None)
+
+    def error_received(self, exc):
+        if not self.answer.done():
+            self.answer.set_exception(exc)
+
+
+class EndpointProber:
+    def __init__(self, interval: float = PROBE_INTERVAL, timeout: float = PROBE_TIMEOUT,
+                 concurrency: int = PROBE_CONCURRENCY, mode: str = PROBE_MODE, tcp_port: int = PROBE_TCP_PORT,
+                 dead_after: int = PROBE_DEAD_AFTER, hide_dead: bool = PROBE_HIDE_DEAD):
+        self.interval = interval
+        self.timeout = timeout
+        self.concurrency = concurrency
+        self.mode = mode
+        self.tcp_port = tcp_port
+        self.dead_after = dead_after
+        self.hide_dead = hide_dead
+        self.results = {}  # str(endpoint ID) -> ProbeStats
+        self.task = None
+        self.rounds = 0
+
+    async def _probe_tcp(self, host: str, port: int):
+        try:
+            _, writer = await asyncio.open_connection(host, self.tcp_port or port)
+        except ConnectionRefusedError:
+            # The host answered with a reset: reachable, and that was one round trip
+            return
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+
+    async def _probe_udp(self, host: str, port: int):
+        loop = asyncio.get_running_loop()
+        transport, protocol = await loop.create_datagram_endpoint(_EchoProtocol, remote_addr=(host, port))
+        try:
+            transport.sendto(b"\x00probe")
+            await protocol.answer
+        finally:
+            transport.close()
+
+    async def probe(self, address: str) -> tuple:
+        """(latency in seconds, None) if the endpoint answered, else (None, error)."""
+        host, port = parse_address(address)
+        if not host:
+            return None, "no address"
+        check = self._probe_udp if self.mode == "udp" else self._probe_tcp
+        start = time.perf_counter()
+        try:
+            async with asyncio.timeout(self.timeout):
+                await check(host, port)
+        except TimeoutError:
+            return None, "timeout"
+        except OSError as e:
+            return None, type(e).__name__
+        return time.perf_counter() - start, None
+
+    def conclusive(self, error: str) -> bool:
+        """Whether a failed probe says anything about the endpoint being down."""
+        return not (error == "timeout" and self.mode != "udp" and not self.tcp_port)
+
+    async def run_once(self, endpoints):
+        sem = asyncio.Semaphore(self.concurrency)
+
+        async def check(endpoint):
+            async with sem:
+                latency, error = await self.probe(endpoint.get("address"))
+            stats = self.results.setdefault(str(endpoint.get("ID")), ProbeStats())
+            if latency is None and not self.conclusive(error):
+                stats.record_inconclusive()
+            else:
+                stats.record(latency, error)
+
+        await asyncio.gather(*(check(ep) for ep in endpoints))
+        # Forget endpoints that were removed or deactivated
+        active = {str(ep.get("ID")) for ep in endpoints}
+        for endpoint_id in list(self.results):
+            if endpoint_id not in active:
+                del self.results[endpoint_id]
+        self.rounds += 1
+
+    def start(self, catalog):
+        """Probe `catalog.active()` every `interval` seconds in the background."""
+        self.task = asyncio.create_task(self._run(catalog))
+
+    async def _run(self, catalog):
+        while True:
+            try:
+                await self.run_once(await catalog.active())
+            except Exception as e:
+                logging.warning(f"[Prober] Probe round failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def shutdown(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+
+    def get(self, endpoint_id) -> ProbeStats | None:
+        return self.results.get(str(endpoint_id))
+
+    def is_dead(self, endpoint_id) -> bool:
+        stats = self.get(endpoint_id)
+        return stats is not None and stats.failures >= self.dead_after
+
+    def rank(self, endpoints) -> list:
+        """Live endpoints by smoothed latency, then ones not measured yet, then dead ones.
+
+        With `hide_dead`, dead endpoints are left out unless every endpoint is dead.
+        """
+        def order(item):
+            index, ep = item
+            stats = self.get(ep.get("ID"))
+            if self.is_dead(ep.get("ID")):
+                return (2, 0, index)
+            if stats is None or stats.latency is None:
+                return (1, 0, index)
+            return (0, stats.latency, index)
+
+        ranked = [ep for _, ep in sorted(enumerate(endpoints), key=order)]
+        if self.hide_dead:
+            alive = [ep for ep in ranked if not self.is_dead(ep.get("ID"))]
+            return alive or ranked
+        return ranked
+
+    def label(self, endpoint: dict) -> str:
+        """Location button text: the name plus its ping, or a dead marker."""
+        name = endpoint.get("name") or endpoint.get("address")
+        if self.is_dead(endpoint.get("ID")):
+            return f"🔴 {name}"
+        stats = self.get(endpoint.get("ID"))
+        if stats is None or stats.latency is None:
+            return name
+        return f"{name} · {stats.latency * 1000:.0f} ms"
+
+    def describe(self, endpoint_id) -> str:
+        """One line for the admin endpoints view."""
+        stats = self.get(endpoint_id)
+        if stats is None:
+            return "not probed"
+        if stats.availability is None:
+            return "no TCP answer (set PROBE_TCP_PORT or PROBE_MODE=udp)"
+        if self.is_dead(endpoint_id):
+            return f"DOWN ({stats.failures} failed probes, {stats.last_error})"
+        latency = f"{stats.latency * 1000:.0f} ms" if stats.latency is not None else "no answer yet"
+        return f"{latency}, {stats.availability * 100:.0f}% up"
+
+    def stats(self) -> dict:
+        return {
+            endpoint_id: {
+                "latency_seconds": stats.latency if stats.latency is not None else -1,
+                "availability": stats.availability or 0.0,
+                "failures": stats.failures,
+                "probes": stats.probes,
+                "inconclusive": stats.inconclusive,
+                "dead": self.is_dead(endpoint_id),
+            }
+            for endpoint_id, stats in self.results.items()
+        }
+
+
+prober = EndpointProber()
@@ -0,0 +1,198 @@
+import base64
+import binascii
+import html
+import json
+import os
+from typing import AsyncIterator, Iterator, NamedTuple
+from urllib.parse import unquote, urlsplit
+
+from api_client import get_api
+from cache import CachedValue, TTLCache
+
+# Telegram rejects messages longer than this
+MESSAGE_LIMIT = 4096
+
+
+class ConfigEntry(NamedTuple):
+    protocol: str
+    host: str
+    remark: str
+    uri: str
+
+
+class SubscriptionFetchError(Exception):
+    """The panel did not return the subscription body."""
+
+
+def b64decode_lenient(data: bytes) -> bytes:
+    """Standard or URL-safe base64, padded or not, whitespace ignored.
+
+    Raises binascii.Error for anything else instead of dropping stray bytes.
+    """
+    data = b"".join(data.split()).rstrip(b"=").replace(b"-", b"+").replace(b"_", b"/")
+    return base64.b64decode(data + b"=" * (-len(data) % 4), validate=True)
+
+
+def _vmess_entry(uri: str) -> ConfigEntry:
+    payload = uri[len("vmess://"):]
+    try:
+        data = json.loads(b64decode_lenient(payload.encode()))
+        return ConfigEntry("VMESS", str(data.get("add", "")), str(data.get("ps", "")), uri)
+    except (ValueError, binascii.Error, AttributeError):
+        return ConfigEntry("VMESS", "", "", uri)
+
+
+def parse_config_line(line: str) -> ConfigEntry | None:
+    """Turn one subscription line (`vless://...#remark`) into a ConfigEntry."""
+    uri = line.strip()
+    if not uri:
+        return None
+    if "://" not in uri:
+        return ConfigEntry("CONFIG", "", "", uri)
+    if uri.startswith("vmess://"):
+        return _vmess_entry(uri)
+
+    scheme = uri.split("://", 1)[0].upper()
+    try:
+        parts = urlsplit(uri)
+        host = parts.hostname or ""
+        remark = unquote(parts.fragment)
+    except ValueError:
+        host, remark = "", ""
+    return ConfigEntry(scheme, host, remark, uri)
+
+
+class SubscriptionDecoder:
+    """Incrementally decodes a subscription body into lines.
+
+    Panels send either base64 of newline-separated URIs (Marzban's default)
+    or the plain list. A ':' in the first bytes proves a plain list, which is
+    split into lines as it arrives. Anything else is kept until `close` and
+    decoded as (standard or URL-safe) base64, falling back to plain text if
+    it isn't valid base64 after all.
+    """
+
+    def __init__(self):
+        self._plain = None
+        self._undecided = b""
+        self._encoded = b""
+        self._decoded = b""
+
+    def _lines(self, final: bool = False) -> Iterator[str]:
+        *lines, self._decoded = self._decoded.split(b"\n")
+        if final:
+            lines.append(self._decoded)
+            self._decoded = b""
+        for line in lines:
+            text = line.decode("utf-8", errors="replace").strip()
+            if text:
+                yield text
+
+    def feed(self, chunk: bytes) -> Iterator[str]:
+        if self._plain is None:
+            self._undecided += chunk
+            # ':' never appears in base64, but every URI has one within its first few bytes
+            if b":" in self._undecided:
+                self._plain = True
+            elif len(self._undecided.strip()) >= 32:
+                self._plain = False
+            else:
+                return
+            chunk, self._undecided = self._undecided, b""
+
+        if self._plain:
+            self._decoded += chunk
+            yield from self._lines()
+        else:
+            self._encoded += chunk
+
+    def close(self) -> Iterator[str]:
+        if self._plain is None:
+            self._plain = b":" in self._undecided
+            yield from self.feed(b"")
+        if self._encoded:
+            try:
+                self._decoded = b64decode_lenient(self._encoded)
+            except binascii.Error:
+                # Not base64 after all (e.g. a plain list opening with a long remark)
+                self._decoded = self._encoded
+            self._encoded = b""
+        yield from self._lines(final=True)
+
+
+async def stream_config_entries(link: str, max_bytes: int = None) -> AsyncIterator[ConfigEntry]:
+    """Fetch a subscription link and yield its configs as they are decoded."""
+    max_bytes = max_bytes or int(os.getenv("SUBSCRIPTION_MAX_BYTES", str(2 * 1024 * 1024)))
+    decoder = SubscriptionDecoder()
+    received = 0
+    async with get_api().stream_subscription(link) as resp:
+        if resp.status_code != 200:
+            raise SubscriptionFetchError(f"Panel returned {resp.status_code}")
+        async for chunk in resp.aiter_bytes():
+            received += len(chunk)
+            if received > max_bytes:
+                raise SubscriptionFetchError(f"Subscription larger than {max_bytes} bytes")
+            for line in decoder.feed(chunk):
+                entry = parse_config_line(line)
+                if entry:
+                    yield entry
+    for line in decoder.close():
+        entry = parse_config_line(line)
+        if entry:
+            yield entry
+
+
+class ParsedSubscriptions:
+    """Parsed config entries per subscription link, kept for a short TTL."""
+
+    def __init__(self, ttl: float = None, maxsize: int = 1000):
+        self.ttl = ttl if ttl is not None else float(os.getenv("SUBSCRIPTION_PARSE_TTL", "300"))
+        self._links = TTLCache(maxsize=maxsize, ttl=self.ttl)
+
+    async def _load(self, link: str) -> tuple:
+        return tuple([entry async for entry in stream_config_entries(link)])
+
+    async def get(self, link: str) -> tuple:
+        entry = self._links.get(link)
+        if entry is None:
+            entry = CachedValue(lambda: self._load(link), ttl=self.ttl)
+            self._links.set(link, entry)
+        return await entry.get()
+
+    def stats(self) -> dict:
+        return self._links.stats()
+
+
+parsed_subscriptions = ParsedSubscriptions()
+
+
+def format_entry(entry: ConfigEntry) -> str:
+    label = entry.remark or entry.host
+    title = f"🔹 <b>{html.escape(entry.protocol)}</b>"
+    if label:
+        title += f" · {html.escape(label)}"
+    return f"{title}\n<code>{html.escape(entry.uri)}</code>\n\n"
+
+
+def paginate_entries(entries, header: str, limit: int = MESSAGE_LIMIT) -> list[str] | None:
+    """Split formatted entries into messages of at most `limit` characters.
+
+    Returns None when a single entry doesn't fit in a message at all.
+    """
+    pages, parts, size = [], [header], len(header)
+    for entry in entries:
+        block = format_entry(entry)
+        if len(block) > limit:
+            return None
+        if size + len(block) > limit:
+            pages.append("".join(parts))
+            parts, size = [], 0
+        parts.append(block)
+        size += len(block)
+    pages.append("".join(parts))
+    return pages
+
+
+def entries_as_text(entries) -> bytes:
+    """Plain newline-separated URIs, for sending the configs as a file."""
+    return "\n".join(entry.uri for entry in entries).encode("utf-8")
@@ -0,0 +1,75 @@
+import logging
+import os
+
+from api_client import get_api
+from cache import CachedValue, TTLCache
+
+
+class UserSubscriptions:
+    """One user's subscription list plus an index by subscription ID."""
+
+    __slots__ = ("items", "by_id")
+
+    def __init__(self, items: list):
+        self.items = items
+        self.by_id = {str(sub.get("ID")): sub for sub in items}
+
+    def get(self, sub_id) -> dict | None:
+        return self.by_id.get(str(sub_id))
+
+
+class SubscriptionCache:
+    """Short-lived per-user cache of `GET /users/{id}/subscriptions`.
+
+    The configs list, link views and support tickets of one browse session
+    share a single fetch; concurrent misses for the same user share one
+    request. Entries are dropped when an order of that user is approved,
+    rejected or manually provisioned.
+    """
+
+    def __init__(self, ttl: float = None, maxsize: int = None):
+        self.ttl = ttl if ttl is not None else float(os.getenv("SUBSCRIPTIONS_CACHE_TTL", "30"))
+        self._users = TTLCache(
+            maxsize=maxsize or int(os.getenv("USER_CACHE_SIZE", "100000")),
+            ttl=self.ttl,
+        )
+
+    async def _load(self, telegram_id: int) -> UserSubscriptions:
+        resp = await get_api().get_subscriptions(telegram_id)
+        if resp.status_code == 404:
+            return UserSubscriptions([])
+        resp.raise_for_status()
+        subs = resp.json()
+        return UserSubscriptions(subs if isinstance(subs, list) else [])
+
+    async def get(self, telegram_id: int) -> UserSubscriptions:
+        entry = self._users.get(telegram_id)
+        if entry is None:
+            entry = CachedValue(lambda: self._load(telegram_id), ttl=self.ttl)
+            self._users.set(telegram_id, entry)
+        return await entry.get()
+
+    async def find(self, telegram_id: int, sub_id) -> dict | None:
+        return (await self.get(telegram_id)).get(sub_id)
+
+    def invalidate(self, telegram_id: int):
+        entry = self._users.pop(telegram_id)
+        if entry is not None:
+            # Also stops a load already in flight from being stored
+            entry.invalidate()
+
+    def invalidate_from_response(self, resp):
+        """Drop the entry for the user named in an order response (`telegram_id`)."""
+        try:
+            telegram_id = resp.json().get("telegram_id")
+        except Exception:
+            return
+        if telegram_id:
+            self.invalidate(int(telegram_id))
+            logging.debug(f"Subscription cache invalidated for {telegram_id}")
+
+    def stats(self) -> dict:
+        return self._users.stats()
+
+
+subscriptions = SubscriptionCache()
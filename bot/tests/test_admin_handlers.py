@@ -1,8 +1,8 @@
 import pytest
-from unittest.mock import AsyncMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 from aiogram.types import CallbackQuery, User, Message
 from aiogram.fsm.context import FSMContext
-from admin_handlers import show_admin_panel, add_plan_start
+from admin_handlers import admin_endpoints_list, show_admin_panel, add_plan_start
 
 @pytest.fixture
 def mock_admin_env(monkeypatch):
@@ -53,3 +53,23 @@ async def test_add_plan_start_authorized(mock_is_admin):
 
     mock_callback.message.edit_text.assert_awaited_once()
     mock_state.set_state.assert_awaited_once()
+
+@pytest.mark.asyncio
+@patch("admin_handlers.is_admin", return_value=True)
+async def test_admin_endpoints_list_escapes_names(mock_is_admin):
+    mock_callback = AsyncMock(spec=CallbackQuery)
+    mock_callback.from_user = User(id=999999, is_bot=False, first_name="Admin")
+    mock_callback.answer = AsyncMock()
+    mock_callback.message = AsyncMock(spec=Message)
+    mock_callback.message.edit_text = AsyncMock()
+
+    resp = MagicMock()
+    resp.json.return_value = [{"ID": 1, "name": "de_1 <*fast*>", "address": "de.example.com:51820", "is_active": True}]
+    with patch("admin_handlers.get_api") as mock_get_api:
+        mock_get_api.return_value.get_endpoints = AsyncMock(return_value=resp)
+        await admin_endpoints_list(mock_callback)
+
+    mock_callback.answer.assert_not_awaited()
+    text = mock_callback.message.edit_text.call_args[0][0]
+    assert "de_1 &lt;*fast*&gt;: not probed" in text
+    assert mock_callback.message.edit_text.call_args.kwargs["parse_mode"] == "HTML"
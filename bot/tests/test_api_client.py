@@ -0,0 +1,76 @@
+import pytest
+import httpx
+import api_client
+from api_client import BackendClient
+
+
+def make_client(handler):
+    return BackendClient(
+        base_url="http://backend.test/api/v1",
+        token="TEST_TOKEN",
+        transport=httpx.MockTransport(handler),
+    )
+
+
+@pytest.mark.asyncio
+async def test_requests_use_base_url_and_bot_auth():
+    seen = []
+
+    def handler(request: httpx.Request):
+        seen.append(request)
+        return httpx.Response(200, json=[])
+
+    client = make_client(handler)
+    await client.get_plans(server_type="v2ray")
+    await client.get_plans(include_inactive=True)
+    await client.aclose()
+
+    assert str(seen[0].url) == "http://backend.test/api/v1/plans?type=v2ray"
+    assert str(seen[1].url) == "http://backend.test/api/v1/plans?all=true"
+    assert all(r.headers["Authorization"] == "Bot TEST_TOKEN" for r in seen)
+
+
+@pytest.mark.asyncio
+async def test_create_order_payload():
+    captured = {}
+
+    def handler(request: httpx.Request):
+        captured["method"] = request.method
+        captured["path"] = request.url.path
+        captured["body"] = request.read()
+        return httpx.Response(201, json={"ID": 7})
+
+    client = make_client(handler)
+    resp = await client.create_order(42, "3", 0, "my_cfg", "crypto", 1.5)
+    await client.aclose()
+
+    assert resp.status_code == 201
+    assert captured["method"] == "POST"
+    assert captured["path"] == "/api/v1/orders/"
+    assert b'"plan_id":3' in captured["body"].replace(b" ", b"")
+    assert b'"amount":1.5' in captured["body"].replace(b" ", b"")
+
+
+@pytest.mark.asyncio
+async def test_subscription_stream_does_not_leak_bot_token():
+    seen = []
+
+    def handler(request: httpx.Request):
+        seen.append(request)
+        return httpx.Response(200, text="dmxlc3M6Ly94")
+
+    client = make_client(handler)
+    async with client.stream_subscription("https://panel.example.com/sub/abc") as resp:
+        assert await resp.aread() == b"dmxlc3M6Ly94"
+    await client.aclose()
+
+    assert "Authorization" not in seen[0].headers
+
+
+@pytest.mark.asyncio
+async def test_get_api_returns_shared_instance(monkeypatch):
+    monkeypatch.setattr(api_client, "_api", None)
+    first = api_client.get_api()
+    assert api_client.get_api() is first
+    await api_client.close_api()
+    assert api_client._api is None
@@ -0,0 +1,167 @@
+import asyncio
+import json
+import pytest
+import httpx
+from unittest.mock import AsyncMock, MagicMock, patch
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+from aiogram.methods import CopyMessage
+from broadcast import SEND_ATTEMPTS, Broadcaster
+
+USERS = [{"id": i, "telegram_id": 1000 + i} for i in range(1, 6)]
+METHOD = CopyMessage(chat_id=1, from_chat_id=1, message_id=1)
+
+
+def fake_api():
+    async def get_users_page(after_id, limit):
+        page = [u for u in USERS if u["id"] > after_id][:limit]
+        return httpx.Response(200, json=page, request=httpx.Request("GET", "http://backend.test/admin/users"))
+
+    api = MagicMock()
+    api.get_users_page = AsyncMock(side_effect=get_users_page)
+    return api
+
+
+def fake_bot(copy_message=None):
+    bot = MagicMock()
+    bot.copy_message = copy_message or AsyncMock()
+    bot.edit_message_text = AsyncMock()
+    return bot
+
+
+@pytest.mark.asyncio
+async def test_broadcast_pages_users_and_counts_outcomes(tmp_path):
+    path = tmp_path / "broadcast.json"
+    retried = []
+
+    async def copy_message(chat_id, from_chat_id, message_id):
+        if chat_id == 1002 and not retried:
+            retried.append(chat_id)
+            raise TelegramRetryAfter(method=METHOD, message="flood", retry_after=0)
+        if chat_id == 1004:
+            raise TelegramForbiddenError(method=METHOD, message="bot was blocked by the user")
+
+    bot = fake_bot(AsyncMock(side_effect=copy_message))
+    broadcaster = Broadcaster(str(path), rate=1000, page_size=2, batch=2, progress_interval=0)
+    with patch("broadcast.get_api", return_value=fake_api()):
+        broadcaster.start(bot, admin_chat_id=1, from_chat_id=1, message_id=42, status_message_id=7)
+        await broadcaster.task
+
+    assert broadcaster.stats() == {"running": False, "sent": 4, "blocked": 1, "failed": 0, "after_id": 5}
+    assert bot.copy_message.await_count == 6
+    assert not path.exists()
+    final = bot.edit_message_text.await_args
+    assert "finished" in final.args[0] and final.kwargs["message_id"] == 7
+
+
+@pytest.mark.asyncio
+async def test_flood_waits_do_not_use_up_send_attempts(tmp_path):
+    floods = []
+
+    async def copy_message(chat_id, from_chat_id, message_id):
+        if chat_id == 1001 and len(floods) < SEND_ATTEMPTS + 2:
+            floods.append(chat_id)
+            raise TelegramRetryAfter(method=METHOD, message="flood", retry_after=0)
+        if chat_id == 1003:
+            raise ConnectionError("reset")
+
+    real_sleep = asyncio.sleep
+    bot = fake_bot(AsyncMock(side_effect=copy_message))
+    broadcaster = Broadcaster(str(tmp_path / "broadcast.json"), rate=1000, page_size=5, batch=5, progress_interval=0)
+    # Skip the between-attempt backoff delays
+    with patch("broadcast.get_api", return_value=fake_api()), \
+            patch("broadcast.asyncio.sleep", new=lambda seconds: real_sleep(0)):
+        broadcaster.start(bot, admin_chat_id=1, from_chat_id=1, message_id=42, status_message_id=7)
+        await broadcaster.task
+
+    # Rate-limited more times than there are attempts, yet delivered
+    assert broadcaster.stats()["sent"] == 4
+    assert broadcaster.stats()["failed"] == 1
+    calls = [c.kwargs["chat_id"] for c in bot.copy_message.await_args_list]
+    assert calls.count(1001) == SEND_ATTEMPTS + 3
+    assert calls.count(1003) == SEND_ATTEMPTS
+
+
+@pytest.mark.asyncio
+async def test_restart_resumes_from_checkpoint(tmp_path):
+    path = tmp_path / "broadcast.json"
+    path.write_text(json.dumps({
+        "from_chat_id": 1, "message_id": 42, "admin_chat_id": 1, "status_message_id": 7,
+        "after_id": 3, "sent": 3, "blocked": 0, "failed": 0, "started_at": 0,
+    }))
+    bot = fake_bot()
+    broadcaster = Broadcaster(str(path), rate=1000, page_size=2, batch=2)
+    with patch("broadcast.get_api", return_value=fake_api()):
+        assert broadcaster.resume(bot)
+        await broadcaster.task
+
+    assert [c.kwargs["chat_id"] for c in bot.copy_message.await_args_list] == [1004, 1005]
+    assert broadcaster.stats()["sent"] == 5
+
+
+@pytest.mark.asyncio
+async def test_shutdown_keeps_checkpoint_and_stop_discards_it(tmp_path):
+    path = tmp_path / "broadcast.json"
+    release = asyncio.Event()
+
+    async def copy_message(chat_id, from_chat_id, message_id):
+        if chat_id > 1002:
+            await release.wait()
+
+    broadcaster = Broadcaster(str(path), rate=1000, page_size=2, batch=2)
+    with patch("broadcast.get_api", return_value=fake_api()):
+        broadcaster.start(fake_bot(AsyncMock(side_effect=copy_message)), 1, 1, 42, 7)
+        await asyncio.sleep(0.05)
+        await broadcaster.shutdown()
+        assert json.loads(path.read_text())["after_id"] == 2
+
+        resumed = Broadcaster(str(path), rate=1000, page_size=2, batch=2)
+        resumed.resume(fake_bot(AsyncMock(side_effect=copy_message)))
+        await asyncio.sleep(0.05)
+        assert resumed.stop()
+        await asyncio.gather(resumed.task, return_exceptions=True)
+    assert not path.exists()
+
+
+@pytest.mark.asyncio
+async def test_page_errors_are_retried_and_a_failed_run_keeps_its_checkpoint(tmp_path):
+    path = tmp_path / "broadcast.json"
+    api = fake_api()
+    pages = api.get_users_page.side_effect
+    outage = {"after_id": 2, "failures": 0, "limit": 1}
+
+    async def flaky_page(after_id, limit):
+        if after_id == outage["after_id"] and outage["failures"] < outage["limit"]:
+            outage["failures"] += 1
+            raise httpx.ReadTimeout("slow")
+        return await pages(after_id, limit)
+
+    api.get_users_page.side_effect = flaky_page
+    real_sleep = asyncio.sleep
+    bot = fake_bot()
+    with patch("broadcast.get_api", return_value=api), \
+            patch("broadcast.asyncio.sleep", new=lambda seconds: real_sleep(0)):
+        # One timeout is retried transparently
+        broadcaster = Broadcaster(str(path), rate=1000, page_size=2, batch=2)
+        broadcaster.start(bot, 1, 1, 42, 7)
+        await broadcaster.task
+        assert broadcaster.stats()["sent"] == 5
+        assert not path.exists()
+
+        # An outage outlasting every attempt stops the run but keeps the checkpoint
+        outage.update(failures=0, limit=100)
+        bot = fake_bot()
+        broadcaster = Broadcaster(str(path), rate=1000, page_size=2, batch=2)
+        broadcaster.start(bot, 1, 1, 42, 7)
+        await broadcaster.task
+        assert json.loads(path.read_text())["after_id"] == 2
+        final = bot.edit_message_text.await_args
+        assert "interrupted" in final.args[0]
+        assert final.kwargs["reply_markup"].inline_keyboard[0][0].callback_data == "broadcast_resume"
+
+        # Once the backend is back, Resume picks up after user 2
+        outage["limit"] = 0
+        assert broadcaster.resume(bot)
+        await broadcaster.task
+    assert [c.kwargs["chat_id"] for c in bot.copy_message.await_args_list] == [1001, 1002, 1003, 1004, 1005]
+    assert broadcaster.stats()["sent"] == 5
+    assert not path.exists()
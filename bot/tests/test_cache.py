@@ -0,0 +1,115 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock
+from cache import CachedValue, TTLCache
+
+
+@pytest.mark.asyncio
+async def test_cached_value_single_flight():
+    calls = 0
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"n": calls}
+
+    value = CachedValue(loader, ttl=60)
+    results = await asyncio.gather(*(value.get() for _ in range(10)))
+
+    assert calls == 1
+    assert all(r == {"n": 1} for r in results)
+
+
+@pytest.mark.asyncio
+async def test_cached_value_expires_and_invalidates():
+    loader = AsyncMock(side_effect=[1, 2, 3])
+    value = CachedValue(loader, ttl=0)
+
+    assert await value.get() == 1
+    assert await value.get() == 2
+
+    value.ttl = 60
+    assert await value.get() == 3
+    assert await value.get() == 3
+    assert loader.await_count == 3
+
+    value.invalidate()
+    loader.side_effect = [4]
+    assert await value.get() == 4
+
+
+@pytest.mark.asyncio
+async def test_invalidate_during_load_makes_next_get_reload():
+    release_old = asyncio.Event()
+    versions = ["old", "new"]
+
+    async def loader():
+        version = versions.pop(0)
+        if version == "old":
+            await release_old.wait()
+        return version
+
+    value = CachedValue(loader, ttl=60)
+    stale = asyncio.ensure_future(value.get())
+    await asyncio.sleep(0)
+
+    # e.g. an admin edits the catalog while it is being loaded
+    value.invalidate()
+    assert await value.get() == "new"
+
+    release_old.set()
+    assert await stale == "old"
+    # The detached load neither overwrote the fresh value nor cleared the wrong load
+    assert await value.get() == "new"
+
+
+@pytest.mark.asyncio
+async def test_cached_value_does_not_cache_failures():
+    loader = AsyncMock(side_effect=[RuntimeError("down"), "ok"])
+    value = CachedValue(loader, ttl=60)
+
+    with pytest.raises(RuntimeError):
+        await value.get()
+    assert await value.get() == "ok"
+
+
+def test_ttl_cache_lru_eviction():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.add(1)
+    cache.add(2)
+    assert 1 in cache  # touch 1 so 2 becomes least recently used
+    cache.add(3)
+
+    assert 2 not in cache
+    assert 1 in cache and 3 in cache
+    assert len(cache) == 2
+    assert cache.evictions == 1
+
+
+def test_ttl_cache_expiry_and_counters():
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set(42, "fa")
+    cache.set(43, "en", ttl=0)
+
+    assert cache.get(42) == "fa"
+    assert cache.get(43) is None
+    assert 99 not in cache
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+    assert stats["expirations"] == 1
+    assert stats["size"] == 1
+
+
+def test_ttl_cache_set_style_api():
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.add(7)
+    assert 7 in cache
+    cache.discard(7)
+    cache.discard(7)
+    assert 7 not in cache
+    cache.add(8)
+    cache.clear()
+    assert len(cache) == 0
@@ -0,0 +1,146 @@
+import threading
+import pytest
+from unittest.mock import AsyncMock
+import cache
+from cache import RedisCacheBackend, SharedCache, prefetch
+
+
+class DictBackend:
+    """Stands in for a shared store (Redis) that several replicas talk to."""
+
+    def __init__(self):
+        self.data = {}
+
+    async def get_many(self, keys: list) -> list:
+        return [self.data.get(key) for key in keys]
+
+    async def set(self, key: str, value: str, ttl: float):
+        self.data[key] = value
+
+    async def delete(self, key: str):
+        self.data.pop(key, None)
+
+    async def close(self):
+        self.data.clear()
+
+
+@pytest.fixture
+def memory_backend():
+    backend = DictBackend()
+    cache.set_cache_backend(backend)
+    yield backend
+    cache.set_cache_backend(None)
+
+
+@pytest.fixture
+def redis_url():
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("redis")
+    server = fakeredis.TcpFakeServer(("127.0.0.1", 0), server_type="redis")
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, port = server.server_address
+    yield f"redis://{host}:{port}/0"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.asyncio
+async def test_shared_cache_store_is_visible_to_another_replica(memory_backend):
+    replica_a = SharedCache("lang", "LANG_CACHE_TTL", 3600)
+    replica_b = SharedCache("lang", "LANG_CACHE_TTL", 3600)
+
+    await replica_a.store(42, "fa")
+
+    assert 42 not in replica_b
+    assert await replica_b.fetch(42) == "fa"
+    assert replica_b.get(42) == "fa"
+
+
+@pytest.mark.asyncio
+async def test_prefetch_batches_missing_keys(memory_backend):
+    auth = SharedCache("auth", "AUTH_CACHE_TTL", 3600)
+    channel = SharedCache("channel", "CHANNEL_CACHE_TTL", 900)
+    lang = SharedCache("lang", "LANG_CACHE_TTL", 3600)
+    await memory_backend.set("auth:7", "1", 60)
+    await memory_backend.set("lang:7", "en", 60)
+
+    memory_backend.get_many = AsyncMock(wraps=memory_backend.get_many)
+    await prefetch(7, auth, channel, lang)
+
+    memory_backend.get_many.assert_awaited_once_with(["auth:7", "channel:7", "lang:7"])
+    assert 7 in auth
+    assert 7 not in channel
+    assert lang.get(7) == "en"
+
+    # Everything that exists is now local; only the absent key is asked for again
+    memory_backend.get_many.reset_mock()
+    await prefetch(7, auth, lang)
+    memory_backend.get_many.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_memory_mode_keeps_one_copy_and_counts_lookups_once(monkeypatch):
+    monkeypatch.delenv("CACHE_BACKEND", raising=False)
+    cache.set_cache_backend(None)
+    assert cache.get_cache_backend() is None
+
+    auth = SharedCache("auth", "AUTH_CACHE_TTL", 3600)
+    await auth.store(5)
+    # Without a shared store the local copy keeps the full TTL
+    assert auth.local._data[5].expires_at - cache.time.monotonic() > 3000
+
+    await prefetch(5, auth)
+    await prefetch(6, auth)
+    assert 5 in auth
+    assert 6 not in auth
+    assert await auth.fetch(6) is None
+    assert auth.stats()["hits"] == 1
+    assert auth.stats()["misses"] == 2
+
+    await auth.forget(5)
+    assert 5 not in auth
+
+
+@pytest.mark.asyncio
+async def test_prefetch_does_not_count_as_a_lookup(memory_backend):
+    lang = SharedCache("lang", "LANG_CACHE_TTL", 3600)
+    await memory_backend.set("lang:8", "fa", 60)
+
+    await prefetch(8, lang)
+    await prefetch(8, lang)
+    assert lang.get(8) == "fa"
+    assert lang.stats()["hits"] == 1
+    assert lang.stats()["misses"] == 0
+
+
+@pytest.mark.asyncio
+async def test_shared_cache_survives_backend_errors():
+    broken = AsyncMock()
+    broken.get_many.side_effect = ConnectionError("down")
+    broken.set.side_effect = ConnectionError("down")
+    cache.set_cache_backend(broken)
+    try:
+        auth = SharedCache("auth", "AUTH_CACHE_TTL", 3600)
+        await auth.store(1)
+        assert 1 in auth
+        assert await auth.fetch(2) is None
+        await prefetch(3, auth)
+    finally:
+        cache.set_cache_backend(None)
+
+
+@pytest.mark.asyncio
+async def test_redis_backend_against_local_server(redis_url):
+    backend = RedisCacheBackend(redis_url)
+    try:
+        await backend.set("auth:1", "1", 60)
+        await backend.set("lang:1", "fa", 60)
+
+        assert await backend.get_many(["auth:1", "channel:1", "lang:1"]) == ["1", None, "fa"]
+
+        await backend.delete("lang:1")
+        assert await backend.get_many(["lang:1"]) == [None]
+        assert await backend.get_many([]) == []
+    finally:
+        await backend.close()
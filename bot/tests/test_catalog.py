@@ -0,0 +1,94 @@
+import pytest
+import httpx
+from unittest.mock import AsyncMock, MagicMock, patch
+from catalog import EndpointCatalog, PlanCatalog
+
+PLANS = [
+    {"ID": 1, "server_type": "v2ray", "duration_days": 30, "data_limit_gb": 50, "price_irr": 1500000, "price_usdt": 2.5, "is_active": True},
+    {"ID": 2, "server_type": "wireguard", "duration_days": 30, "data_limit_gb": 0, "price_irr": 900000, "price_usdt": 1.5, "is_active": True},
+    {"ID": 3, "server_type": "v2ray", "duration_days": 90, "data_limit_gb": 150, "price_irr": 4000000, "price_usdt": 6.5, "is_active": False},
+]
+
+
+def fake_api(*payloads):
+    api = MagicMock()
+    api.get_plans = AsyncMock(side_effect=[
+        p if isinstance(p, Exception) else httpx.Response(200, json=p, request=httpx.Request("GET", "http://backend.test/plans"))
+        for p in payloads
+    ])
+    return api
+
+
+@pytest.mark.asyncio
+async def test_catalog_indexes_plans_with_one_request():
+    catalog = PlanCatalog(ttl=300)
+    api = fake_api(PLANS)
+    with patch("catalog.get_api", return_value=api):
+        await catalog.preload()
+        assert [p["ID"] for p in await catalog.active_by_type("v2ray")] == [1]
+        assert (await catalog.get("2"))["server_type"] == "wireguard"
+        # Inactive plans are still found by ID, like GET /plans/{id}
+        assert (await catalog.get(3))["ID"] == 3
+        assert await catalog.get(99) is None
+        assert await catalog.active_by_type("openvpn") == []
+
+    api.get_plans.assert_awaited_once_with(include_inactive=True)
+    assert catalog.version == 1
+
+
+@pytest.mark.asyncio
+async def test_invalidate_reloads_and_bumps_version_only_on_change():
+    catalog = PlanCatalog(ttl=300)
+    changed = [dict(PLANS[0], price_irr=1700000)] + PLANS[1:]
+    api = fake_api(PLANS, PLANS, changed)
+    with patch("catalog.get_api", return_value=api):
+        await catalog.get(1)
+        catalog.invalidate()
+        await catalog.get(1)
+        assert catalog.version == 1
+
+        catalog.invalidate()
+        assert (await catalog.get(1))["price_irr"] == 1700000
+        assert catalog.version == 2
+    assert api.get_plans.await_count == 3
+
+
+@pytest.mark.asyncio
+async def test_failed_refresh_serves_last_known_plans():
+    catalog = PlanCatalog(ttl=300)
+    api = fake_api(PLANS, httpx.ConnectError("down"))
+    with patch("catalog.get_api", return_value=api):
+        await catalog.get(1)
+        catalog.invalidate()
+        assert (await catalog.get(1))["ID"] == 1
+
+    with patch("catalog.get_api", return_value=fake_api(httpx.ConnectError("down"))):
+        with pytest.raises(httpx.ConnectError):
+            await PlanCatalog(ttl=300).get(1)
+
+
+ENDPOINTS = [
+    {"ID": 1, "name": "🇩🇪 Germany", "address": "de.example.com:51820", "is_active": True},
+    {"ID": 2, "name": "🇳🇱 Netherlands", "address": "nl.example.com:51820", "is_active": True},
+]
+
+
+@pytest.mark.asyncio
+async def test_endpoint_catalog_serves_taps_from_memory_until_invalidated():
+    catalog = EndpointCatalog(ttl=300)
+    api = MagicMock()
+    api.get_endpoints = AsyncMock(side_effect=[
+        httpx.Response(200, json=payload, request=httpx.Request("GET", "http://backend.test/endpoints"))
+        for payload in (ENDPOINTS, ENDPOINTS[:1])
+    ])
+    with patch("catalog.get_api", return_value=api):
+        assert len(await catalog.active()) == 2
+        assert (await catalog.get("2"))["name"] == "🇳🇱 Netherlands"
+        assert api.get_endpoints.await_count == 1
+
+        # An admin toggled endpoint 2 off
+        catalog.invalidate()
+        assert await catalog.get(2) is None
+
+    assert api.get_endpoints.await_count == 2
+    assert catalog.version == 2
@@ -1,3 +1,4 @@
+import asyncio
 import pytest
 from unittest.mock import AsyncMock, patch, MagicMock
 from aiogram.types import Message, User, CallbackQuery
@@ -9,8 +10,8 @@ from bot import (
     channel_verified_cache,
     auth_cache,
     get_required_channel_link,
+    invalidate_channel_settings,
 )
-import httpx
 
 @pytest.fixture
 def mock_bot():
@@ -41,15 +42,13 @@ def admin_user():
 @pytest.mark.asyncio
 async def test_get_required_channel_empty(mock_message, mock_bot):
     """Test getting required channel when not set"""
-    with patch("bot.httpx.AsyncClient") as mock_client:
+    invalidate_channel_settings()
+    with patch("bot.get_api") as mock_get_api:
         mock_response = MagicMock()
         mock_response.status_code = 200
         mock_response.json.return_value = {"required_channel": ""}
 
-        mock_client_instance = MagicMock()
-        mock_client_instance.get = AsyncMock(return_value=mock_response)
-        mock_client.return_value.__aenter__.return_value = mock_client_instance
-        mock_client.return_value.__aexit__.return_value = None
+        mock_get_api.return_value.get_required_channel_settings = AsyncMock(return_value=mock_response)
 
         channel = await get_required_channel()
         assert channel == ""
@@ -57,19 +56,41 @@ async def test_get_required_channel_empty(mock_message, mock_bot):
 @pytest.mark.asyncio
 async def test_get_required_channel_set(mock_message, mock_bot):
     """Test getting required channel when set"""
-    with patch("bot.httpx.AsyncClient") as mock_client:
+    invalidate_channel_settings()
+    with patch("bot.get_api") as mock_get_api:
         mock_response = MagicMock()
         mock_response.status_code = 200
         mock_response.json.return_value = {"required_channel": "@mychannel"}
 
-        mock_client_instance = MagicMock()
-        mock_client_instance.get = AsyncMock(return_value=mock_response)
-        mock_client.return_value.__aenter__.return_value = mock_client_instance
-        mock_client.return_value.__aexit__.return_value = None
+        mock_get_api.return_value.get_required_channel_settings = AsyncMock(return_value=mock_response)
 
         channel = await get_required_channel()
         assert channel == "@mychannel"
 
+@pytest.mark.asyncio
+async def test_channel_and_link_share_one_settings_fetch():
+    """Channel and link are served from a single cached settings fetch"""
+    invalidate_channel_settings()
+    with patch("bot.get_api") as mock_get_api:
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = {
+            "required_channel": "@mychannel",
+            "required_channel_link": "https://t.me/+abc",
+        }
+        mock_get_api.return_value.get_required_channel_settings = AsyncMock(return_value=mock_response)
+
+        channel, link = await asyncio.gather(get_required_channel(), get_required_channel_link())
+        assert channel == "@mychannel"
+        assert link == "https://t.me/+abc"
+        assert await get_required_channel() == "@mychannel"
+        mock_get_api.return_value.get_required_channel_settings.assert_awaited_once()
+
+        invalidate_channel_settings()
+        await get_required_channel_link()
+        assert mock_get_api.return_value.get_required_channel_settings.await_count == 2
+    invalidate_channel_settings()
+
 @pytest.mark.asyncio
 async def test_check_channel_membership_no_channel(mock_bot):
     """Test channel membership check when no channel is required"""
@@ -0,0 +1,66 @@
+import pytest
+from aiogram.fsm.storage.base import StorageKey
+from fsm_storage import SQLiteStorage
+from payment_handlers import PaymentState
+
+KEY = StorageKey(bot_id=1, chat_id=123456, user_id=123456)
+
+
+@pytest.mark.asyncio
+async def test_state_and_data_survive_restart(tmp_path):
+    path = str(tmp_path / "fsm.sqlite3")
+
+    storage = SQLiteStorage(path)
+    await storage.set_state(KEY, PaymentState.waiting_for_screenshot)
+    await storage.update_data(KEY, {"plan_id": "3", "endpoint_id": 2, "config_name": "سرویس_من"})
+    await storage.close()
+
+    restarted = SQLiteStorage(path)
+    assert await restarted.get_state(KEY) == PaymentState.waiting_for_screenshot.state
+    assert await restarted.get_data(KEY) == {"plan_id": "3", "endpoint_id": 2, "config_name": "سرویس_من"}
+    await restarted.close()
+
+
+@pytest.mark.asyncio
+async def test_writes_are_batched_and_readable_before_flush(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "fsm.sqlite3"), flush_interval=60)
+    await storage.set_state(KEY, "PaymentState:waiting_for_config_name")
+    await storage.set_data(KEY, {"plan_id": "1"})
+
+    # Nothing committed yet, but reads see the buffered values
+    assert await storage._read(storage.key_builder.build(KEY), "state") is None
+    assert await storage.get_state(KEY) == "PaymentState:waiting_for_config_name"
+    assert await storage.get_data(KEY) == {"plan_id": "1"}
+
+    await storage.flush()
+    assert await storage._read(storage.key_builder.build(KEY), "state") == "PaymentState:waiting_for_config_name"
+    await storage.close()
+
+
+@pytest.mark.asyncio
+async def test_abandoned_sessions_expire(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "fsm.sqlite3"), ttl=-1)
+    await storage.set_state(KEY, "SupportState:waiting_for_message")
+    await storage.set_data(KEY, {"x": 1})
+    await storage.flush()
+
+    assert await storage.get_state(KEY) is None
+    assert await storage.get_data(KEY) == {}
+    await storage.close()
+
+
+@pytest.mark.asyncio
+async def test_cleared_session_removes_row(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / "fsm.sqlite3"))
+    await storage.set_state(KEY, "AddPlanForm:waiting_for_price")
+    await storage.set_data(KEY, {"server_type": "v2ray"})
+    await storage.flush()
+
+    await storage.set_state(KEY, None)
+    await storage.set_data(KEY, {})
+    await storage.flush()
+
+    db = await storage._connection()
+    async with db.execute("SELECT COUNT(*) FROM fsm") as cursor:
+        assert (await cursor.fetchone())[0] == 0
+    await storage.close()
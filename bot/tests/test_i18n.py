@@ -0,0 +1,41 @@
+import json
+import string
+import pytest
+from i18n import compile_catalogs, languages, load_catalogs, resolve_lang, t
+
+
+def test_lookup_interpolates_and_falls_back_to_english():
+    assert t("btn_back", "fa") == "🔙 بازگشت"
+    assert t("btn_back", "de") == "🔙 Back"
+    assert t("select_plan", "en", proto="v2ray") == "📝 **Select Your v2ray Plan:**"
+    # Keys missing from a locale use the English text
+    assert t("subscription_processing", "fa") == "Processing..."
+
+
+def test_resolve_lang_normalizes_codes():
+    assert resolve_lang("fa-IR") == "fa"
+    assert resolve_lang("EN_us") == "en"
+    assert resolve_lang("de") == "en"
+    assert resolve_lang(None) == "en"
+    assert languages() == ["en", "fa"]
+
+
+def test_locales_only_use_known_keys_and_valid_templates():
+    catalogs = load_catalogs()
+    for lang, texts in catalogs.items():
+        assert set(texts) <= set(catalogs["en"]), lang
+        for text in texts.values():
+            # Raises on a stray "{" or "}"
+            list(string.Formatter().parse(text))
+
+
+def test_new_locale_is_a_json_file(tmp_path):
+    (tmp_path / "en.json").write_text(json.dumps({"hello": "Hello {name}", "bye": "Bye"}))
+    (tmp_path / "de.json").write_text(json.dumps({"hello": "Hallo {name}"}))
+    keys, tables = compile_catalogs(load_catalogs(str(tmp_path)))
+    assert tables["de"][keys["hello"]] == "Hallo {name}"
+    assert tables["de"][keys["bye"]] == "Bye"
+
+    (tmp_path / "en.json").unlink()
+    with pytest.raises(RuntimeError):
+        load_catalogs(str(tmp_path))
@@ -0,0 +1,137 @@
+import asyncio
+import pytest
+import httpx
+from unittest.mock import AsyncMock, MagicMock, patch
+from aiogram.types import CallbackQuery, Message
+from jobs import DONE, FAILED, RETRYING, RUNNING, JobError, JobRegistry, RetryableJobError
+from payment_handlers import process_approve_order
+
+
+@pytest.mark.asyncio
+async def test_job_retries_with_backoff_then_succeeds():
+    registry = JobRegistry(max_attempts=4, retry_delay=0.01, max_retry_delay=0.02)
+    seen = []
+    attempts = []
+
+    async def run(job):
+        attempts.append(job.attempt)
+        if job.attempt < 3:
+            raise RetryableJobError("marzban down")
+        return {"ok": True}
+
+    async def on_progress(job):
+        seen.append((job.status, job.attempt))
+
+    job, created = registry.submit("approve:1", run, on_progress)
+    again, created_again = registry.submit("approve:1", run, on_progress)
+    assert created and not created_again and again is job
+
+    await job.task
+    assert job.status == DONE and job.result == {"ok": True}
+    assert seen == [(RUNNING, 1), (RETRYING, 1), (RUNNING, 2), (RETRYING, 2), (RUNNING, 3), (DONE, 3)]
+    assert registry.stats() == {"active": 0, "submitted": 1, "succeeded": 1, "failed": 0, "retries": 2}
+    assert registry.get("approve:1") is job
+
+
+@pytest.mark.asyncio
+async def test_permanent_error_fails_without_retry():
+    registry = JobRegistry(max_attempts=4, retry_delay=0)
+    run = AsyncMock(side_effect=JobError("Order not found"))
+
+    job, _ = registry.submit("approve:2", run)
+    await job.task
+    assert (job.status, job.attempt, job.error) == (FAILED, 1, "Order not found")
+
+    # A finished job doesn't block a new submission for the same key
+    second, created = registry.submit("approve:2", run)
+    assert created and second is not job
+    await second.task
+
+
+def approve_response(status, body):
+    return httpx.Response(status, json=body, request=httpx.Request("POST", "http://backend.test/orders/5/approve"))
+
+
+@pytest.mark.asyncio
+async def test_approve_callback_is_answered_before_provisioning_finishes():
+    release = asyncio.Event()
+    api = MagicMock()
+
+    async def approve_order(order_id):
+        await release.wait()
+        return approve_response(200, {"message": "Order approved and VPN provisioned", "telegram_id": 42})
+
+    api.approve_order = AsyncMock(side_effect=approve_order)
+    callback = AsyncMock(spec=CallbackQuery)
+    callback.answer = AsyncMock()
+    callback.data = "approve_order_5"
+    callback.message = MagicMock(spec=Message, caption="New Card Payment", message_id=9)
+    callback.message.chat = MagicMock(id=100)
+    bot = MagicMock()
+    bot.edit_message_caption = AsyncMock()
+
+    with patch("payment_handlers.get_api", return_value=api), patch("payment_handlers.jobs", JobRegistry()) as registry:
+        await process_approve_order(callback, bot)
+        callback.answer.assert_awaited_once()
+        await asyncio.sleep(0.01)
+        job = registry.get("approve:5")
+        assert job.status == RUNNING
+        assert "Provisioning" in bot.edit_message_caption.await_args.kwargs["caption"]
+
+        release.set()
+        await job.task
+
+    final = bot.edit_message_caption.await_args.kwargs
+    assert final["caption"].startswith("New Card Payment\n\n✅ **APPROVED**")
+    assert (final["chat_id"], final["message_id"], final["reply_markup"]) == (100, 9, None)
+
+
+@pytest.mark.asyncio
+async def test_failed_provisioning_offers_manual_options_after_retries():
+    api = MagicMock()
+    api.approve_order = AsyncMock(return_value=approve_response(400, {"error": "provisioning_failed", "message": "panel down"}))
+    callback = AsyncMock(spec=CallbackQuery)
+    callback.answer = AsyncMock()
+    callback.data = "retry_provision_5"
+    callback.message = MagicMock(spec=Message, caption="New Card Payment", message_id=9)
+    callback.message.chat = MagicMock(id=100)
+    bot = MagicMock()
+    bot.edit_message_caption = AsyncMock()
+
+    with patch("payment_handlers.get_api", return_value=api), \
+            patch("payment_handlers.jobs", JobRegistry(max_attempts=2, retry_delay=0)) as registry:
+        await process_approve_order(callback, bot)
+        await registry.get("approve:5").task
+
+    assert api.approve_order.await_count == 2
+    final = bot.edit_message_caption.await_args.kwargs
+    assert "panel down" in final["caption"]
+    assert final["reply_markup"].inline_keyboard[0][0].callback_data == "retry_provision_5"
+
+
+@pytest.mark.asyncio
+async def test_timed_out_approve_waits_for_the_backend_instead_of_failing():
+    request = httpx.Request("POST", "http://backend.test/orders/5/approve")
+    api = MagicMock()
+    api.approve_order = AsyncMock(side_effect=[
+        httpx.ReadTimeout("provisioning is slow", request=request),
+        # The first approve still holds the backend's claim on the order
+        approve_response(409, {"error": "provisioning_in_progress"}),
+        approve_response(200, {"message": "Already approved"}),
+    ])
+    callback = AsyncMock(spec=CallbackQuery)
+    callback.answer = AsyncMock()
+    callback.data = "approve_order_5"
+    callback.message = MagicMock(spec=Message, caption="New Card Payment", message_id=9)
+    callback.message.chat = MagicMock(id=100)
+    bot = MagicMock()
+    bot.edit_message_caption = AsyncMock()
+
+    with patch("payment_handlers.get_api", return_value=api), \
+            patch("payment_handlers.jobs", JobRegistry(max_attempts=4, retry_delay=0)) as registry:
+        await process_approve_order(callback, bot)
+        job = registry.get("approve:5")
+        await job.task
+
+    assert (job.status, job.attempt) == (DONE, 3)
+    assert api.approve_order.await_count == 3
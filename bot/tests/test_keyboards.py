@@ -0,0 +1,48 @@
+import pytest
+from pydantic import ValidationError
+from keyboards import get_back_menu, get_catalog_plans_menu, get_language_menu, get_main_menu, get_payment_methods_menu, get_wg_locations_menu
+
+PLANS = [{"ID": 1, "server_type": "v2ray", "duration_days": 30, "data_limit_gb": 50, "price_irr": 1500000}]
+
+
+def test_static_keyboards_are_shared_and_frozen():
+    menu = get_main_menu("fa", is_admin=False)
+    assert get_main_menu("fa", is_admin=False) is menu
+    assert get_main_menu("fa", is_admin=True) is not menu
+    assert menu.inline_keyboard[0][0].text == "💎 خرید کانفیگ"
+    assert get_main_menu("fa", is_admin=True).inline_keyboard[-1][0].callback_data == "admin_panel"
+
+    with pytest.raises(ValidationError):
+        menu.inline_keyboard = []
+
+    payment = get_payment_methods_menu("7", "en")
+    assert payment is get_payment_methods_menu("7", "en")
+    assert payment.inline_keyboard[0][0].callback_data == "pay_card_7"
+    assert get_back_menu("en", "my_configs", "btn_back_to_configs").inline_keyboard[0][0].text == "🔙 Back to My Configs"
+
+
+def test_plans_keyboard_rebuilt_only_on_catalog_change():
+    first = get_catalog_plans_menu(PLANS, "en", "v2ray", version=1)
+    assert get_catalog_plans_menu(PLANS, "en", "v2ray", version=1) is first
+    assert first.inline_keyboard[0][0].text == "30 Days - 50GB - 1,500,000 IRR"
+
+    changed = [dict(PLANS[0], price_irr=1700000)]
+    second = get_catalog_plans_menu(changed, "en", "v2ray", version=2)
+    assert second is not first
+    assert second.inline_keyboard[0][0].text == "30 Days - 50GB - 1,700,000 IRR"
+    assert get_catalog_plans_menu(changed, "fa", "v2ray", version=2).inline_keyboard[0][0].text == "30 روز - 50 گیگ - 170,000 تومان"
+
+
+def test_language_menu_lists_every_locale():
+    rows = get_language_menu().inline_keyboard
+    assert [row[0].callback_data for row in rows] == ["set_lang_en", "set_lang_fa", "main_menu"]
+    assert rows[1][0].text == "🇮🇷 فارسی"
+
+
+def test_wg_locations_menu_offers_the_archive_for_several_locations():
+    endpoints = [{"ID": 1, "name": "🇩🇪 Germany"}, {"ID": 2, "address": "nl.example.com:51820"}]
+    rows = get_wg_locations_menu("10", endpoints, "en").inline_keyboard
+
+    assert [row[0].callback_data for row in rows] == ["dl_wg_10_1", "dl_wg_10_2", "dl_wgzip_10", "my_configs"]
+    assert rows[1][0].text == "nl.example.com:51820"
+    assert "dl_wgzip_10" not in [row[0].callback_data for row in get_wg_locations_menu("10", endpoints[:1], "en").inline_keyboard]
@@ -0,0 +1,90 @@
+import os
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.methods import SendPhoto
+from aiogram.types import BufferedInputFile, FSInputFile
+from media import MediaRegistry, QRCodes, render_qr_png
+
+LINK = "https://panel.test/sub/abc123"
+
+
+def sent_photo(file_id: str):
+    sent = MagicMock()
+    sent.photo = [MagicMock(file_id="thumb"), MagicMock(file_id=file_id)]
+    return sent
+
+
+def test_render_qr_png_is_a_png():
+    assert render_qr_png(LINK).startswith(b"\x89PNG\r\n\x1a\n")
+
+
+@pytest.mark.asyncio
+async def test_qr_is_rendered_once_and_file_id_reused():
+    qr = QRCodes(maxsize=8)
+    message = MagicMock()
+    message.answer_photo = AsyncMock(return_value=sent_photo("FILE_1"))
+
+    with patch("media.render_qr_png", wraps=render_qr_png) as render:
+        await qr.send(message, LINK, caption="link")
+        await qr.send(message, LINK, caption="link")
+        await qr.png(LINK)
+
+    render.assert_called_once_with(LINK)
+    first, second = message.answer_photo.await_args_list
+    assert isinstance(first.kwargs["photo"], BufferedInputFile)
+    assert second.kwargs["photo"] == "FILE_1"
+    assert second.kwargs["caption"] == "link"
+
+
+@pytest.mark.asyncio
+async def test_rejected_file_id_falls_back_to_upload():
+    qr = QRCodes(maxsize=8)
+    qr._file_ids.set(LINK, "STALE")
+    message = MagicMock()
+    message.answer_photo = AsyncMock(side_effect=[
+        TelegramBadRequest(method=SendPhoto(chat_id=1, photo="STALE"), message="wrong file identifier"),
+        sent_photo("FILE_2"),
+    ])
+
+    await qr.send(message, LINK)
+
+    assert isinstance(message.answer_photo.await_args_list[1].kwargs["photo"], BufferedInputFile)
+    assert qr._file_ids.get(LINK) == "FILE_2"
+
+
+@pytest.mark.asyncio
+async def test_media_registry_uploads_once_and_persists(tmp_path):
+    asset = tmp_path / "menu.png"
+    asset.write_bytes(render_qr_png("menu"))
+    registry_path = str(tmp_path / "media_ids.json")
+    message = MagicMock()
+    message.answer_photo = AsyncMock(return_value=sent_photo("MENU_1"))
+
+    await MediaRegistry(registry_path).send_photo(message, str(asset), caption="menu")
+    # A new process reads the stored file_id and sends it without uploading
+    await MediaRegistry(registry_path).send_photo(message, str(asset), caption="menu")
+
+    first, second = message.answer_photo.await_args_list
+    assert isinstance(first.kwargs["photo"], FSInputFile)
+    assert second.kwargs["photo"] == "MENU_1"
+
+
+@pytest.mark.asyncio
+async def test_media_registry_reuploads_changed_asset(tmp_path):
+    asset = tmp_path / "menu.png"
+    asset.write_bytes(render_qr_png("old"))
+    registry = MediaRegistry(str(tmp_path / "media_ids.json"))
+    message = MagicMock()
+    message.answer_photo = AsyncMock(side_effect=[sent_photo("OLD"), sent_photo("NEW"), sent_photo("NEW")])
+
+    await registry.send_photo(message, str(asset))
+    asset.write_bytes(render_qr_png("new image"))
+    os.utime(asset, ns=(0, 1))  # make sure the mtime differs on coarse filesystems
+    await registry.send_photo(message, str(asset))
+    await registry.send_photo(message, str(asset))
+
+    photos = [c.kwargs["photo"] for c in message.answer_photo.await_args_list]
+    assert isinstance(photos[0], FSInputFile)
+    assert isinstance(photos[1], FSInputFile)
+    assert photos[2] == "NEW"
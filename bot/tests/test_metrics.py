@@ -0,0 +1,115 @@
+import asyncio
+import pytest
+import httpx
+from unittest.mock import AsyncMock, MagicMock
+from aiogram.methods import GetMe
+from aiohttp.test_utils import TestClient, TestServer
+from api_client import BackendClient
+from cache import CachedValue, TTLCache
+from metrics import (
+    BACKEND_SECONDS, MIDDLEWARE_SECONDS, TELEGRAM_SECONDS, HandlerTimingMiddleware, HANDLER_SECONDS,
+    Histogram, Registry, TelegramTimingMiddleware, TimedMiddleware, build_metrics_app,
+)
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("test_seconds", "Test.", ("route",), buckets=(0.1, 1))
+    histogram.observe(0.05, route="a")
+    histogram.observe(0.5, route="a")
+    histogram.observe(5, route="a")
+
+    lines = histogram.render()
+
+    assert 'test_seconds_bucket{route="a",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{route="a",le="1"} 2' in lines
+    assert 'test_seconds_bucket{route="a",le="+Inf"} 3' in lines
+    assert 'test_seconds_count{route="a"} 3' in lines
+    assert 'test_seconds_sum{route="a"} 5.55' in lines
+
+
+def test_collectors_flatten_stats_and_add_hit_ratios():
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.add("x")
+    assert "x" in cache and "y" not in cache and "x" in cache
+    reg = Registry()
+    reg.collect("cache_test", cache.stats)
+    reg.collect("route", lambda: {"GET /plans": {"active": 2, "name": "skipped", "gate": {"waiting": 1}}}, label="route")
+
+    text = reg.render()
+
+    assert "bot_cache_test_hits 2" in text
+    assert "bot_cache_test_hit_ratio 0.6666666666666666" in text
+    assert 'bot_route_active{route="GET /plans"} 2' in text
+    assert 'bot_route_gate_waiting{route="GET /plans"} 1' in text
+    assert "skipped" not in text
+
+
+@pytest.mark.asyncio
+async def test_cached_value_counts_hits_and_misses():
+    value = CachedValue(AsyncMock(return_value=1), ttl=60)
+    await value.get()
+    await value.get()
+    assert value.stats() == {"hits": 1, "misses": 1}
+
+
+@pytest.mark.asyncio
+async def test_backend_requests_are_timed_per_route_and_status():
+    api = BackendClient(
+        base_url="http://backend.test",
+        transport=httpx.MockTransport(lambda request: httpx.Response(404, json={})),
+    )
+    before = BACKEND_SECONDS.count(route="GET /users/{id}/subscriptions", status="404")
+    await api.get_subscriptions(42)
+    await api.aclose()
+    assert BACKEND_SECONDS.count(route="GET /users/{id}/subscriptions", status="404") == before + 1
+
+
+@pytest.mark.asyncio
+async def test_timed_middleware_excludes_the_wrapped_handler():
+    async def slow_check(handler, event, data):
+        await asyncio.sleep(0.02)
+        return await handler(event, data)
+
+    async def slow_handler(event, data):
+        await asyncio.sleep(0.2)
+        return "done"
+
+    result = await TimedMiddleware("test_check", slow_check)(slow_handler, object(), {})
+
+    spent = MIDDLEWARE_SECONDS._series[("test_check",)][-1]
+    assert result == "done"
+    assert 0.015 < spent < 0.15
+
+
+@pytest.mark.asyncio
+async def test_handler_timing_uses_the_handler_name():
+    async def process_example(event, data):
+        raise ValueError
+
+    handler_object = MagicMock()
+    handler_object.callback = process_example
+    with pytest.raises(ValueError):
+        await HandlerTimingMiddleware()(process_example, object(), {"handler": handler_object})
+    assert HANDLER_SECONDS.count(handler="process_example", outcome="error") == 1
+
+
+@pytest.mark.asyncio
+async def test_telegram_calls_are_timed_per_method():
+    make_request = AsyncMock(return_value="response")
+    before = TELEGRAM_SECONDS.count(method="GetMe", outcome="ok")
+    assert await TelegramTimingMiddleware()(make_request, MagicMock(), GetMe()) == "response"
+    assert TELEGRAM_SECONDS.count(method="GetMe", outcome="ok") == before + 1
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_serves_the_registry():
+    client = TestClient(TestServer(build_metrics_app()))
+    await client.start_server()
+    try:
+        resp = await client.get("/metrics")
+        body = await resp.text()
+    finally:
+        await client.close()
+    assert resp.status == 200
+    assert "# TYPE bot_handler_seconds histogram" in body
+    assert "# TYPE bot_backend_request_seconds histogram" in body
@@ -0,0 +1,177 @@
+import pytest
+import httpx
+from collections import Counter
+from unittest.mock import AsyncMock, MagicMock, patch
+from aiogram import Bot, Dispatcher, F, Router, types
+from aiogram.fsm.storage.memory import MemoryStorage
+from bot import (
+    ChannelVerificationMiddleware,
+    InviteMiddleware,
+    RegistrationState,
+    UserCheckMiddleware,
+    invalidate_channel_settings,
+    invite_attempts,
+    process_invite_code,
+    setup_middlewares,
+)
+from i18n import t
+from utils import get_user_lang
+
+REGISTERED = 777000101
+NEW_USER = 777000102
+SPAMMER = 777000103
+
+
+def backend():
+    request = httpx.Request("POST", "http://backend.test/users")
+
+    async def get_or_create_user(telegram_id, language, invite_code="", username=""):
+        if telegram_id in (NEW_USER, SPAMMER):
+            error = "invalid_invite_code" if invite_code else "invite_code_required"
+            return httpx.Response(400, json={"error": error}, request=request)
+        return httpx.Response(200, json={"telegram_id": telegram_id, "language": "fa"}, request=request)
+
+    api = MagicMock()
+    api.get_or_create_user = AsyncMock(side_effect=get_or_create_user)
+    api.get_required_channel_settings = AsyncMock(return_value=httpx.Response(
+        200, json={"required_channel": "", "required_channel_link": ""}, request=request))
+    return api
+
+
+def message_update(update_id: int, user_id: int, text: str) -> dict:
+    return {"update_id": update_id, "message": {
+        "message_id": update_id, "date": 0, "text": text,
+        "chat": {"id": user_id, "type": "private"},
+        "from": {"id": user_id, "is_bot": False, "first_name": "T", "language_code": "en"},
+    }}
+
+
+def callback_update(update_id: int, user_id: int, data: str) -> dict:
+    return {"update_id": update_id, "callback_query": {
+        "id": str(update_id), "chat_instance": "1", "data": data,
+        "from": {"id": user_id, "is_bot": False, "first_name": "T", "language_code": "en"},
+        "message": {"message_id": 1, "date": 0, "text": "menu", "chat": {"id": user_id, "type": "private"}},
+    }}
+
+
+@pytest.mark.asyncio
+async def test_checks_run_once_per_update_with_exact_backend_calls():
+    invalidate_channel_settings()
+    langs = []
+    router = Router()
+
+    @router.message(F.text == "hi")
+    async def on_text(message: types.Message):
+        # Asked twice, answered once: the second read comes from the update context
+        langs.append(await get_user_lang(message.from_user.id))
+        langs.append(await get_user_lang(message.from_user.id))
+
+    @router.callback_query(F.data == "menu")
+    async def on_button(callback: types.CallbackQuery):
+        langs.append(await get_user_lang(callback.from_user.id))
+
+    # The same checks registered again on a router are no-ops for an update that passed them
+    router.message.middleware(InviteMiddleware())
+    router.message.middleware(ChannelVerificationMiddleware())
+    router.callback_query.middleware(InviteMiddleware())
+    router.callback_query.middleware(ChannelVerificationMiddleware())
+
+    dp = Dispatcher(storage=MemoryStorage())
+    dp.include_router(router)
+    setup_middlewares(dp)
+    bot = Bot(token="42:TEST")
+
+    evaluations = Counter()
+    original = {cls: cls.allows for cls in (InviteMiddleware, ChannelVerificationMiddleware)}
+
+    def counting(cls):
+        async def allows(self, event, data):
+            evaluations[self.name] += 1
+            return await original[cls](self, event, data)
+        return allows
+
+    api = backend()
+
+    async def feed(update: dict) -> dict:
+        evaluations.clear()
+        before = {"users": api.get_or_create_user.await_count, "settings": api.get_required_channel_settings.await_count}
+        await dp.feed_update(bot, types.Update.model_validate(update, context={"bot": bot}))
+        return {
+            "users": api.get_or_create_user.await_count - before["users"],
+            "settings": api.get_required_channel_settings.await_count - before["settings"],
+            **evaluations,
+        }
+
+    with patch("bot.get_api", return_value=api), patch("utils.get_api", return_value=api), \
+            patch.object(InviteMiddleware, "allows", counting(InviteMiddleware)), \
+            patch.object(ChannelVerificationMiddleware, "allows", counting(ChannelVerificationMiddleware)), \
+            patch.object(Bot, "__call__", new=AsyncMock()):
+        # Cold user: one registration lookup (which also yields the language) and one settings fetch
+        assert await feed(message_update(1, REGISTERED, "hi")) == {"users": 1, "settings": 1, "invite": 1, "channel": 1}
+        # Warm user pressing a button: everything comes from caches
+        assert await feed(callback_update(2, REGISTERED, "menu")) == {"users": 0, "settings": 0, "invite": 1, "channel": 1}
+        # Unregistered user: one lookup, stopped at the invite gate
+        assert await feed(message_update(3, NEW_USER, "hi")) == {"users": 1, "settings": 0, "invite": 1}
+
+    assert langs == ["fa", "fa", "fa"]
+
+
+@pytest.mark.asyncio
+async def test_unregistered_user_is_answered_from_memory_and_code_attempts_back_off(monkeypatch):
+    # More updates than the default burst; the rate limiter is not under test here
+    monkeypatch.setenv("RATE_LIMIT_BURST", "100")
+    router = Router()
+    handled = []
+
+    @router.callback_query(F.data == "menu")
+    async def on_button(callback: types.CallbackQuery):
+        handled.append(callback.data)
+
+    router.message(RegistrationState.waiting_for_invite_code, F.text)(process_invite_code)
+
+    @router.message()
+    async def on_anything(message: types.Message):
+        handled.append(message.text)
+
+    dp = Dispatcher(storage=MemoryStorage())
+    dp.include_router(router)
+    setup_middlewares(dp)
+    bot = Bot(token="42:TEST")
+    api = backend()
+    sent = AsyncMock()
+
+    async def feed(update: dict) -> int:
+        before = api.get_or_create_user.await_count
+        await dp.feed_update(bot, types.Update.model_validate(update, context={"bot": bot}))
+        return api.get_or_create_user.await_count - before
+
+    def last_text() -> str:
+        messages = [c.args[0] for c in sent.await_args_list if type(c.args[0]).__name__ == "SendMessage"]
+        return messages[-1].text
+
+    with patch("bot.get_api", return_value=api), patch("utils.get_api", return_value=api), \
+            patch.object(Bot, "__call__", new=sent):
+        # The first update asks the backend once and remembers the verdict
+        assert await feed(message_update(11, SPAMMER, "hello")) == 1
+        assert last_text() == t("invite_only", "en")
+        # Button presses are turned away without a backend call
+        for update_id in (12, 13, 14):
+            assert await feed(callback_update(update_id, SPAMMER, "menu")) == 0
+        assert handled == []
+        assert last_text() == t("invite_only", "en")
+
+        # A wrong code is one backend call; retrying at once is refused from memory
+        assert await feed(message_update(15, SPAMMER, "WRONG1")) == 1
+        assert last_text() == t("invalid_invite_code", "en")
+        assert await feed(message_update(16, SPAMMER, "WRONG2")) == 0
+        assert last_text().startswith("⏳")
+
+    invite_attempts.success(SPAMMER)
+
+
+def test_user_check_without_allows_fails_at_construction():
+    class Forgetful(UserCheckMiddleware):
+        name = "forgetful"
+
+    with pytest.raises(TypeError):
+        Forgetful()
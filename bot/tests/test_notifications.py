@@ -0,0 +1,67 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+from aiogram.methods import SendMessage
+from notifications import FAILED, SENT, Notifier
+
+METHOD = SendMessage(chat_id=1, text="ticket")
+
+
+@pytest.mark.asyncio
+async def test_fan_out_runs_admins_concurrently():
+    notifier = Notifier(concurrency=3, retry_delay=0)
+    started = []
+    release = asyncio.Event()
+
+    async def send(chat_id):
+        started.append(chat_id)
+        await release.wait()
+
+    delivery = notifier.dispatch("ticket", ["1", "2", "3", "4"], send)
+    await asyncio.sleep(0.01)
+    # The caller isn't blocked, and the gate bounds parallel sends
+    assert len(started) == 3
+    assert not delivery.done
+
+    release.set()
+    await delivery.wait()
+    assert delivery.sent == ["1", "2", "3", "4"]
+    assert notifier.stats()["sent"] == 4
+
+
+@pytest.mark.asyncio
+async def test_retry_after_pauses_and_transient_errors_are_retried():
+    notifier = Notifier(concurrency=4, max_attempts=3, retry_delay=0)
+    calls = {"1": 0, "2": 0, "3": 0}
+
+    async def send(chat_id):
+        calls[chat_id] += 1
+        if chat_id == "1" and calls[chat_id] == 1:
+            raise TelegramRetryAfter(method=METHOD, message="flood", retry_after=0)
+        if chat_id == "2" and calls[chat_id] < 3:
+            raise ConnectionError("reset")
+        if chat_id == "3":
+            raise TelegramForbiddenError(method=METHOD, message="bot was blocked by the user")
+
+    delivery = await notifier.dispatch("order 7", list(calls), send).wait()
+
+    assert delivery.results == {"1": SENT, "2": SENT, "3": FAILED}
+    assert delivery.attempts == {"1": 1, "2": 3, "3": 1}
+    assert "blocked" in delivery.errors["3"]
+    assert calls == {"1": 2, "2": 3, "3": 1}
+    stats = notifier.stats()
+    assert (stats["flood_waits"], stats["retried"], stats["failed"]) == (1, 2, 1)
+
+
+@pytest.mark.asyncio
+async def test_gives_up_after_max_attempts_and_drains():
+    notifier = Notifier(max_attempts=2, retry_delay=0)
+    send = AsyncMock(side_effect=ConnectionError("down"))
+
+    delivery = notifier.dispatch("ticket", ["1"], send)
+    await notifier.drain(timeout=1)
+
+    assert delivery.failed == ["1"]
+    assert send.await_count == 2
+    assert notifier.stats()["in_flight"] == 0
@@ -0,0 +1,105 @@
+import asyncio
+import pytest
+import httpx
+from unittest.mock import AsyncMock
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+from api_client import BackendClient
+from orders import OrderIndex, checkout_key, idempotency_key
+
+
+def make_state(user_id: int = 1) -> FSMContext:
+    return FSMContext(storage=MemoryStorage(), key=StorageKey(bot_id=1, chat_id=user_id, user_id=user_id))
+
+
+def test_idempotency_key_depends_on_every_part():
+    base = idempotency_key(1, "c1", "5", 0, "card")
+    assert base == idempotency_key(1, "c1", 5, None, "card")
+    assert len(base) == 64
+    assert len({
+        base,
+        idempotency_key(2, "c1", "5", 0, "card"),
+        idempotency_key(1, "c2", "5", 0, "card"),
+        idempotency_key(1, "c1", "6", 0, "card"),
+        idempotency_key(1, "c1", "5", 3, "card"),
+        idempotency_key(1, "c1", "5", 0, "crypto"),
+    }) == 6
+
+
+@pytest.mark.asyncio
+async def test_checkout_key_is_stable_until_the_state_is_cleared():
+    state = make_state()
+    first = await checkout_key(state, 1, "5", 0, "crypto")
+    assert await checkout_key(state, 1, "5", 0, "crypto") == first
+
+    await state.clear()
+    assert await checkout_key(state, 1, "5", 0, "crypto") != first
+
+
+@pytest.mark.asyncio
+async def test_concurrent_first_taps_share_one_checkout():
+    state = make_state()
+    keys = await asyncio.gather(*(checkout_key(state, 1, "5", 0, "crypto") for _ in range(5)))
+    assert len(set(keys)) == 1
+
+
+@pytest.mark.asyncio
+async def test_repeats_and_concurrent_duplicates_create_one_order():
+    index = OrderIndex()
+    state = make_state()
+    calls = 0
+
+    async def create():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"ID": 42, "payLink": "https://pay.test/42"}
+
+    results = await asyncio.gather(*(index.create("k", state, create) for _ in range(3)))
+    assert calls == 1
+    assert [created for _, created in results].count(True) == 1
+    assert all(order["ID"] == 42 for order, _ in results)
+
+    order, created = await index.create("k", state, create)
+    assert (order["ID"], created, calls) == (42, False, 1)
+    assert (await state.get_data())["orders"]["k"]["payLink"] == "https://pay.test/42"
+
+
+@pytest.mark.asyncio
+async def test_order_in_fsm_data_is_reused_after_a_restart():
+    state = make_state()
+    await state.update_data(orders={"k": {"ID": 7}})
+    create = AsyncMock()
+
+    order, created = await OrderIndex().create("k", state, create)
+
+    assert (order["ID"], created) == (7, False)
+    create.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_failed_create_is_not_remembered():
+    index = OrderIndex()
+    state = make_state()
+    create = AsyncMock(side_effect=[{"error": "Plan not found"}, {"ID": 9}])
+
+    assert (await index.create("k", state, create))[0] == {"error": "Plan not found"}
+    order, created = await index.create("k", state, create)
+    assert (order["ID"], created) == (9, True)
+
+
+@pytest.mark.asyncio
+async def test_create_order_sends_idempotency_key_header():
+    seen = []
+
+    def handler(request):
+        seen.append(request.headers.get("Idempotency-Key"))
+        return httpx.Response(201, json={"ID": 1})
+
+    api = BackendClient(base_url="http://backend.test", transport=httpx.MockTransport(handler))
+    await api.create_order(1, 5, 0, "", "card", 1000, idempotency_key="abc")
+    await api.create_order(1, 5, 0, "", "card", 1000)
+    await api.aclose()
+
+    assert seen == ["abc", None]
@@ -15,6 +15,7 @@ async def test_process_card_payment():
     mock_callback.message = mock_message
     
     mock_state = AsyncMock(spec=FSMContext)
+    mock_state.get_data.return_value = {}
 
     with patch("payment_handlers.get_user_lang", new_callable=AsyncMock) as mock_lang:
         mock_lang.return_value = "en"
@@ -23,7 +24,9 @@ async def test_process_card_payment():
             
             await process_card_payment(mock_callback, mock_state)
             
-            mock_state.update_data.assert_awaited_once_with(plan_id="1", endpoint_id=0)
+            mock_state.update_data.assert_any_await(plan_id="1", endpoint_id=0)
+            # A checkout is started so repeated receipts map to one order
+            assert "checkout_id" in mock_state.update_data.await_args_list[-1].kwargs
             mock_state.set_state.assert_awaited_once_with(PaymentState.waiting_for_screenshot)
             
             mock_callback.message.edit_text.assert_awaited_once()
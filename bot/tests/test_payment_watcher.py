@@ -0,0 +1,125 @@
+import asyncio
+import json
+import time
+import pytest
+import httpx
+from unittest.mock import AsyncMock, MagicMock, patch
+from payment_watcher import PaymentWatcher
+
+
+def orders_api(statuses: dict):
+    """Backend whose GET /users/{id}/orders returns `statuses` ({telegram_id: {order_id: status}})."""
+    async def get_user_orders(telegram_id):
+        orders = [{"ID": int(oid), "payment_status": s} for oid, s in statuses.get(telegram_id, {}).items()]
+        return httpx.Response(200, json=orders, request=httpx.Request("GET", "http://backend.test/orders"))
+
+    api = MagicMock()
+    api.get_user_orders = AsyncMock(side_effect=get_user_orders)
+    return api
+
+
+def fake_bot():
+    bot = MagicMock()
+    bot.edit_message_text = AsyncMock()
+    return bot
+
+
+def polls_per_user(api) -> dict:
+    counts = {}
+    for call in api.get_user_orders.await_args_list:
+        counts[call.args[0]] = counts.get(call.args[0], 0) + 1
+    return counts
+
+
+@pytest.mark.asyncio
+async def test_paid_orders_are_confirmed_with_one_poll_per_user(tmp_path):
+    statuses = {1: {"10": "pending", "11": "pending"}, 2: {"20": "pending"}}
+    api = orders_api(statuses)
+    bot = fake_bot()
+    watcher = PaymentWatcher(str(tmp_path / "pending.json"), invoice_ttl=60, poll_min=0.01, poll_max=0.05)
+    watcher.bot = bot
+    watcher.watch(10, 1, chat_id=1, message_id=100, lang="en")
+    watcher.watch(11, 1, chat_id=1, message_id=101, lang="en")
+    watcher.watch(20, 2, chat_id=2, message_id=200, lang="fa")
+
+    with patch("payment_watcher.get_api", return_value=api):
+        # Every order is due: user 1's two orders share one request
+        await watcher._tick(time.time() + 1)
+        assert polls_per_user(api) == {1: 1, 2: 1}
+
+        statuses[1]["10"] = "paid"
+        statuses[2]["20"] = "approved"
+        await watcher._tick(time.time() + 2)
+        assert polls_per_user(api) == {1: 2, 2: 2}
+
+    edited = {c.kwargs["message_id"]: c.args[0] for c in bot.edit_message_text.await_args_list}
+    assert set(edited) == {100, 200}
+    assert "Payment Confirmed" in edited[100] and "#10" in edited[100]
+    assert "پرداخت تایید شد" in edited[200]
+    assert list(watcher.pending) == ["11"]
+    assert watcher.stats()["confirmed"] == 2
+
+
+@pytest.mark.asyncio
+async def test_rejected_order_stops_polling_and_tells_the_user(tmp_path):
+    statuses = {1: {"10": "pending"}}
+    api = orders_api(statuses)
+    bot = fake_bot()
+    watcher = PaymentWatcher(str(tmp_path / "pending.json"), invoice_ttl=3600, poll_min=0.01, poll_max=0.05)
+
+    with patch("payment_watcher.get_api", return_value=api):
+        watcher.start(bot)
+        watcher.watch(10, 1, chat_id=1, message_id=100, lang="en")
+        await asyncio.sleep(0.05)
+        statuses[1]["10"] = "rejected"
+        await asyncio.sleep(0.1)
+        polls = api.get_user_orders.await_count
+        await asyncio.sleep(0.1)
+        await watcher.shutdown()
+
+    # Nothing is polled once the order is final
+    assert api.get_user_orders.await_count == polls
+    bot.edit_message_text.assert_awaited_once()
+    assert "rejected" in bot.edit_message_text.await_args.args[0]
+    assert watcher.pending == {}
+    assert watcher.stats()["rejected"] == 1 and watcher.stats()["expired"] == 0
+
+
+@pytest.mark.asyncio
+async def test_unpaid_order_expires_after_a_final_check(tmp_path):
+    api = orders_api({1: {"10": "pending"}})
+    bot = fake_bot()
+    watcher = PaymentWatcher(str(tmp_path / "pending.json"), invoice_ttl=0.05, poll_min=1, poll_max=1)
+
+    with patch("payment_watcher.get_api", return_value=api):
+        watcher.start(bot)
+        watcher.watch(10, 1, chat_id=1, message_id=100, lang="en")
+        await asyncio.sleep(0.15)
+        await watcher.shutdown()
+
+    api.get_user_orders.assert_awaited_once_with(1)
+    assert "Expired" in bot.edit_message_text.await_args.args[0]
+    assert watcher.pending == {} and watcher.stats()["expired"] == 1
+
+
+@pytest.mark.asyncio
+async def test_pending_orders_survive_a_restart(tmp_path):
+    path = tmp_path / "pending.json"
+    first = PaymentWatcher(str(path), invoice_ttl=60, poll_min=60)
+    first.watch(10, 1, chat_id=1, message_id=100, lang="en")
+    assert json.loads(path.read_text())["10"]["message_id"] == 100
+
+    api = orders_api({1: {"10": "paid"}})
+    bot = fake_bot()
+    restarted = PaymentWatcher(str(path), poll_min=60)
+    saved = json.loads(path.read_text())
+    saved["10"]["next_poll"] = time.time()
+    path.write_text(json.dumps(saved))
+
+    with patch("payment_watcher.get_api", return_value=api):
+        restarted.start(bot)
+        await asyncio.sleep(0.05)
+        await restarted.shutdown()
+
+    assert bot.edit_message_text.await_args.kwargs["message_id"] == 100
+    assert json.loads(path.read_text()) == {}
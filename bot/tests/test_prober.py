@@ -0,0 +1,129 @@
+import asyncio
+import socket
+import pytest
+from prober import EndpointProber, ProbeStats, parse_address
+
+
+class Echo(asyncio.DatagramProtocol):
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.transport.sendto(data, addr)
+
+
+def free_udp_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_parse_address():
+    assert parse_address("de.example.com:51821") == ("de.example.com", 51821)
+    assert parse_address("[::1]:51820") == ("::1", 51820)
+    assert parse_address("de.example.com") == ("de.example.com", 51820)
+    assert parse_address("") == ("", 51820)
+
+
+@pytest.mark.asyncio
+async def test_tcp_probe_measures_listening_and_refusing_hosts():
+    server = await asyncio.start_server(lambda r, w: w.close(), "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    prober = EndpointProber(mode="tcp", timeout=1)
+    try:
+        latency, error = await prober.probe(f"127.0.0.1:{port}")
+        assert error is None and 0 <= latency < 1
+    finally:
+        server.close()
+        await server.wait_closed()
+
+    # Nothing listens any more: the reset still proves the host is reachable
+    latency, error = await prober.probe(f"127.0.0.1:{port}")
+    assert error is None and latency is not None
+
+
+@pytest.mark.asyncio
+async def test_udp_probe_needs_an_answer():
+    loop = asyncio.get_running_loop()
+    transport, _ = await loop.create_datagram_endpoint(Echo, local_addr=("127.0.0.1", 0))
+    port = transport.get_extra_info("sockname")[1]
+    prober = EndpointProber(mode="udp", timeout=0.3)
+    try:
+        latency, error = await prober.probe(f"127.0.0.1:{port}")
+        assert error is None and latency is not None
+    finally:
+        transport.close()
+
+    latency, error = await prober.probe(f"127.0.0.1:{free_udp_port()}")
+    assert latency is None and error in ("ConnectionRefusedError", "timeout")
+
+
+@pytest.mark.asyncio
+async def test_rounds_rank_fast_first_and_dead_last():
+    loop = asyncio.get_running_loop()
+    transport, _ = await loop.create_datagram_endpoint(Echo, local_addr=("127.0.0.1", 0))
+    live_port = transport.get_extra_info("sockname")[1]
+    endpoints = [
+        {"ID": 1, "name": "Dead", "address": f"127.0.0.1:{free_udp_port()}"},
+        {"ID": 2, "name": "Live", "address": f"127.0.0.1:{live_port}"},
+        {"ID": 3, "name": "New", "address": "127.0.0.1:1"},
+    ]
+    prober = EndpointProber(mode="udp", timeout=0.2, dead_after=2, concurrency=2)
+    try:
+        for _ in range(2):
+            await prober.run_once(endpoints[:2])
+    finally:
+        transport.close()
+
+    assert [ep["ID"] for ep in prober.rank(endpoints)] == [2, 3, 1]
+    assert prober.label(endpoints[0]) == "🔴 Dead"
+    assert prober.label(endpoints[1]).startswith("Live · ")
+    assert prober.label(endpoints[2]) == "New"
+    assert prober.describe(2).endswith("100% up")
+    assert prober.describe(1).startswith("DOWN (2 failed probes")
+    assert prober.describe(3) == "not probed"
+
+    prober.hide_dead = True
+    assert [ep["ID"] for ep in prober.rank(endpoints)] == [2, 3]
+    # Never hide everything
+    assert [ep["ID"] for ep in prober.rank(endpoints[:1])] == [1]
+
+    # Deactivated endpoints are forgotten
+    await prober.run_once([])
+    assert prober.stats() == {}
+
+
+def test_latency_and_availability_are_smoothed():
+    prober = EndpointProber(dead_after=3)
+    for latency in (0.100, 0.200, None):
+        prober.results.setdefault("1", ProbeStats()).record(latency, None if latency else "timeout")
+
+    stats = prober.get(1)
+    assert stats.latency == pytest.approx(0.3 * 0.2 + 0.7 * 0.1)
+    assert stats.availability == pytest.approx(0.7)
+    assert not prober.is_dead(1)
+    assert prober.stats()["1"]["failures"] == 1
+
+
+@pytest.mark.asyncio
+async def test_tcp_timeouts_on_the_wireguard_port_never_mark_dead():
+    endpoints = [{"ID": 1, "name": "Filtered", "address": "10.0.0.1:51820"}]
+
+    async def dropped(host, port):
+        await asyncio.sleep(1)
+
+    fallback = EndpointProber(mode="tcp", timeout=0.01, dead_after=2)
+    fallback._probe_tcp = dropped
+    for _ in range(3):
+        await fallback.run_once(endpoints)
+    assert not fallback.is_dead(1)
+    assert fallback.label(endpoints[0]) == "Filtered"
+    assert fallback.stats()["1"]["inconclusive"] == 3
+    assert "PROBE_TCP_PORT" in fallback.describe(1)
+
+    # A configured TCP port is expected to answer, so its timeouts do count
+    configured = EndpointProber(mode="tcp", tcp_port=22, timeout=0.01, dead_after=2)
+    configured._probe_tcp = dropped
+    for _ in range(2):
+        await configured.run_once(endpoints)
+    assert configured.is_dead(1)
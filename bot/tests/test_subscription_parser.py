@@ -0,0 +1,113 @@
+import base64
+import json
+import pytest
+import httpx
+from unittest.mock import patch
+from api_client import BackendClient
+from subscription_parser import (
+    MESSAGE_LIMIT,
+    ConfigEntry,
+    ParsedSubscriptions,
+    SubscriptionDecoder,
+    SubscriptionFetchError,
+    paginate_entries,
+    parse_config_line,
+    stream_config_entries,
+)
+
+VMESS = "vmess://" + base64.b64encode(json.dumps({"add": "de.example.com", "ps": "Germany"}).encode()).decode()
+LINES = [
+    "vless://uuid@nl.example.com:443?security=reality#%F0%9F%87%B3%F0%9F%87%B1%20Netherlands",
+    VMESS,
+    "trojan://pass@fi.example.com:8443#Finland",
+]
+BODY = "\n".join(LINES)
+
+
+def chunked(data: bytes, size: int):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def test_parse_config_line():
+    assert parse_config_line(LINES[0]) == ConfigEntry("VLESS", "nl.example.com", "🇳🇱 Netherlands", LINES[0])
+    assert parse_config_line(VMESS) == ConfigEntry("VMESS", "de.example.com", "Germany", VMESS)
+    assert parse_config_line("   ") is None
+    assert parse_config_line("not-a-uri").protocol == "CONFIG"
+
+
+@pytest.mark.parametrize("encode", [True, False])
+@pytest.mark.parametrize("size", [1, 3, 7, 4096])
+def test_decoder_handles_arbitrary_chunking(encode, size):
+    body = base64.b64encode(BODY.encode()) if encode else BODY.encode()
+    decoder = SubscriptionDecoder()
+    lines = []
+    for chunk in chunked(body, size):
+        lines.extend(decoder.feed(chunk))
+    lines.extend(decoder.close())
+    assert lines == LINES
+
+
+def test_decoder_accepts_unpadded_url_safe_base64():
+    # "~~~" encodes to "fn5-", so the body is certain to contain URL-safe characters
+    lines = LINES + ["trojan://p@x.example.com:1#~~~?"]
+    body = base64.urlsafe_b64encode("\n".join(lines).encode()).rstrip(b"=")
+    assert b"-" in body or b"_" in body
+    assert len(body) % 4
+
+    decoder = SubscriptionDecoder()
+    decoded = []
+    for chunk in chunked(body, 5):
+        decoded.extend(decoder.feed(chunk))
+    decoded.extend(decoder.close())
+    assert decoded == lines
+
+
+def test_decoder_falls_back_to_plain_text_when_not_base64():
+    # No ':' in the first 32 bytes, so it starts out looking like base64
+    lines = ["RemarkWithoutAnyColonsJustLettersAndDigits0123456789", *LINES]
+    decoder = SubscriptionDecoder()
+    decoded = []
+    for chunk in chunked("\n".join(lines).encode(), 7):
+        decoded.extend(decoder.feed(chunk))
+    decoded.extend(decoder.close())
+    assert decoded == lines
+
+
+def test_paginate_entries_respects_message_limit():
+    entries = [parse_config_line(f"vless://u@h{i}.example.com:443#{'x' * 200}") for i in range(60)]
+    pages = paginate_entries(entries, "header\n\n")
+
+    assert len(pages) > 1
+    assert all(len(page) <= MESSAGE_LIMIT for page in pages)
+    assert pages[0].startswith("header")
+    assert sum(page.count("<code>") for page in pages) == 60
+
+    huge = [ConfigEntry("VLESS", "h", "", "vless://" + "a" * MESSAGE_LIMIT)]
+    assert paginate_entries(huge, "header") is None
+
+
+@pytest.mark.asyncio
+async def test_stream_and_cache_parsed_subscription():
+    calls = []
+
+    def handler(request: httpx.Request):
+        calls.append(request.url)
+        if request.url.path == "/sub/missing":
+            return httpx.Response(404)
+        return httpx.Response(200, content=base64.b64encode(BODY.encode()))
+
+    client = BackendClient(base_url="http://backend.test", token="T", transport=httpx.MockTransport(handler))
+    parsed = ParsedSubscriptions(ttl=60)
+    try:
+        with patch("subscription_parser.get_api", return_value=client):
+            entries = await parsed.get("https://panel.test/sub/abc")
+            assert [e.host for e in entries] == ["nl.example.com", "de.example.com", "fi.example.com"]
+            assert await parsed.get("https://panel.test/sub/abc") is entries
+            assert len(calls) == 1
+
+            with pytest.raises(SubscriptionFetchError):
+                await parsed.get("https://panel.test/sub/missing")
+            with pytest.raises(SubscriptionFetchError):
+                _ = [e async for e in stream_config_entries("https://panel.test/sub/abc", max_bytes=10)]
+    finally:
+        await client.aclose()
@@ -0,0 +1,62 @@
+import asyncio
+import pytest
+import httpx
+from unittest.mock import AsyncMock, MagicMock, patch
+from subscriptions import SubscriptionCache
+
+SUBS = [
+    {"ID": 11, "status": "active", "config_link": "https://panel.test/sub/a"},
+    {"ID": 12, "status": "expired", "config_link": "https://panel.test/sub/b"},
+]
+
+
+def fake_api(payload=SUBS, status=200):
+    api = MagicMock()
+
+    async def get_subscriptions(telegram_id):
+        await asyncio.sleep(0)
+        return httpx.Response(status, json=payload, request=httpx.Request("GET", "http://backend.test"))
+
+    api.get_subscriptions = AsyncMock(side_effect=get_subscriptions)
+    return api
+
+
+@pytest.mark.asyncio
+async def test_browse_session_fetches_once():
+    cache = SubscriptionCache(ttl=30)
+    api = fake_api()
+    with patch("subscriptions.get_api", return_value=api):
+        results = await asyncio.gather(cache.get(1), cache.get(1), cache.find(1, "11"))
+        assert results[0].items == SUBS
+        assert results[2]["config_link"] == "https://panel.test/sub/a"
+        assert await cache.find(1, 12) == SUBS[1]
+        assert await cache.find(1, "99") is None
+
+    api.get_subscriptions.assert_awaited_once_with(1)
+
+
+@pytest.mark.asyncio
+async def test_order_response_invalidates_its_user():
+    cache = SubscriptionCache(ttl=30)
+    api = fake_api()
+    with patch("subscriptions.get_api", return_value=api):
+        await cache.get(1)
+        await cache.get(2)
+
+        cache.invalidate_from_response(httpx.Response(200, json={"message": "Order approved", "telegram_id": 1}))
+        await cache.get(1)
+        await cache.get(2)
+
+    assert [c.args[0] for c in api.get_subscriptions.await_args_list] == [1, 2, 1]
+
+
+@pytest.mark.asyncio
+async def test_errors_are_not_cached():
+    cache = SubscriptionCache(ttl=30)
+    with patch("subscriptions.get_api", return_value=fake_api({"error": "boom"}, status=500)):
+        with pytest.raises(httpx.HTTPStatusError):
+            await cache.get(1)
+    with patch("subscriptions.get_api", return_value=fake_api()):
+        assert len((await cache.get(1)).items) == 2
+    with patch("subscriptions.get_api", return_value=fake_api({"error": "User not found"}, status=404)):
+        assert (await cache.get(2)).items == []
@@ -0,0 +1,221 @@
+import asyncio
+import pytest
+import httpx
+from unittest.mock import AsyncMock, MagicMock, patch
+from aiogram import types
+from api_client import BackendBusy, BackendClient, route_key
+from i18n import t
+from throttling import (
+    Backoff,
+    CallbackCoalesceMiddleware,
+    ConcurrencyLimitMiddleware,
+    Gate,
+    GateTimeout,
+    RateLimitMiddleware,
+)
+
+
+def make_callback(user_id: int, data: str, lang: str = "en"):
+    callback = MagicMock(spec=types.CallbackQuery)
+    callback.from_user = MagicMock(id=user_id, language_code=lang)
+    callback.data = data
+    callback.answer = AsyncMock()
+    return callback
+
+
+@pytest.mark.asyncio
+async def test_gate_queues_then_sheds_after_deadline():
+    gate = Gate("test", limit=1)
+    release = asyncio.Event()
+
+    async def hold():
+        async with gate.slot(1):
+            await release.wait()
+
+    holder = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+
+    with pytest.raises(GateTimeout):
+        async with gate.slot(0.05):
+            pass
+
+    stats = gate.stats()
+    assert stats["active"] == 1
+    assert stats["waiting"] == 0
+    assert stats["max_waiting"] == 1
+    assert stats["rejected"] == 1
+    assert stats["max_wait_seconds"] >= 0.05
+
+    release.set()
+    await holder
+    # The slot is free again once the holder finishes
+    async with gate.slot(0.05):
+        assert gate.stats()["active"] == 1
+    assert gate.stats()["active"] == 0
+
+
+@pytest.mark.asyncio
+async def test_middleware_answers_busy_when_saturated():
+    middleware = ConcurrencyLimitMiddleware(limit=1, deadline=0.05)
+    release = asyncio.Event()
+
+    async def slow_handler(event, data):
+        await release.wait()
+        return "done"
+
+    first = asyncio.create_task(middleware(slow_handler, MagicMock(), {}))
+    await asyncio.sleep(0)
+
+    callback = MagicMock(spec=types.CallbackQuery)
+    callback.from_user = MagicMock(id=999001, language_code="fa")
+    callback.answer = AsyncMock()
+    handler = AsyncMock()
+
+    assert await middleware(handler, callback, {}) is None
+    handler.assert_not_awaited()
+    callback.answer.assert_awaited_once_with(t("busy", "fa"), show_alert=True)
+
+    release.set()
+    assert await first == "done"
+    assert middleware.stats()["rejected"] == 1
+
+
+@pytest.mark.asyncio
+async def test_backend_busy_is_answered_like_a_full_bot():
+    middleware = ConcurrencyLimitMiddleware(limit=5, deadline=1)
+    message = MagicMock(spec=types.Message)
+    message.from_user = MagicMock(id=999002, language_code="en")
+    message.answer = AsyncMock()
+
+    async def handler(event, data):
+        raise BackendBusy("GET /plans saturated")
+
+    await middleware(handler, message, {})
+    message.answer.assert_awaited_once_with(t("busy", "en"))
+
+
+def test_route_key_collapses_ids():
+    assert route_key("get", "/users/42/subscriptions") == "GET /users/{id}/subscriptions"
+    assert route_key("POST", "/orders/7/approve") == "POST /orders/{id}/approve"
+    assert route_key("POST", "/orders/") == "POST /orders"
+    assert route_key("GET", "/plans") == "GET /plans"
+
+
+@pytest.mark.asyncio
+async def test_backend_client_caps_each_route(monkeypatch):
+    monkeypatch.setenv("API_ROUTE_CONCURRENCY", "2")
+    monkeypatch.setenv("API_ROUTE_LIMITS", "POST /orders/{id}/approve=1")
+    monkeypatch.setenv("API_QUEUE_DEADLINE", "0.05")
+    release = asyncio.Event()
+    in_flight = {"max": 0, "now": 0}
+
+    async def handler(request: httpx.Request):
+        in_flight["now"] += 1
+        in_flight["max"] = max(in_flight["max"], in_flight["now"])
+        await release.wait()
+        in_flight["now"] -= 1
+        return httpx.Response(200, json={})
+
+    client = BackendClient(base_url="http://backend.test/api/v1", token="T", transport=httpx.MockTransport(handler))
+    try:
+        approval = asyncio.create_task(client.approve_order(1))
+        await asyncio.sleep(0.01)
+        # A second approval has to wait for the first and times out
+        with pytest.raises(BackendBusy):
+            await client.approve_order(2)
+
+        # Other routes are not affected by the saturated one
+        reads = [asyncio.create_task(client.get_subscriptions(i)) for i in range(3)]
+        await asyncio.sleep(0.01)
+        assert client.stats()["GET /users/{id}/subscriptions"]["waiting"] == 1
+
+        release.set()
+        await asyncio.gather(approval, *reads)
+        assert in_flight["max"] == 3  # one approval + two reads
+        assert client.stats()["POST /orders/{id}/approve"]["rejected"] == 1
+    finally:
+        await client.aclose()
+
+
+@pytest.mark.asyncio
+async def test_duplicate_taps_share_one_handler_run():
+    middleware = CallbackCoalesceMiddleware()
+    release = asyncio.Event()
+    calls = []
+
+    async def handler(event, data):
+        calls.append(event.data)
+        await release.wait()
+        return "order-1"
+
+    taps = [make_callback(999010, "pay_crypto_3_1") for _ in range(3)]
+    other_user = make_callback(999011, "pay_crypto_3_1")
+    tasks = [asyncio.create_task(middleware(handler, tap, {})) for tap in taps + [other_user]]
+    await asyncio.sleep(0)
+    assert middleware.stats() == {"in_flight": 2, "coalesced": 2}
+
+    release.set()
+    assert await asyncio.gather(*tasks) == ["order-1"] * 4
+    assert len(calls) == 2  # once per user
+    for tap in taps[1:]:
+        tap.answer.assert_awaited_once_with()
+    assert middleware.stats()["in_flight"] == 0
+
+    # Once finished, the next tap runs normally again
+    await middleware(handler, make_callback(999010, "pay_crypto_3_1"), {})
+    assert len(calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_failed_tap_releases_duplicates():
+    middleware = CallbackCoalesceMiddleware()
+    started = asyncio.Event()
+
+    async def handler(event, data):
+        started.set()
+        await asyncio.sleep(0.01)
+        raise RuntimeError("backend down")
+
+    first = asyncio.create_task(middleware(handler, make_callback(999012, "dl_wg_1_2"), {}))
+    await started.wait()
+    duplicate = make_callback(999012, "dl_wg_1_2")
+    assert await middleware(handler, duplicate, {}) is None
+    duplicate.answer.assert_awaited_once()
+    with pytest.raises(RuntimeError):
+        await first
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_allows_burst_then_refills():
+    limiter = RateLimitMiddleware(rate=10, burst=3)
+    handler = AsyncMock(return_value="ok")
+
+    for _ in range(3):
+        assert await limiter(handler, make_callback(999020, "buy_menu"), {}) == "ok"
+    limited = make_callback(999020, "buy_menu", lang="fa")
+    assert await limiter(handler, limited, {}) is None
+    limited.answer.assert_awaited_once_with(t("slow_down", "fa"))
+    assert handler.await_count == 3
+
+    # Other users have their own bucket
+    assert await limiter(handler, make_callback(999021, "buy_menu"), {}) == "ok"
+
+    await asyncio.sleep(0.15)
+    assert await limiter(handler, make_callback(999020, "buy_menu"), {}) == "ok"
+    assert limiter.stats()["limited"] == 1
+
+
+def test_backoff_doubles_up_to_cap_and_resets_on_success():
+    backoff = Backoff(base=2, cap=5, reset=3600)
+    with patch("throttling.time.monotonic", return_value=100.0):
+        assert backoff.retry_after(1) == 0
+        assert backoff.failure(1) == 2
+        assert backoff.retry_after(1) == 2
+        assert backoff.failure(1) == 4
+        assert backoff.failure(1) == 5
+        assert backoff.retry_after(2) == 0
+    with patch("throttling.time.monotonic", return_value=105.0):
+        assert backoff.retry_after(1) == 0
+    backoff.success(1)
+    assert backoff.failure(1) == 2
+    assert backoff.stats() == {"users": 1, "failures": 4, "throttled": 1}
@@ -0,0 +1,80 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from aiohttp.test_utils import TestClient, TestServer
+from webhook import STATE_KEY, UpdateQueue, build_webhook_app
+
+SECRET = "s3cret"
+UPDATE = {
+    "update_id": 1,
+    "message": {
+        "message_id": 1,
+        "date": 0,
+        "chat": {"id": 123456, "type": "private"},
+        "from": {"id": 123456, "is_bot": False, "first_name": "Test"},
+        "text": "/start",
+    },
+}
+
+
+def make_client(queue):
+    app = build_webhook_app(MagicMock(), queue, SECRET, "/webhook")
+    return TestClient(TestServer(app))
+
+
+@pytest.mark.asyncio
+async def test_webhook_rejects_bad_secret():
+    queue = UpdateQueue(AsyncMock(), MagicMock(), workers=1, maxsize=10)
+    async with make_client(queue) as client:
+        resp = await client.post("/webhook", json=UPDATE, headers={"X-Telegram-Bot-Api-Secret-Token": "wrong"})
+        assert resp.status == 401
+    assert queue.depth == 0
+
+
+@pytest.mark.asyncio
+async def test_webhook_feeds_updates_to_dispatcher():
+    dp = AsyncMock()
+    queue = UpdateQueue(dp, MagicMock(), workers=2, maxsize=10)
+    queue.start()
+    async with make_client(queue) as client:
+        resp = await client.post("/webhook", json=UPDATE, headers={"X-Telegram-Bot-Api-Secret-Token": SECRET})
+        assert resp.status == 200
+        await queue.stop(timeout=1)
+
+    dp.feed_update.assert_awaited_once()
+    assert dp.feed_update.call_args[0][1].update_id == 1
+
+
+@pytest.mark.asyncio
+async def test_webhook_rejects_malformed_bodies_with_400():
+    queue = UpdateQueue(AsyncMock(), MagicMock(), workers=0, maxsize=10)
+    headers = {"X-Telegram-Bot-Api-Secret-Token": SECRET}
+    async with make_client(queue) as client:
+        assert (await client.post("/webhook", data=b"{not json", headers=headers)).status == 400
+        assert (await client.post("/webhook", json=[1, 2], headers=headers)).status == 400
+        assert (await client.post("/webhook", json={"update_id": "x"}, headers=headers)).status == 400
+    assert queue.depth == 0
+
+
+@pytest.mark.asyncio
+async def test_webhook_applies_backpressure_when_queue_full():
+    queue = UpdateQueue(AsyncMock(), MagicMock(), workers=0, maxsize=1)
+    headers = {"X-Telegram-Bot-Api-Secret-Token": SECRET}
+    async with make_client(queue) as client:
+        assert (await client.post("/webhook", json=UPDATE, headers=headers)).status == 200
+        resp = await client.post("/webhook", json=UPDATE, headers=headers)
+        assert resp.status == 503
+    assert queue.depth == 1
+
+
+@pytest.mark.asyncio
+async def test_health_endpoint_reports_queue_depth():
+    queue = UpdateQueue(AsyncMock(), MagicMock(), workers=0, maxsize=5)
+    async with make_client(queue) as client:
+        resp = await client.get("/healthz")
+        assert resp.status == 200
+        assert (await resp.json()) == {"status": "ok", "queue": 0}
+
+        client.server.app[STATE_KEY]["accepting"] = False
+        resp = await client.get("/healthz")
+        assert resp.status == 503
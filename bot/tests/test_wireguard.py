@@ -0,0 +1,72 @@
+import io
+import zipfile
+import pytest
+import httpx
+from unittest.mock import AsyncMock, MagicMock, patch
+from wireguard import WireGuardConfigError, WireGuardConfigs
+
+ENDPOINTS = [
+    {"ID": 1, "name": "🇩🇪 Germany", "address": "de.example.com:51820"},
+    {"ID": 2, "name": "🇳🇱 Netherlands", "address": "nl.example.com:51820"},
+    {"ID": 3, "name": "Broken", "address": "x.example.com:51820"},
+]
+
+
+def wg_api():
+    async def get_wg_config(telegram_id, sub_id, endpoint_id):
+        request = httpx.Request("GET", "http://backend.test/wg_config")
+        if str(endpoint_id) == "3":
+            return httpx.Response(500, json={"error": "render failed"}, request=request)
+        return httpx.Response(200, json={"config": f"[Interface]\n# ep {endpoint_id}\n", "uuid": f"u{sub_id}"}, request=request)
+
+    api = MagicMock()
+    api.get_wg_config = AsyncMock(side_effect=get_wg_config)
+    return api
+
+
+@pytest.mark.asyncio
+async def test_location_switches_are_served_from_cache():
+    configs = WireGuardConfigs(ttl=60)
+    api = wg_api()
+    with patch("wireguard.get_api", return_value=api):
+        first = await configs.get(7, "10", 1)
+        await configs.get(7, "10", 2)
+        again = await configs.get(7, 10, "1")
+        # Same sub and endpoint for another user is a separate entry
+        await configs.get(8, "10", 1)
+
+    assert again is first
+    assert first.filename == "wg_u10.conf" and "# ep 1" in first.text
+    assert api.get_wg_config.await_count == 3
+
+
+@pytest.mark.asyncio
+async def test_failed_render_is_not_cached():
+    configs = WireGuardConfigs(ttl=60)
+    api = wg_api()
+    with patch("wireguard.get_api", return_value=api):
+        for _ in range(2):
+            with pytest.raises(WireGuardConfigError):
+                await configs.get(7, "10", 3)
+    assert api.get_wg_config.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_archive_zips_every_location_that_renders():
+    configs = WireGuardConfigs(ttl=60)
+    with patch("wireguard.get_api", return_value=wg_api()):
+        data, count = await configs.archive(7, "10", ENDPOINTS)
+
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        names = sorted(archive.namelist())
+        assert names == ["germany_1.conf", "netherlands_2.conf"]
+        assert "# ep 2" in archive.read("netherlands_2.conf").decode()
+    assert count == 2
+
+
+@pytest.mark.asyncio
+async def test_archive_fails_when_nothing_renders():
+    configs = WireGuardConfigs(ttl=60)
+    with patch("wireguard.get_api", return_value=wg_api()):
+        with pytest.raises(WireGuardConfigError):
+            await configs.archive(7, "10", ENDPOINTS[2:])
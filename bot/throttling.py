@@ -0,0 +1,258 @@
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+
+from aiogram import BaseMiddleware, types
+
+from cache import TTLCache
+from i18n import DEFAULT_LANG, resolve_lang, t
+
+
+class GateTimeout(Exception):
+    """Raised when a slot could not be acquired before the deadline.
+
+    Also the base of `api_client.BackendBusy`, so a saturated backend route
+    is answered with the same "busy" reply as a saturated bot.
+    """
+
+
+class Gate:
+    """Concurrency cap with a bounded wait and queue/wait-time counters."""
+
+    def __init__(self, name: str, limit: int):
+        self.name = name
+        self.limit = limit
+        self._sem = asyncio.Semaphore(limit)
+        self.active = 0
+        self.waiting = 0
+        self.max_waiting = 0
+        self.acquired = 0
+        self.rejected = 0
+        self.wait_seconds_total = 0.0
+        self.max_wait_seconds = 0.0
+
+    @asynccontextmanager
+    async def slot(self, deadline: float):
+        started = time.monotonic()
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+        try:
+            async with asyncio.timeout(deadline):
+                await self._sem.acquire()
+        except TimeoutError:
+            self.rejected += 1
+            raise GateTimeout(f"{self.name} saturated ({self.waiting} waiting)") from None
+        finally:
+            self.waiting -= 1
+            waited = time.monotonic() - started
+            self.wait_seconds_total += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+
+        self.acquired += 1
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._sem.release()
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "waiting": self.waiting,
+            "max_waiting": self.max_waiting,
+            "acquired": self.acquired,
+            "rejected": self.rejected,
+            "wait_seconds_total": round(self.wait_seconds_total, 3),
+            "max_wait_seconds": round(self.max_wait_seconds, 3),
+        }
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated_at")
+
+    def __init__(self, tokens: float, updated_at: float):
+        self.tokens = tokens
+        self.updated_at = updated_at
+
+
+def _event_lang(user: types.User) -> str:
+    from utils import USER_LANG_CACHE
+
+    cached = USER_LANG_CACHE.get(user.id)
+    if cached:
+        return cached
+    return resolve_lang(user.language_code)
+
+
+class ConcurrencyLimitMiddleware(BaseMiddleware):
+    """Caps how many updates are handled at once across the whole bot.
+
+    Updates over the cap wait up to `deadline` seconds for a slot; after
+    that they are shed with a short "busy" reply in the user's language
+    instead of piling more load onto the backend.
+    """
+
+    def __init__(self, limit: int = None, deadline: float = None):
+        self.gate = Gate("updates", limit or int(os.getenv("BOT_MAX_CONCURRENT_UPDATES", "64")))
+        self.deadline = deadline if deadline is not None else float(os.getenv("BOT_QUEUE_DEADLINE", "10"))
+
+    async def __call__(self, handler, event, data: dict):
+        try:
+            async with self.gate.slot(self.deadline):
+                return await handler(event, data)
+        except GateTimeout as e:
+            user = getattr(event, "from_user", None)
+            logging.warning(f"Shedding update from {user.id if user else 'unknown'}: {e}")
+            text = t("busy", _event_lang(user) if user else DEFAULT_LANG)
+            try:
+                if isinstance(event, types.CallbackQuery):
+                    await event.answer(text, show_alert=True)
+                elif isinstance(event, types.Message):
+                    await event.answer(text)
+            except Exception as e:
+                logging.error(f"Could not send busy reply: {e}")
+
+    def stats(self) -> dict:
+        return self.gate.stats()
+
+
+class RateLimitMiddleware(BaseMiddleware):
+    """Per-user token bucket: `rate` updates per second with bursts up to `burst`.
+
+    Callback queries over the limit get a short toast so the button spinner
+    stops; extra messages are dropped silently.
+    """
+
+    def __init__(self, rate: float = None, burst: int = None):
+        self.rate = rate if rate is not None else float(os.getenv("RATE_LIMIT_PER_SECOND", "1"))
+        self.burst = burst if burst is not None else int(os.getenv("RATE_LIMIT_BURST", "5"))
+        # Idle buckets are full again after burst / rate seconds, so they can simply expire
+        self.buckets = TTLCache(
+            maxsize=int(os.getenv("USER_CACHE_SIZE", "100000")),
+            ttl=max(60.0, self.burst / self.rate if self.rate > 0 else 60.0),
+        )
+        self.limited = 0
+
+    def allow(self, user_id: int) -> bool:
+        now = time.monotonic()
+        bucket = self.buckets.get(user_id)
+        if bucket is None:
+            bucket = TokenBucket(self.burst, now)
+        else:
+            bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated_at) * self.rate)
+            bucket.updated_at = now
+        allowed = bucket.tokens >= 1
+        if allowed:
+            bucket.tokens -= 1
+        self.buckets.set(user_id, bucket)
+        return allowed
+
+    async def __call__(self, handler, event, data: dict):
+        user = getattr(event, "from_user", None)
+        if user is None or self.allow(user.id):
+            return await handler(event, data)
+
+        self.limited += 1
+        logging.info(f"Rate limited user {user.id}")
+        if isinstance(event, types.CallbackQuery):
+            try:
+                await event.answer(t("slow_down", _event_lang(user)))
+            except Exception as e:
+                logging.error(f"Could not answer rate-limited callback: {e}")
+
+    def stats(self) -> dict:
+        return {"limited": self.limited, "users": len(self.buckets)}
+
+
+class CallbackCoalesceMiddleware(BaseMiddleware):
+    """Runs a user's identical in-flight button taps only once.
+
+    While a callback with the same data from the same user is still being
+    handled, further taps wait for it instead of hitting the backend again
+    (e.g. a double tap on "pay with crypto" would otherwise create two
+    orders). The waiting taps are answered so their spinners stop.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self.coalesced = 0
+
+    async def __call__(self, handler, event: types.CallbackQuery, data: dict):
+        if not isinstance(event, types.CallbackQuery) or not event.data:
+            return await handler(event, data)
+
+        key = (event.from_user.id, event.data)
+        running = self._inflight.get(key)
+        if running is not None:
+            self.coalesced += 1
+            try:
+                # Shield so a cancelled duplicate doesn't cancel the shared result
+                return await asyncio.shield(running)
+            finally:
+                try:
+                    await event.answer()
+                except Exception:
+                    pass
+
+        result = asyncio.get_running_loop().create_future()
+        self._inflight[key] = result
+        try:
+            value = await handler(event, data)
+            result.set_result(value)
+            return value
+        finally:
+            if not result.done():
+                # The original tap failed; duplicates just stop waiting
+                result.set_result(None)
+            self._inflight.pop(key, None)
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self._inflight), "coalesced": self.coalesced}
+
+
+class Backoff:
+    """Per-user exponential backoff after failed attempts.
+
+    The first failure blocks the user for `base` seconds, each further one
+    doubles that up to `cap`. A user's record is forgotten `reset` seconds
+    after their last failure, or at once on success.
+    """
+
+    def __init__(self, base: float = None, cap: float = None, reset: float = None):
+        self.base = base if base is not None else float(os.getenv("INVITE_BACKOFF_BASE", "2"))
+        self.cap = cap if cap is not None else float(os.getenv("INVITE_BACKOFF_MAX", "300"))
+        # user_id -> [failures, blocked until (monotonic)]
+        self.users = TTLCache(
+            maxsize=int(os.getenv("USER_CACHE_SIZE", "100000")),
+            ttl=reset if reset is not None else float(os.getenv("INVITE_BACKOFF_RESET", "3600")),
+        )
+        self.failures = 0
+        self.throttled = 0
+
+    def retry_after(self, user_id: int) -> float:
+        """Seconds until `user_id` may try again; 0 when allowed now."""
+        entry = self.users.get(user_id)
+        wait = entry[1] - time.monotonic() if entry else 0.0
+        if wait > 0:
+            self.throttled += 1
+            return wait
+        return 0.0
+
+    def failure(self, user_id: int) -> float:
+        """Record a failed attempt; returns the seconds the user is now blocked."""
+        entry = self.users.get(user_id)
+        failures = entry[0] + 1 if entry else 1
+        delay = min(self.cap, self.base * 2 ** min(failures - 1, 30))
+        self.users.set(user_id, [failures, time.monotonic() + delay])
+        self.failures += 1
+        return delay
+
+    def success(self, user_id: int):
+        self.users.discard(user_id)
+
+    def stats(self) -> dict:
+        return {"users": len(self.users), "failures": self.failures, "throttled": self.throttled}
@@ -1,31 +1,72 @@
-import httpx
-import os
 import logging
+from contextvars import ContextVar
+from api_client import get_api
+from cache import SharedCache
+from i18n import resolve_lang
 
-API_BASE_URL = os.getenv("API_BASE_URL", "http://backend:3000/api/v1")
+USER_LANG_CACHE = SharedCache("lang", "LANG_CACHE_TTL", 3600)
 
-USER_LANG_CACHE = {}
+class UpdateContext:
+    """What has already been decided about the user of the update being handled.
+
+    Created once per update (see `UpdateContextMiddleware` in bot.py), so a
+    check that already let this update through, or a language that was
+    already looked up, costs nothing the second time.
+    """
+
+    __slots__ = ("user_id", "checked", "lang")
+
+    def __init__(self, user_id: int = None):
+        self.user_id = user_id
+        self.checked = set()
+        self.lang = None
+
+_update_context = ContextVar("update_context", default=None)
+
+def begin_update(user_id: int = None) -> tuple:
+    """Start a fresh context for the update being handled; returns (context, token for end_update)."""
+    ctx = UpdateContext(user_id)
+    return ctx, _update_context.set(ctx)
+
+def end_update(token):
+    _update_context.reset(token)
+
+def current_context(telegram_id: int = None) -> UpdateContext | None:
+    """The running update's context, if it belongs to `telegram_id` (when given)."""
+    ctx = _update_context.get()
+    if ctx is None or (telegram_id is not None and ctx.user_id != telegram_id):
+        return None
+    return ctx
+
+def remember_lang(telegram_id: int, lang: str):
+    ctx = current_context(telegram_id)
+    if ctx is not None:
+        ctx.lang = lang
 
 async def get_user_lang(telegram_id: int) -> str:
     """Fetch the user's saved language preference from the backend DB.
     Falls back to 'en' if anything fails."""
-    if telegram_id in USER_LANG_CACHE:
-        return USER_LANG_CACHE[telegram_id]
+    ctx = current_context(telegram_id)
+    if ctx is not None and ctx.lang:
+        return ctx.lang
+
+    cached = await USER_LANG_CACHE.fetch(telegram_id)
+    if cached:
+        remember_lang(telegram_id, cached)
+        return cached
         
     try:
-        async with httpx.AsyncClient(headers={"Authorization": f"Bot {os.getenv('BOT_TOKEN')}"}) as client:
-            resp = await client.post(f"{API_BASE_URL}/users/", json={
-                "telegram_id": telegram_id,
-                "language": "en"  # only used if user doesn't exist yet
-            })
-            data = resp.json()
-            lang = data.get("language", "en")
-            final_lang = lang if lang in ("en", "fa") else "en"
-            USER_LANG_CACHE[telegram_id] = final_lang
-            return final_lang
+        # "en" is only used if the user doesn't exist yet
+        resp = await get_api().get_or_create_user(telegram_id, "en")
+        data = resp.json()
+        lang = data.get("language", "en")
+        final_lang = resolve_lang(lang)
+        await set_user_cached_lang(telegram_id, final_lang)
+        return final_lang
     except Exception as e:
         logging.warning(f"Could not fetch user lang: {e}")
         return "en"
 
-def set_user_cached_lang(telegram_id: int, lang: str):
-    USER_LANG_CACHE[telegram_id] = lang
+async def set_user_cached_lang(telegram_id: int, lang: str):
+    remember_lang(telegram_id, lang)
+    await USER_LANG_CACHE.store(telegram_id, lang)
@@ -0,0 +1,149 @@
+import asyncio
+import logging
+import os
+import secrets
+import signal
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+
+STATE_KEY = web.AppKey("state", dict)
+
+
+class UpdateQueue:
+    """Bounded queue drained by a fixed pool of workers.
+
+    The webhook handler only enqueues; when the queue is full the update is
+    refused so Telegram redelivers it later instead of the bot piling up
+    unbounded tasks (e.g. right after a broadcast).
+    """
+
+    def __init__(self, dp: Dispatcher, bot: Bot, workers: int, maxsize: int):
+        self.dp = dp
+        self.bot = bot
+        self.workers = workers
+        self._queue = asyncio.Queue(maxsize=maxsize)
+        self._tasks = []
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def offer(self, update: Update) -> bool:
+        try:
+            self._queue.put_nowait(update)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def _worker(self):
+        while True:
+            update = await self._queue.get()
+            try:
+                await self.dp.feed_update(self.bot, update)
+            except Exception:
+                logging.exception(f"Failed to process update {update.update_id}")
+            finally:
+                self._queue.task_done()
+
+    async def stop(self, timeout: float):
+        """Let queued updates finish (up to `timeout` seconds), then stop the workers."""
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logging.warning(f"Webhook shutdown: dropping {self.depth} queued updates")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+def build_webhook_app(bot: Bot, queue: UpdateQueue, secret: str, path: str) -> web.Application:
+    state = {"accepting": True}
+
+    async def handle_update(request: web.Request) -> web.Response:
+        token = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+        if not secrets.compare_digest(token, secret):
+            return web.Response(status=401)
+        if not state["accepting"]:
+            return web.Response(status=503)
+
+        try:
+            update = Update.model_validate(await request.json(), context={"bot": bot})
+        except ValueError as e:
+            # Bad JSON or not an Update (pydantic's ValidationError is a ValueError).
+            # A 5xx would make Telegram resend the same body again and again.
+            logging.warning(f"Webhook: rejecting malformed update: {e}")
+            return web.Response(status=400)
+        if not queue.offer(update):
+            # Non-2xx makes Telegram retry the update later
+            return web.Response(status=503, headers={"Retry-After": "1"})
+        return web.Response()
+
+    async def health(request: web.Request) -> web.Response:
+        status = 200 if state["accepting"] else 503
+        return web.json_response({"status": "ok" if status == 200 else "stopping", "queue": queue.depth}, status=status)
+
+    app = web.Application()
+    app[STATE_KEY] = state
+    app.router.add_post(path, handle_update)
+    app.router.add_get("/healthz", health)
+    return app
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot, **workflow_data):
+    """Serve updates over a webhook until SIGINT/SIGTERM, then shut down gracefully."""
+    base_url = os.getenv("WEBHOOK_URL", "").rstrip("/")
+    if not base_url:
+        logging.error("WEBHOOK_URL is required when BOT_MODE=webhook.")
+        return
+
+    path = os.getenv("WEBHOOK_PATH", "/webhook")
+    # Without a configured secret a random one still works, since we register the webhook ourselves
+    secret = os.getenv("WEBHOOK_SECRET") or secrets.token_urlsafe(32)
+    host = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+    port = int(os.getenv("WEBHOOK_PORT", "8080"))
+
+    queue = UpdateQueue(
+        dp,
+        bot,
+        workers=int(os.getenv("WEBHOOK_WORKERS", "32")),
+        maxsize=int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000")),
+    )
+    app = build_webhook_app(bot, queue, secret, path)
+    runner = web.AppRunner(app)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:  # Windows
+            pass
+
+    await dp.emit_startup(bot=bot, dispatcher=dp, **workflow_data)
+    queue.start()
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    await bot.set_webhook(
+        f"{base_url}{path}",
+        secret_token=secret,
+        allowed_updates=dp.resolve_used_update_types(),
+    )
+    logging.info(f"Webhook listening on {host}:{port}{path}")
+
+    try:
+        await stop.wait()
+    finally:
+        logging.info("Stopping webhook server...")
+        app[STATE_KEY]["accepting"] = False
+        await runner.cleanup()
+        await queue.stop(float(os.getenv("WEBHOOK_DRAIN_TIMEOUT", "30")))
+        try:
+            await dp.emit_shutdown(bot=bot, dispatcher=dp, **workflow_data)
+        finally:
+            await bot.session.close()
@@ -0,0 +1,96 @@
+import asyncio
+import io
+import os
+import re
+import zipfile
+
+from api_client import get_api
+from cache import CachedValue, TTLCache
+
+
+class WireGuardConfigError(Exception):
+    """The backend could not render a config for this subscription and endpoint."""
+
+
+class WireGuardConfig:
+    __slots__ = ("filename", "text")
+
+    def __init__(self, filename: str, text: str):
+        self.filename = filename
+        self.text = text
+
+
+def _slug(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9]+", "_", name or "").strip("_").lower()
+
+
+def build_archive(files: list) -> bytes:
+    """Zip [(name, text), ...] in memory; CPU-bound, so call it via `asyncio.to_thread`."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, text in files:
+            archive.writestr(name, text)
+    return buffer.getvalue()
+
+
+class WireGuardConfigs:
+    """Rendered `.conf` files per (user, subscription, endpoint).
+
+    Switching between locations (and back) is served from memory instead
+    of asking the backend to render the config again. Entries live for
+    WG_CONFIG_TTL seconds and are dropped when an admin toggles an
+    endpoint; concurrent misses for the same key share one request.
+    """
+
+    def __init__(self, ttl: float = None, maxsize: int = None):
+        self.ttl = ttl if ttl is not None else float(os.getenv("WG_CONFIG_TTL", "900"))
+        self._configs = TTLCache(
+            maxsize=maxsize or int(os.getenv("WG_CONFIG_CACHE_SIZE", "20000")),
+            ttl=self.ttl,
+        )
+
+    async def _load(self, telegram_id: int, sub_id, endpoint_id) -> WireGuardConfig:
+        resp = await get_api().get_wg_config(telegram_id, sub_id, endpoint_id)
+        if resp.status_code != 200:
+            raise WireGuardConfigError(f"HTTP {resp.status_code}")
+        data = resp.json()
+        if not data.get("config"):
+            raise WireGuardConfigError("empty config")
+        return WireGuardConfig(f"wg_{data.get('uuid')}.conf", data["config"])
+
+    async def get(self, telegram_id: int, sub_id, endpoint_id) -> WireGuardConfig:
+        # The user is part of the key: sub IDs come from callback data
+        key = (telegram_id, str(sub_id), str(endpoint_id))
+        entry = self._configs.get(key)
+        if entry is None:
+            entry = CachedValue(lambda: self._load(telegram_id, sub_id, endpoint_id), ttl=self.ttl)
+            self._configs.set(key, entry)
+        return await entry.get()
+
+    async def archive(self, telegram_id: int, sub_id, endpoints) -> tuple:
+        """One zip with a config per endpoint; returns (bytes, number of configs).
+
+        Locations the backend can't render are left out.
+        """
+        results = await asyncio.gather(
+            *(self.get(telegram_id, sub_id, ep.get("ID")) for ep in endpoints),
+            return_exceptions=True,
+        )
+        files = []
+        for ep, config in zip(endpoints, results):
+            if isinstance(config, Exception):
+                continue
+            name = _slug(ep.get("name")) or _slug(ep.get("address")) or "location"
+            files.append((f"{name}_{ep.get('ID')}.conf", config.text))
+        if not files:
+            raise WireGuardConfigError("no location could be rendered")
+        return await asyncio.to_thread(build_archive, files), len(files)
+
+    def clear(self):
+        self._configs.clear()
+
+    def stats(self) -> dict:
+        return self._configs.stats()
+
+
+wg_configs = WireGuardConfigs()